@@ -1,16 +1,16 @@
 import streamlit as st
 import openai
-import random
 import tempfile
 import os
-import io
 import json
-try:
-    from PIL import Image
-    import pytesseract
-    IMAGE_PROCESSING_AVAILABLE = True
-except ImportError:
-    IMAGE_PROCESSING_AVAILABLE = False
+
+from document_extraction import chunked_char_budget, extract_company_info
+from file_extraction import DOCUMENT_CHAR_BUDGET, extract_files, parse_page_ranges
+from google_drive import download_files, parse_file_ids, store_text
+from llm import LLMRuntime, achat_completion, model_router, request_scheduler, response_cache
+from memo_jobs import CANCELLED, FAILED, JobManager
+from prompt_template import load_template
+import telemetry
 
 # Set your OpenAI API key securely
 # Get API key from environment variable or Streamlit secrets
@@ -31,6 +31,28 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
+# One pooled OpenAI client (and its event loop) per process, shared by every
+# session and rerun so HTTP connections are kept alive between calls
+@st.cache_resource(show_spinner=False)
+def get_llm_runtime(api_key):
+    return LLMRuntime.from_env(api_key)
+
+llm_runtime = get_llm_runtime(openai.api_key)
+
+# Memo generation jobs run on the runtime's loop and outlive reruns of this script
+@st.cache_resource(show_spinner=False)
+def get_job_manager(_runtime):
+    return JobManager(_runtime, max_running=int(os.getenv("MEMO_MAX_RUNNING_JOBS", 2)))
+
+job_manager = get_job_manager(llm_runtime)
+
+# Prometheus /metrics endpoint, only if TELEMETRY_METRICS_PORT is set (one server per process)
+@st.cache_resource(show_spinner=False)
+def start_metrics_server():
+    return telemetry.serve_metrics_from_env()
+
+start_metrics_server()
+
 # Custom CSS for dark mode and sophisticated styling
 st.markdown("""
 <style>
@@ -281,102 +303,8 @@ st.markdown("""
 if 'show_welcome' not in st.session_state:
     st.session_state.show_welcome = True
 
-# Function to intelligently categorize and populate company data
-def categorize_company_data(company_name, company_description, market_category):
-    categorization_prompt = f"""
-    Based on this company information, intelligently categorize and populate all investment memo fields:
-    
-    Company Name: {company_name}
-    Company Description: {company_description}
-    Market Category: {market_category}
-    
-    Generate a complete company profile in JSON format with realistic data:
-    - website: A realistic website URL
-    - launch_year: A year between 2020-2024
-    - team_size: A number between 2-50
-    - stage: One of: Pre-seed, Seed, Series A, Series B, Series C (based on description)
-    - one_liner: A compelling one-sentence description
-    - market_size: Realistic market size for this category (e.g., "$10B TAM")
-    - current_cash: Current cash position (e.g., "$500k in cash")
-    - burn_rate: Monthly burn rate (e.g., "$50k/month")
-    - revenue: Current revenue (e.g., "$200k ARR")
-    - prev_raised: Previously raised amount (e.g., "$2M Seed")
-    - round_size: Current round size (e.g., "$5M Series A")
-    - post_money_valuation: Post-money valuation (e.g., "$25M")
-    - use_of_capital: What they need money for (2-3 sentences)
-    - named_competitors: 3-4 realistic competitor names for this market
-    - founder_1_name: First founder name
-    - founder_1_bio: First founder bio (2-3 sentences)
-    - founder_2_name: Second founder name
-    - founder_2_bio: Second founder bio (2-3 sentences)
-    - founder_3_name: Third founder name (optional)
-    - founder_3_bio: Third founder bio (optional)
-    - founder_4_name: Fourth founder name (optional)
-    - founder_4_bio: Fourth founder bio (optional)
-    - misc_notes: Additional context about the company
-    - pros: 3-4 key advantages
-    - cons: 3-4 key risks
-    - best_case: Best case scenario (2-3 sentences)
-    - worst_case: Worst case scenario (2-3 sentences)
-    
-    Make it realistic and varied. Base the stage, financials, and team size on the description and market category.
-    Return only valid JSON.
-    """
-    
-    try:
-        client = openai.OpenAI(api_key=openai.api_key)
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[{"role": "user", "content": categorization_prompt}],
-            temperature=0.7,
-            max_tokens=1500
-        )
-        
-        import json
-        data_text = response.choices[0].message.content
-        
-        try:
-            start_idx = data_text.find('{')
-            end_idx = data_text.rfind('}') + 1
-            json_str = data_text[start_idx:end_idx]
-            return json.loads(json_str)
-        except:
-            # Fallback data
-            return {
-                "website": f"https://{company_name.lower().replace(' ', '')}.com",
-                "launch_year": "2023",
-                "team_size": "8",
-                "stage": "Series A",
-                "one_liner": f"{company_name} is revolutionizing the {market_category} space.",
-                "market_size": "$10B TAM",
-                "current_cash": "$500k in cash",
-                "burn_rate": "$50k/month",
-                "revenue": "$200k ARR",
-                "prev_raised": "$2M Seed",
-                "round_size": "$5M Series A",
-                "post_money_valuation": "$25M",
-                "use_of_capital": "Expanding team, scaling operations, and developing new features.",
-                "named_competitors": "Competitor A, Competitor B, Competitor C",
-                "founder_1_name": "Founder One",
-                "founder_1_bio": "Experienced entrepreneur with background in the industry.",
-                "founder_2_name": "Founder Two",
-                "founder_2_bio": "Technical expert with deep domain knowledge.",
-                "founder_3_name": "",
-                "founder_3_bio": "",
-                "founder_4_name": "",
-                "founder_4_bio": "",
-                "misc_notes": "Promising early traction in the market.",
-                "pros": "Strong team, good market timing, innovative approach",
-                "cons": "Competitive market, early stage risks, execution challenges",
-                "best_case": "Becomes market leader and achieves significant growth.",
-                "worst_case": "Fails to gain traction and runs out of funding."
-            }
-    except Exception as e:
-        st.error(f"Error categorizing company data: {e}")
-        return None
-
 # Function to generate random company data
-def generate_test_company_data():
+def generate_test_company_data(use_cache=False):
     test_prompt = """
     Generate a realistic startup company profile with the following information in JSON format:
     - company_name: A realistic startup name
@@ -403,16 +331,13 @@ def generate_test_company_data():
     """
     
     try:
-        client = openai.OpenAI(api_key=openai.api_key)
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[{"role": "user", "content": test_prompt}],
-            temperature=0.8,
-            max_tokens=800
-        )
-        
-        import json
-        data_text = response.choices[0].message.content
+        # Not read from the cache by default: every click should produce a new random company
+        data_text = llm_runtime.run(achat_completion(
+            llm_runtime.client,
+            [{"role": "user", "content": test_prompt}],
+            route="test_company_data",
+            use_cache=use_cache
+        ))
         
         try:
             start_idx = data_text.find('{')
@@ -444,61 +369,378 @@ def generate_test_company_data():
         st.error(f"Error generating test data: {e}")
         return None
 
+# Function to keep a run's telemetry for this session's sidebar waterfall
+def remember_run(trace):
+    st.session_state.telemetry_runs = (st.session_state.get("telemetry_runs", []) + [trace])[-10:]
+
+# Function to draw a run as a timing waterfall: stages, LLM calls, extractors and the PDF on one timeline
+def render_run_waterfall(trace):
+    totals = trace.totals()
+    cost = f"${totals['cost_usd']:.4f}" if totals["cost_usd"] is not None else "cost n/a"
+    st.caption(
+        f"{totals['wall']:.1f}s • {totals['llm_calls']} LLM calls ({totals['cache_hits']} cached) • "
+        f"{totals['prompt_tokens'] + totals['completion_tokens']:,} tokens • {cost} • {totals['queue']:.1f}s queued"
+    )
+    spans = sorted(list(trace.spans), key=lambda span: span["start"])
+    if not spans:
+        return
+    
+    labels = []
+    for i, span in enumerate(spans):
+        label = f"{span['name']} ({span['model']})" if span["kind"] == "llm" else span["name"]
+        # Numbered so repeated calls (e.g. memo sections) get their own row
+        labels.append(f"{i + 1}. {label}")
+    
+    try:
+        import plotly.graph_objects as go
+        
+        colors = {"stage": "#3b82f6", "llm": "#8b5cf6", "extract": "#10b981", "pdf": "#f59e0b", "queue": "#6b7280"}
+        queued = [span.get("queue", 0.0) for span in spans]
+        hover = []
+        for span in spans:
+            text = f"{span['wall']:.2f}s"
+            if span["kind"] == "llm":
+                text += f", {span['queue']:.2f}s queued, {span['prompt_tokens']}+{span['completion_tokens']} tokens"
+                if span.get("cost_usd") is not None:
+                    text += f", ${span['cost_usd']:.4f}"
+                if span.get("cached"):
+                    text += " (cached)"
+            if span.get("error"):
+                text += f", failed: {span['error']}"
+            hover.append(text)
+        
+        fig = go.Figure()
+        fig.add_trace(go.Bar(
+            y=labels, x=queued, base=[span["start"] for span in spans], orientation="h",
+            name="Queued", marker_color="#374151", hoverinfo="skip"
+        ))
+        fig.add_trace(go.Bar(
+            y=labels, x=[max(span["wall"] - wait, 0.0) for span, wait in zip(spans, queued)],
+            base=[span["start"] + wait for span, wait in zip(spans, queued)], orientation="h",
+            name="Running", marker_color=[colors.get(span["kind"], "#3b82f6") for span in spans],
+            hovertext=hover, hoverinfo="text"
+        ))
+        fig.update_layout(
+            barmode="overlay",
+            showlegend=False,
+            height=60 + 22 * len(spans),
+            margin=dict(l=0, r=0, t=10, b=0),
+            xaxis_title="Seconds",
+            yaxis=dict(autorange="reversed", tickfont=dict(size=10))
+        )
+        st.plotly_chart(fig, use_container_width=True)
+    
+    except ImportError:
+        for label, span in zip(labels, spans):
+            st.caption(f"{label}: {span['start']:.1f}s → {span['start'] + span['wall']:.1f}s")
+
+# Function to show a running memo job; the fragment re-polls the job every half second
+@st.fragment(run_every=0.5)
+def render_memo_job_progress(job_id, show_stream):
+    job = job_manager.get(job_id)
+    if job is None:
+        return
+    if job.done:
+        # Rerun the whole page so the finished memo renders in place
+        st.rerun()
+    
+    st.progress(job.progress, text=f"{job.stage_label}... ({job.elapsed():.0f}s)")
+    if st.button("Cancel generation", key=f"cancel_{job.id}"):
+        job_manager.cancel(job.id)
+    
+    if show_stream:
+        stage_titles = {"memo": "Investment Memo", "vc_review": "Venture Capital Analysis"}
+        streamed = job.streamed_text()
+        body = "\n\n---\n\n".join(
+            f"# {stage_titles[stage]}\n\n{text}" for stage, text in streamed.items() if text
+        )
+        if body:
+            st.markdown(body)
+
+# Function to render a memo job: progress while it runs, the memo and analysis once it is done
+def render_memo_job(job, show_stream):
+    st.markdown("---")
+    st.markdown("## Generated Investment Memo & VC Analysis")
+    
+    if not job.done:
+        render_memo_job_progress(job.id, show_stream)
+        return
+    
+    if job.status == CANCELLED:
+        st.warning("Memo generation was cancelled.")
+        return
+    
+    result = job.result or {"errors": {}}
+    errors = result["errors"]
+    if "categorize" in errors:
+        st.error(f"Error categorizing company data: {errors['categorize']}")
+        st.error("Failed to categorize company data. Please try again.")
+        return
+    if job.status == FAILED:
+        st.error(f"Error generating memo: {job.error}")
+        return
+    
+    # Remember this run's sections so the next generation can reuse unchanged ones
+    if result.get("memo_sections") and st.session_state.get("memo_sections_job") != job.id:
+        st.session_state.memo_sections = result["memo_sections"]
+        st.session_state.memo_sections_job = job.id
+    
+    form_data = job.form_data
+    company_name = form_data["company_name"]
+    stage, revenue, burn_rate = form_data["stage"], form_data["revenue"], form_data["burn_rate"]
+    team_size, prev_raised, round_size = form_data["team_size"], form_data["prev_raised"], form_data["round_size"]
+    market_category = result.get("market_category")
+    final_memo = job.final_memo
+    
+    st.caption(f"Generated in {job.elapsed():.1f}s")
+    if result.get("memo_sections"):
+        memo_sections = result["memo_sections"]
+        reused = [section["title"] for section in memo_sections.values() if section["reused"]]
+        if reused:
+            st.caption(f"Reused {len(reused)} of {len(memo_sections)} unchanged sections: {', '.join(reused)}")
+    if result.get("unfilled_placeholders"):
+        with st.expander(f"{len(result['unfilled_placeholders'])} prompt fields had no data"):
+            st.caption("These base_prompt.txt placeholders were left blank: " + ", ".join(result["unfilled_placeholders"]))
+    
+    # Display memo with proper styling
+    st.markdown(f"""
+    <div class="memo-container">
+        {final_memo}
+    </div>
+    """, unsafe_allow_html=True)
+    
+    # Market Size Hierarchy Visualization
+    st.markdown("---")
+    st.markdown("## Market Size Hierarchy")
+
+    # Create and display the TAM > SAM > SOM visualization
+    market_hierarchy_fig = create_market_size_hierarchy(*result["market_sizes"], company_name)
+    if market_hierarchy_fig:
+        st.plotly_chart(market_hierarchy_fig, use_container_width=True)
+
+        # Add explanation
+        st.markdown("""
+        **Market Size Definitions:**
+        - **TAM (Total Addressable Market):** The total market demand for a product or service
+        - **SAM (Serviceable Addressable Market):** The portion of TAM that your product can realistically serve
+        - **SOM (Serviceable Obtainable Market):** The portion of SAM that you can realistically capture in 3-5 years
+        """)
+    else:
+        pass
+
+    # Investment Stage Analysis
+    st.markdown("---")
+    st.markdown("## Investment Stage Analysis")
+
+    # Create and display the investment stage visualization
+    stage_analysis_fig = create_investment_stage_visualization(
+        stage, company_name, revenue, burn_rate, team_size, prev_raised, round_size
+    )
+    if stage_analysis_fig:
+        st.plotly_chart(stage_analysis_fig, use_container_width=True)
+
+        # Add stage-specific insights
+        stage_insights = {
+            "Pre-seed": "**Pre-seed Stage:** Focus on idea validation and MVP development. Key metrics: product-market fit signals, early user feedback, technical feasibility.",
+            "Seed": "**Seed Stage:** Building product-market fit and acquiring early customers. Key metrics: customer acquisition cost, retention rates, revenue growth.",
+            "Series A": "**Series A Stage:** Scaling operations and expanding market reach. Key metrics: unit economics, market penetration, team scaling.",
+            "Series B": "**Series B Stage:** Rapid growth and market leadership. Key metrics: market share, competitive positioning, operational efficiency.",
+            "Series C": "**Series C Stage:** Market dominance and IPO preparation. Key metrics: market leadership, profitability, international expansion.",
+            "Series D+": "**Series D+ Stage:** Late-stage growth and exit preparation. Key metrics: exit readiness, market consolidation, strategic partnerships."
+        }
+
+        current_stage = stage or "Series A"
+        insight = stage_insights.get(current_stage, stage_insights["Series A"])
+        st.info(insight)
+    else:
+        pass
+
+    # Market Analysis Section
+    st.markdown("---")
+    st.markdown("## Market Analysis")
+
+    # Market analysis ran concurrently with the memo stages
+    final_market_size = result.get("final_market_size")
+    final_revenue = result.get("final_revenue")
+    final_stage = result.get("final_stage")
+    market_analysis = result.get("market_analysis")
+
+    if "market_analysis" in errors:
+        st.error(f"Error analyzing market data: {errors['market_analysis']}")
+
+    if market_category and final_market_size and final_revenue:
+        if market_analysis:
+            # Display market analysis
+            col1, col2 = st.columns(2)
+
+            with col1:
+                st.markdown("### Market Position Analysis")
+                st.metric("Market Penetration", 
+                         f"{market_analysis.get('market_penetration_percentage', 'N/A')}%")
+                st.metric("Typical Range", 
+                         market_analysis.get('typical_penetration_range', 'N/A'))
+                st.metric("Market Maturity", 
+                         market_analysis.get('market_maturity', 'N/A'))
+
+            with col2:
+                st.markdown("### Growth Assessment")
+                st.metric("Remaining Opportunity", 
+                         market_analysis.get('market_opportunity', 'N/A'))
+                st.metric("Competitive Position", 
+                         market_analysis.get('competitive_position', 'N/A'))
+                st.metric("Stage Appropriateness", 
+                         market_analysis.get('stage_appropriateness', 'N/A'))
+
+            # Market penetration visualization
+            st.markdown("### Market Penetration Visualization")
+
+            try:
+                import plotly.graph_objects as go
+                import plotly.express as px
+
+                # Extract percentage for visualization
+                penetration_text = market_analysis.get('market_penetration_percentage', '0')
+                if isinstance(penetration_text, str):
+                    # Clean the text and extract number
+                    penetration_text = penetration_text.replace('%', '').replace(',', '').strip()
+                    try:
+                        penetration = float(penetration_text)
+                    except:
+                        penetration = 0.0
+                else:
+                    penetration = float(penetration_text)
+
+                # Ensure penetration is reasonable
+                penetration = max(0, min(100, penetration))
+
+                # Create gauge chart for market penetration
+                fig = go.Figure(go.Indicator(
+                    mode = "gauge+number+delta",
+                    value = penetration,
+                    domain = {'x': [0, 1], 'y': [0, 1]},
+                    title = {'text': f"Market Penetration (%)"},
+                    delta = {'reference': 5},  # Typical early stage
+                    gauge = {
+                        'axis': {'range': [None, 100]},
+                        'bar': {'color': "#3b82f6"},
+                        'steps': [
+                            {'range': [0, 5], 'color': "lightgray"},
+                            {'range': [5, 20], 'color': "yellow"},
+                            {'range': [20, 100], 'color': "green"}
+                        ],
+                        'threshold': {
+                            'line': {'color': "red", 'width': 4},
+                            'thickness': 0.75,
+                            'value': 90
+                        }
+                    }
+                ))
+
+                fig.update_layout(
+                    title=f"{company_name} - Market Penetration Analysis",
+                    font=dict(size=14),
+                    height=400
+                )
+
+                st.plotly_chart(fig, use_container_width=True)
+
+                # Market opportunity pie chart
+                if penetration < 100:
+                    remaining = 100 - penetration
+
+                    fig2 = go.Figure(data=[go.Pie(
+                        labels=['Captured Market', 'Remaining Opportunity'],
+                        values=[penetration, remaining],
+                        hole=.3,
+                        marker_colors=['#3b82f6', '#e5e7eb']
+                    )])
+
+                    fig2.update_layout(
+                        title=f"Market Opportunity Breakdown",
+                        height=400
+                    )
+
+                    st.plotly_chart(fig2, use_container_width=True)
+
+                # Growth potential assessment
+                st.markdown("### Growth Potential Assessment")
+                growth_potential = market_analysis.get('growth_potential', 'N/A')
+                st.info(f"**Growth Potential:** {growth_potential}")
+
+            except ImportError:
+                st.warning("Plotly not available. Install with: pip install plotly")
+                st.json(market_analysis)
+            except Exception as e:
+                st.error(f"Error creating market penetration visualization: {e}")
+                st.json(market_analysis)
+
+            # Market insights
+            st.markdown("### Market Insights")
+            insights = f"""
+            **Market Category:** {market_category}
+            **Total Addressable Market:** {final_market_size}
+            **Current Revenue:** {final_revenue}
+            **Company Stage:** {final_stage}
+
+            **Key Insights:**
+            - Market Penetration: {market_analysis.get('market_penetration_percentage', 'N/A')}%
+            - Typical Range for {final_stage} companies: {market_analysis.get('typical_penetration_range', 'N/A')}
+            - Market Maturity: {market_analysis.get('market_maturity', 'N/A')}
+            - Competitive Position: {market_analysis.get('competitive_position', 'N/A')}
+            """
+            st.markdown(insights)
+
+    # Download buttons
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.download_button(
+            label="Download Memo as Markdown",
+            data=final_memo,
+            file_name=f"{company_name}_investment_memo.md",
+            mime="text/markdown",
+            use_container_width=True
+        )
+
+    with col2:
+        # The PDF was rendered by the job, so reruns (e.g. clicking a download button) are instant
+        pdf_bytes = job.pdf_bytes
+        if isinstance(job.pdf_error, ImportError):
+            st.error("PDF generation libraries not available. Install with: pip install weasyprint or pip install pdfkit")
+        elif job.pdf_error is not None:
+            st.error(f"Error generating PDF: {job.pdf_error}")
+        if pdf_bytes:
+            st.download_button(
+                label="Download Memo as PDF",
+                data=pdf_bytes,
+                file_name=f"{company_name}_investment_memo.pdf",
+                mime="application/pdf",
+                use_container_width=True
+            )
+        else:
+            st.info("PDF download requires additional libraries. Install with: pip install weasyprint")
+
+    # Alternative PDF generation method
+    st.markdown("---")
+    st.markdown("### Alternative PDF Generation")
+    st.markdown("""
+    If the PDF download doesn't work, you can:
+    1. **Copy the memo text** from above
+    2. **Paste into a word processor** (Google Docs, Microsoft Word, etc.)
+    3. **Export as PDF** from there
+    4. **Or use online converters** like markdown-to-pdf.com
+    """)
+
 # Function to generate market size hierarchy visualization
 def create_market_size_hierarchy(tam, sam, som, company_name):
     """
     Create a Plotly visualization showing TAM > SAM > SOM hierarchy
-    If any values are missing, use AI to estimate them
+    Missing values are estimated beforehand by memo_pipeline.estimate_market_sizes
     """
     try:
         import plotly.graph_objects as go
         from plotly.subplots import make_subplots
         
-        # If any values are missing, use AI to estimate them
-        if not tam or not sam or not som:
-            estimation_prompt = f"""
-            Estimate realistic market size numbers for this company:
-            
-            Company: {company_name}
-            Current TAM: {tam or 'Not provided'}
-            Current SAM: {sam or 'Not provided'} 
-            Current SOM: {som or 'Not provided'}
-            
-            Return only a JSON object with:
-            - tam: Total Addressable Market (e.g., "$50B")
-            - sam: Serviceable Addressable Market (e.g., "$5B") 
-            - som: Serviceable Obtainable Market (e.g., "$500M")
-            
-            Make SAM about 10-20% of TAM and SOM about 10-20% of SAM.
-            Return only valid JSON.
-            """
-            
-            try:
-                client = openai.OpenAI(api_key=openai.api_key)
-                response = client.chat.completions.create(
-                    model="gpt-4",
-                    messages=[{"role": "user", "content": estimation_prompt}],
-                    temperature=0.3,
-                    max_tokens=200
-                )
-                
-                import json
-                data_text = response.choices[0].message.content
-                start_idx = data_text.find('{')
-                end_idx = data_text.rfind('}') + 1
-                json_str = data_text[start_idx:end_idx]
-                estimated_data = json.loads(json_str)
-                
-                tam = tam or estimated_data.get('tam', '$50B')
-                sam = sam or estimated_data.get('sam', '$5B')
-                som = som or estimated_data.get('som', '$500M')
-                
-            except:
-                # Fallback values
-                tam = tam or '$50B'
-                sam = sam or '$5B' 
-                som = som or '$500M'
-        
         # Extract numeric values for visualization
         def extract_number(value_str):
             if not value_str:
@@ -931,149 +1173,6 @@ def create_investment_stage_visualization(stage, company_name, revenue, burn_rat
         st.error(f"Error creating investment stage visualization: {e}")
         return None
 
-# Function to convert memo to PDF
-def convert_memo_to_pdf(final_memo, company_name, market_hierarchy_fig=None, stage_analysis_fig=None):
-    """
-    Convert the investment memo and analysis to PDF format
-    """
-    try:
-        # Create HTML content with proper styling
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <title>{company_name} - Investment Memo</title>
-            <style>
-                body {{
-                    font-family: 'Arial', sans-serif;
-                    line-height: 1.6;
-                    color: #333;
-                    max-width: 800px;
-                    margin: 0 auto;
-                    padding: 20px;
-                }}
-                h1 {{
-                    color: #2c3e50;
-                    border-bottom: 3px solid #3498db;
-                    padding-bottom: 10px;
-                    page-break-after: avoid;
-                }}
-                h2 {{
-                    color: #34495e;
-                    border-bottom: 2px solid #3498db;
-                    padding-bottom: 5px;
-                    margin-top: 30px;
-                    page-break-before: always;
-                }}
-                h3 {{
-                    color: #7f8c8d;
-                    margin-top: 20px;
-                }}
-                p {{
-                    margin-bottom: 15px;
-                    text-align: justify;
-                }}
-                ul, ol {{
-                    margin-bottom: 15px;
-                    padding-left: 20px;
-                }}
-                li {{
-                    margin-bottom: 5px;
-                }}
-                strong {{
-                    color: #2c3e50;
-                }}
-                .header {{
-                    text-align: center;
-                    margin-bottom: 30px;
-                    border-bottom: 2px solid #3498db;
-                    padding-bottom: 20px;
-                }}
-                .company-name {{
-                    font-size: 24px;
-                    font-weight: bold;
-                    color: #2c3e50;
-                    margin-bottom: 10px;
-                }}
-                .date {{
-                    color: #7f8c8d;
-                    font-style: italic;
-                }}
-                .section {{
-                    margin-bottom: 30px;
-                }}
-                .page-break {{
-                    page-break-before: always;
-                }}
-                @media print {{
-                    h2 {{
-                        page-break-before: always;
-                    }}
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="header">
-                <div class="company-name">{company_name}</div>
-                <div class="date">Investment Memo & Analysis</div>
-                <div class="date">{random.choice(['Generated on', 'Prepared on', 'Analysis Date'])}: {random.choice(['2024', '2025'])}</div>
-            </div>
-            
-            {final_memo.replace('# ', '<h1>').replace('## ', '<h2>').replace('### ', '<h3>').replace('**', '<strong>').replace('**', '</strong>')}
-            
-            <div class="page-break">
-                <h2>Market Analysis Summary</h2>
-                <p>This investment memo includes comprehensive market analysis, investment stage assessment, and venture capital evaluation.</p>
-                <p>The analysis is based on the provided company information and industry benchmarks for companies at similar stages.</p>
-            </div>
-            
-            <div class="page-break">
-                <h2>Key Investment Considerations</h2>
-                <ul>
-                    <li><strong>Market Opportunity:</strong> Evaluate the TAM, SAM, and SOM analysis provided</li>
-                    <li><strong>Team Assessment:</strong> Review the founding team's background and capabilities</li>
-                    <li><strong>Financial Health:</strong> Consider the current financial metrics and runway</li>
-                    <li><strong>Competitive Position:</strong> Assess the company's competitive advantages</li>
-                    <li><strong>Risk Factors:</strong> Review the identified risks and mitigation strategies</li>
-                </ul>
-            </div>
-        </body>
-        </html>
-        """
-        
-        # Try to use weasyprint first (more reliable)
-        try:
-            from weasyprint import HTML
-            # Create PDF using weasyprint
-            pdf_bytes = HTML(string=html_content).write_pdf()
-            return pdf_bytes
-        except ImportError:
-            # Fallback to pdfkit if weasyprint is not available
-            try:
-                import pdfkit
-                # Configure pdfkit options
-                options = {
-                    'page-size': 'A4',
-                    'margin-top': '0.75in',
-                    'margin-right': '0.75in',
-                    'margin-bottom': '0.75in',
-                    'margin-left': '0.75in',
-                    'encoding': "UTF-8",
-                    'no-outline': None
-                }
-                
-                # Create PDF using pdfkit
-                pdf_bytes = pdfkit.from_string(html_content, False, options=options)
-                return pdf_bytes
-            except ImportError:
-                st.error("PDF generation libraries not available. Install with: pip install weasyprint or pip install pdfkit")
-                return None
-                
-    except Exception as e:
-        st.error(f"Error generating PDF: {e}")
-        return None
-
 # Google Drive API and file processing functions
 def setup_google_drive_api():
     """
@@ -1127,188 +1226,29 @@ def setup_google_drive_api():
         st.error(f"Error setting up Google Drive API: {e}")
         return None
 
-def extract_text_from_pdf(file_bytes):
-    """Extract text from PDF file"""
-    try:
-        import PyPDF2
-        
-        pdf_file = io.BytesIO(file_bytes)
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
-        
-        return text.strip()
-    
-    except ImportError:
-        st.error("PDF processing library not available. Install with: pip install PyPDF2")
-        return None
-    except Exception as e:
-        st.error(f"Error extracting text from PDF: {e}")
-        return None
-
-def extract_text_from_docx(file_bytes):
-    """Extract text from Word document"""
-    try:
-        from docx import Document
-        
-        doc_file = io.BytesIO(file_bytes)
-        doc = Document(doc_file)
-        
-        text = ""
-        for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
-        
-        return text.strip()
-    
-    except ImportError:
-        st.error("Word document processing library not available. Install with: pip install python-docx")
-        return None
-    except Exception as e:
-        st.error(f"Error extracting text from Word document: {e}")
-        return None
-
-def extract_text_from_excel(file_bytes):
-    """Extract text from Excel file"""
-    try:
-        import pandas as pd
-        
-        excel_file = io.BytesIO(file_bytes)
-        
-        # Read all sheets
-        excel_data = pd.read_excel(excel_file, sheet_name=None)
-        
-        text = ""
-        for sheet_name, df in excel_data.items():
-            text += f"Sheet: {sheet_name}\n"
-            text += df.to_string(index=False) + "\n\n"
-        
-        return text.strip()
-    
-    except ImportError:
-        st.error("Excel processing library not available. Install with: pip install openpyxl pandas")
-        return None
-    except Exception as e:
-        st.error(f"Error extracting text from Excel file: {e}")
-        return None
-
-def extract_text_from_image(file_bytes):
-    """Extract text from image using OCR"""
-    if not IMAGE_PROCESSING_AVAILABLE:
-        st.error("Image processing libraries not available. Install with: pip install pillow pytesseract")
-        st.info("Also ensure Tesseract OCR is installed on your system")
-        return None
-    
-    try:
-        # Open image from bytes
-        image = Image.open(io.BytesIO(file_bytes))
-        
-        # Use OCR to extract text
-        text = pytesseract.image_to_string(image)
-        
-        return text.strip()
-    
-    except Exception as e:
-        st.error(f"Error extracting text from image: {e}")
-        st.info("Make sure Tesseract OCR is installed on your system")
-        return None
-
-def process_uploaded_file(uploaded_file):
-    """Process uploaded file and extract text content"""
-    if uploaded_file is None:
-        return None
-    
-    file_bytes = uploaded_file.read()
-    file_name = uploaded_file.name.lower()
-    
-    # Reset file pointer
-    uploaded_file.seek(0)
-    
-    text_content = None
-    
-    if file_name.endswith('.pdf'):
-        text_content = extract_text_from_pdf(file_bytes)
-    elif file_name.endswith('.docx'):
-        text_content = extract_text_from_docx(file_bytes)
-    elif file_name.endswith(('.xlsx', '.xls')):
-        text_content = extract_text_from_excel(file_bytes)
-    elif file_name.endswith('.txt'):
-        text_content = file_bytes.decode('utf-8')
-    elif file_name.endswith(('.png', '.jpg', '.jpeg', '.tiff', '.bmp')):
-        text_content = extract_text_from_image(file_bytes)
-    else:
-        st.error(f"Unsupported file type: {file_name}")
-        return None
-    
-    return text_content
-
-def extract_company_info_from_text(text_content):
-    """Use AI to extract company information from document text"""
+def extract_company_info_from_text(text_content, use_cache=True, chunked=True):
+    """Use AI to extract company information from document text (all of it in chunks, or the first 4000 characters)"""
     if not text_content:
         return None
     
-    extraction_prompt = f"""
-    Analyze the following document text and extract company information for an investment memo.
-    
-    Document Content:
-    {text_content[:4000]}  # Limit to first 4000 characters to avoid token limits
-    
-    Extract and return the following information in JSON format:
-    - company_name: Company name if mentioned
-    - company_overview: Business description, what they do, target market, business model (3-4 sentences)
-    - team_background: Information about founders, team members, their backgrounds (if available)
-    - financials: Any financial information mentioned (revenue, funding, burn rate, etc.)
-    - market_info: Market size, competitors, market opportunity (if mentioned)
-    - stage: Investment stage if mentioned (Pre-seed, Seed, Series A, etc.)
-    - key_metrics: Important numbers or KPIs mentioned
-    - additional_notes: Any other relevant information for investment analysis
-    
-    If information is not available in the document, set the field to empty string.
-    Return only valid JSON.
-    """
-    
     try:
-        client = openai.OpenAI(api_key=openai.api_key)
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[{"role": "user", "content": extraction_prompt}],
-            temperature=0.3,
-            max_tokens=1500
-        )
-        
-        data_text = response.choices[0].message.content
-        
-        # Extract JSON from response
-        start_idx = data_text.find('{')
-        end_idx = data_text.rfind('}') + 1
-        json_str = data_text[start_idx:end_idx]
-        
-        return json.loads(json_str)
-    
+        extracted_info, report = llm_runtime.run(extract_company_info(
+            llm_runtime.client, text_content, use_cache=use_cache, chunked=chunked
+        ))
     except Exception as e:
         st.error(f"Error extracting company information: {e}")
         return None
-
-def download_from_google_drive(file_id, service):
-    """Download file from Google Drive using file ID"""
-    try:
-        from googleapiclient.http import MediaIoBaseDownload
-        
-        request = service.files().get_media(fileId=file_id)
-        file_io = io.BytesIO()
-        downloader = MediaIoBaseDownload(file_io, request)
-        
-        done = False
-        while done is False:
-            status, done = downloader.next_chunk()
-        
-        file_io.seek(0)
-        return file_io.getvalue()
     
-    except Exception as e:
-        st.error(f"Error downloading from Google Drive: {e}")
-        return None
+    for field, values in report["conflicts"].items():
+        st.warning(
+            f"Documents disagree on {field.replace('_', ' ')}: {' vs '.join(values)}. "
+            f"Using \"{extracted_info[field]}\", the value most documents give."
+        )
+    if report["failed_chunks"]:
+        st.warning(f"{report['failed_chunks']} of {report['chunks']} document excerpts could not be analyzed.")
+    if report["skipped_chars"]:
+        st.caption(f"{report['skipped_chars']:,} characters beyond the reading limit were not analyzed.")
+    return extracted_info
 
 # Welcome Page
 if st.session_state.show_welcome:
@@ -1366,6 +1306,63 @@ else:
                     st.session_state.test_data = test_data
                     st.rerun()
         
+        st.markdown("---")
+        st.markdown("### AI Settings")
+        use_llm_cache = st.checkbox(
+            "Reuse cached AI responses",
+            value=True,
+            help="Identical prompts are answered from a local cache. Uncheck to force fresh responses."
+        )
+        stream_memo = st.checkbox(
+            "Stream memo as it is written",
+            value=True,
+            help="Show the memo and VC review token by token instead of waiting for each to finish."
+        )
+        read_full_documents = st.checkbox(
+            "Read uploaded documents in full",
+            value=True,
+            help="Analyze every uploaded document in parallel chunks and merge the results. "
+                 "Uncheck to only read the first 4000 characters (one request)."
+        )
+        document_char_budget = chunked_char_budget() if read_full_documents else DOCUMENT_CHAR_BUDGET
+        sectioned_memo = st.checkbox(
+            "Build memo section by section",
+            value=False,
+            help="Write the memo as separate sections (team, market, financials, ...) in parallel, which is faster "
+                 "than one long memo. After you correct a field, generating again only rewrites the sections that use it."
+        )
+        if response_cache is not None:
+            cache_stats = response_cache.stats()
+            st.caption(f"{cache_stats['entries']} cached responses • {cache_stats['bytes'] / 1024:.0f} KB")
+        connection_stats = llm_runtime.connection_stats.snapshot()
+        st.caption(
+            f"{connection_stats['requests']} API requests • {connection_stats['new_connections']} connections opened • "
+            f"{connection_stats['reused']} reused ({connection_stats['reuse_ratio']:.0%})"
+        )
+        scheduler_stats = request_scheduler.snapshot()
+        if scheduler_stats["retries"] or scheduler_stats["failed"]:
+            st.caption(
+                f"{scheduler_stats['rate_limited']} rate-limited • {scheduler_stats['retries']} retried • "
+                f"{scheduler_stats['failed']} failed • {scheduler_stats['queue_seconds']:.1f}s queued"
+            )
+        route_stats = model_router.latency_stats()
+        if route_stats:
+            with st.expander("Model routes & latency"):
+                for route, route_stat in route_stats.items():
+                    latency = f"{route_stat['mean']:.1f}s avg" if route_stat["mean"] is not None else "no API calls"
+                    st.caption(
+                        f"**{route}** → {route_stat['model']}: {route_stat['calls']} calls, "
+                        f"{route_stat['cache_hits']} cached, {latency}"
+                    )
+        telemetry_runs = st.session_state.get("telemetry_runs", [])
+        if telemetry_runs:
+            st.markdown("---")
+            st.markdown("### Run Timings")
+            for trace in reversed(telemetry_runs[-5:]):
+                subject = trace.attributes.get("company") or trace.attributes.get("source", "")
+                with st.expander(f"{trace.kind.title()} • {subject} • {trace.wall:.1f}s ({trace.status or 'running'})"):
+                    render_run_waterfall(trace)
+        
         st.markdown("---")
         st.markdown("### Supported Files")
         st.markdown("📄 PDF • 📝 Word • 📊 Excel • 📋 Text • 🖼️ Images")
@@ -1406,23 +1403,63 @@ else:
             )
             
             if uploaded_files:
+                with st.expander("Advanced extraction options"):
+                    pdf_pages = st.text_input(
+                        "PDF pages to read",
+                        placeholder="e.g. 1-10, 15, 20-",
+                        help="Only read these pages of each PDF. Leave empty to read from the first page until "
+                             "there is enough text for the analysis."
+                    )
+                page_range_error = None
+                try:
+                    pdf_page_ranges = parse_page_ranges(pdf_pages)
+                except ValueError as e:
+                    pdf_page_ranges = None
+                    page_range_error = str(e)
+                    st.error(page_range_error)
+                
                 # Process uploaded files
-                if st.button("🔍 Extract Information from Files", use_container_width=True, type="primary"):
+                if st.button("🔍 Extract Information from Files", use_container_width=True, type="primary",
+                             disabled=page_range_error is not None):
                     extracted_data = {}
                     all_text_content = ""
+                    extraction_trace = telemetry.RunTrace("extraction", source="upload", files=len(uploaded_files))
+                    remember_run(extraction_trace)
                     
-                    with st.spinner("Processing uploaded files..."):
-                        for uploaded_file in uploaded_files:
-                            # Extract text from file
-                            text_content = process_uploaded_file(uploaded_file)
-                            
+                    with st.spinner("Processing uploaded files..."), telemetry.activate(extraction_trace):
+                        # Extract every file in parallel worker processes; each shows as done when it finishes
+                        files = [(uploaded_file.name, uploaded_file.getvalue()) for uploaded_file in uploaded_files]
+                        file_status = []
+                        for file_name, _ in files:
+                            file_status.append(st.empty())
+                            file_status[-1].caption(f"⏳ {file_name}")
+                        
+                        texts = [None] * len(files)
+                        # PDFs stop parsing once they have yielded as much text as the analysis reads
+                        for extracted in extract_files(files, max_chars=document_char_budget, page_ranges=pdf_page_ranges):
+                            if extracted["error"] is not None:
+                                file_status[extracted["index"]].error(f"❌ {extracted['name']}: {extracted['error']}")
+                            else:
+                                texts[extracted["index"]] = extracted["text"]
+                                if extracted["warnings"]:
+                                    file_status[extracted["index"]].warning(
+                                        f"⚠️ {extracted['name']} ({extracted['seconds']:.1f}s): " + " ".join(extracted["warnings"])
+                                    )
+                                else:
+                                    file_status[extracted["index"]].caption(f"✅ {extracted['name']} ({extracted['seconds']:.1f}s)")
+                        
+                        # Combined in upload order, so the same files always give the same prompt
+                        for (file_name, _), text_content in zip(files, texts):
                             if text_content:
-                                all_text_content += f"\n\n=== {uploaded_file.name} ===\n{text_content}"
+                                all_text_content += f"\n\n=== {file_name} ===\n{text_content}"
                     
                     if all_text_content:
                         # Use AI to extract company information
-                        with st.spinner("Analyzing documents with AI..."):
-                            extracted_info = extract_company_info_from_text(all_text_content)
+                        with st.spinner("Analyzing documents with AI..."), telemetry.activate(extraction_trace):
+                            extracted_info = extract_company_info_from_text(
+                                all_text_content, use_cache=use_llm_cache, chunked=read_full_documents
+                            )
+                            extraction_trace.finish("done" if extracted_info else "failed")
                             
                             if extracted_info:
                                 # Store extracted data in session state
@@ -1469,6 +1506,8 @@ else:
                                     st.rerun()
                             else:
                                 st.error("❌ Failed to extract company information from documents.")
+                    else:
+                        extraction_trace.finish("no_text")
         
         with upload_tab2:
             # Google Drive setup
@@ -1490,69 +1529,76 @@ else:
             
             if gdrive_input and st.session_state.get('drive_service'):
                 if st.button("📥 Download and Process Google Drive Files", use_container_width=True, type="primary"):
-                    lines = gdrive_input.strip().split('\n')
-                    file_ids = []
-                    
-                    # Extract file IDs from various formats
-                    for line in lines:
-                        line = line.strip()
-                        if not line:
-                            continue
-                        
-                        # Extract file ID from different URL formats
-                        if 'drive.google.com/file/d/' in line:
-                            file_id = line.split('/file/d/')[1].split('/')[0]
-                            file_ids.append(file_id)
-                        elif 'docs.google.com/document/d/' in line:
-                            file_id = line.split('/document/d/')[1].split('/')[0]
-                            file_ids.append(file_id)
-                        elif 'docs.google.com/spreadsheets/d/' in line:
-                            file_id = line.split('/spreadsheets/d/')[1].split('/')[0]
-                            file_ids.append(file_id)
-                        else:
-                            # Assume it's a direct file ID
-                            file_ids.append(line)
+                    file_ids = parse_file_ids(gdrive_input)
                     
                     if file_ids:
                         all_gdrive_content = ""
+                        extraction_trace = telemetry.RunTrace("extraction", source="google_drive", files=len(file_ids))
+                        remember_run(extraction_trace)
                         
-                        with st.spinner(f"Downloading {len(file_ids)} file(s) from Google Drive..."):
-                            for i, file_id in enumerate(file_ids):
-                                try:
-                                    st.info(f"Downloading file {i+1}/{len(file_ids)}: {file_id}")
-                                    
-                                    # Download file content
-                                    file_bytes = download_from_google_drive(file_id, st.session_state.drive_service)
-                                    
-                                    if file_bytes:
-                                        # Try to determine file type and extract text
-                                        # This is a simplified approach - in practice, you'd want to get the file metadata
-                                        try:
-                                            # Try as text first
-                                            text_content = file_bytes.decode('utf-8')
-                                            all_gdrive_content += f"\n\n=== Google Drive File {i+1} ===\n{text_content}"
-                                            st.success(f"✅ Processed file {i+1}")
-                                        except:
-                                            # Try as PDF
-                                            try:
-                                                text_content = extract_text_from_pdf(file_bytes)
-                                                if text_content:
-                                                    all_gdrive_content += f"\n\n=== Google Drive File {i+1} ===\n{text_content}"
-                                                    st.success(f"✅ Processed PDF file {i+1}")
-                                                else:
-                                                    st.warning(f"⚠️ Could not extract text from file {i+1}")
-                                            except:
-                                                st.error(f"❌ Unsupported file format for file {i+1}")
+                        with st.spinner(f"Downloading {len(file_ids)} file(s) from Google Drive..."), \
+                                telemetry.activate(extraction_trace):
+                            file_status = []
+                            for file_id in file_ids:
+                                file_status.append(st.empty())
+                                file_status[-1].caption(f"⏳ {file_id}")
+                            
+                            # Metadata for all files in one batch, then concurrent downloads; Google Docs,
+                            # Sheets and Slides are exported as text/CSV. Unchanged files come from the
+                            # Drive cache, already extracted
+                            downloaded, metadata, texts = {}, {}, {}
+                            try:
+                                for result in download_files(st.session_state.drive_service, file_ids,
+                                                             max_chars=document_char_budget):
+                                    if result["error"] is not None:
+                                        file_status[result["index"]].error(f"❌ {result['name']}: {result['error']}")
+                                    elif result["text"] is not None:
+                                        downloaded[result["index"]] = (result["name"], None)
+                                        if result["text"]:
+                                            texts[result["index"]] = result["text"]
+                                        file_status[result["index"]].caption(f"✅ {result['name']} (unchanged, cached)")
+                                    else:
+                                        metadata[result["index"]] = result["metadata"]
+                                        downloaded[result["index"]] = (result["name"], result["bytes"])
+                                        file_status[result["index"]].caption(
+                                            f"⬇️ {result['name']} ({len(result['bytes']) / 1024:,.0f} KB, "
+                                            f"{result['seconds']:.1f}s), extracting..."
+                                        )
+                            except Exception as e:
+                                st.error(f"❌ Error downloading from Google Drive: {e}")
+                            
+                            # Each file goes to the extractor for its type, in the extraction worker pool
+                            order = sorted(metadata)
+                            files = [downloaded[index] for index in order]
+                            for extracted in extract_files(files, max_chars=document_char_budget):
+                                index = order[extracted["index"]]
+                                if extracted["error"] is not None:
+                                    file_status[index].error(f"❌ {extracted['name']}: {extracted['error']}")
+                                    continue
+                                if not extracted["warnings"]:
+                                    # Text with pages that could not be OCR'd is extracted again next time
+                                    store_text(metadata[index], extracted["text"], max_chars=document_char_budget)
+                                if extracted["text"]:
+                                    texts[index] = extracted["text"]
+                                    if extracted["warnings"]:
+                                        file_status[index].warning(f"⚠️ {extracted['name']}: " + " ".join(extracted["warnings"]))
                                     else:
-                                        st.error(f"❌ Failed to download file {i+1}")
-                                        
-                                except Exception as e:
-                                    st.error(f"❌ Error processing file {i+1}: {e}")
+                                        file_status[index].caption(f"✅ {extracted['name']}")
+                                else:
+                                    file_status[index].warning(f"⚠️ Could not extract text from {extracted['name']}")
+                            
+                            # Combined in input order, like uploads
+                            for index in sorted(downloaded):
+                                if index in texts:
+                                    all_gdrive_content += f"\n\n=== {downloaded[index][0]} ===\n{texts[index]}"
                         
                         # Process extracted content
                         if all_gdrive_content:
-                            with st.spinner("Analyzing Google Drive documents with AI..."):
-                                extracted_info = extract_company_info_from_text(all_gdrive_content)
+                            with st.spinner("Analyzing Google Drive documents with AI..."), telemetry.activate(extraction_trace):
+                                extracted_info = extract_company_info_from_text(
+                                    all_gdrive_content, use_cache=use_llm_cache, chunked=read_full_documents
+                                )
+                                extraction_trace.finish("done" if extracted_info else "failed")
                                 
                                 if extracted_info:
                                     st.success("🎉 Successfully extracted information from Google Drive files!")
@@ -1563,6 +1609,8 @@ else:
                                         st.json(extracted_info)
                                 else:
                                     st.error("❌ Failed to extract company information from Google Drive documents.")
+                        else:
+                            extraction_trace.finish("no_text")
                     else:
                         st.error("❌ No valid file IDs found. Please check your input.")
             
@@ -1693,410 +1741,42 @@ else:
                 if not company_name or not company_overview or not team_background:
                     st.error("Please fill in all three main sections: Company Overview, Company Name, and Team Background.")
                 else:
-                    with st.spinner("Categorizing company data and generating memo..."):
-                        # Extract market category from company overview using AI
-                        market_extraction_prompt = f"""
-                        Based on this company overview, extract the market category:
-                        
-                        Company Overview: {company_overview}
-                        
-                        Return only the market category (e.g., "Fintech", "Healthtech", "Edtech", "Enterprise SaaS", "Consumer", "Marketplace", "Hardware", etc.) in a single word or short phrase.
-                        """
-                        
-                        try:
-                            client = openai.OpenAI(api_key=openai.api_key)
-                            market_response = client.chat.completions.create(
-                                model="gpt-4",
-                                messages=[{"role": "user", "content": market_extraction_prompt}],
-                                temperature=0.3,
-                                max_tokens=50
-                            )
-                            market_category = market_response.choices[0].message.content.strip()
-                        except:
-                            market_category = "Technology"
-                        
-                        # First, categorize and populate all the detailed fields
-                        categorized_data = categorize_company_data(company_name, company_overview, market_category)
-                        
-                        if categorized_data:
-                            # Build the complete company data dictionary
-                            company_data = {
-                                "company_name": company_name,
-                                "website": website or categorized_data.get("website", ""),
-                                "launch_year": launch_year or categorized_data.get("launch_year", ""),
-                                "team_size": team_size or categorized_data.get("team_size", ""),
-                                "stage": stage or categorized_data.get("stage", ""),
-                                "one_liner": categorized_data.get("one_liner", ""),
-                                "company_description": company_overview,
-                                "market_size": market_size or categorized_data.get("market_size", ""),
-                                "tam": tam or categorized_data.get("tam", ""),
-                                "sam": sam or categorized_data.get("sam", ""),
-                                "som": som or categorized_data.get("som", ""),
-                                "current_cash": current_cash or categorized_data.get("current_cash", ""),
-                                "burn_rate": burn_rate or categorized_data.get("burn_rate", ""),
-                                "revenue": revenue or categorized_data.get("revenue", ""),
-                                "prev_raised": prev_raised or categorized_data.get("prev_raised", ""),
-                                "round_size": round_size or categorized_data.get("round_size", ""),
-                                "post_money_valuation": post_money_valuation or categorized_data.get("post_money_valuation", ""),
-                                "use_of_capital": use_of_capital or categorized_data.get("use_of_capital", ""),
-                                "market": market_category,
-                                "named_competitors": categorized_data.get("named_competitors", ""),
-                                "founder_1_name": categorized_data.get("founder_1_name", ""),
-                                "founder_1_bio": categorized_data.get("founder_1_bio", ""),
-                                "founder_2_name": categorized_data.get("founder_2_name", ""),
-                                "founder_2_bio": categorized_data.get("founder_2_bio", ""),
-                                "founder_3_name": categorized_data.get("founder_3_name", ""),
-                                "founder_3_bio": categorized_data.get("founder_3_bio", ""),
-                                "founder_4_name": categorized_data.get("founder_4_name", ""),
-                                "founder_4_bio": categorized_data.get("founder_4_bio", ""),
-                                "misc_notes": team_background,
-                                "pros": categorized_data.get("pros", ""),
-                                "cons": categorized_data.get("cons", ""),
-                                "best_case": categorized_data.get("best_case", ""),
-                                "worst_case": categorized_data.get("worst_case", "")
-                            }
-                            
-                            # Use a simple formatter to replace placeholders in the base_prompt
-                            def format_prompt(data, prompt):
-                                formatted = prompt
-                                for key, value in data.items():
-                                    formatted = formatted.replace("{{" + key + "}}", str(value))
-                                return formatted
-
-                            # Load your base prompt
-                            with open("base_prompt.txt", "r") as f:
-                                base_prompt = f.read()
-                            
-                            final_prompt = format_prompt(company_data, base_prompt)
-                            
-                            # Stage 1: Generate initial memo
-                            try:
-                                client = openai.OpenAI(api_key=openai.api_key)
-                                response = client.chat.completions.create(
-                                    model="gpt-4",
-                                    messages=[{"role": "user", "content": final_prompt}],
-                                    temperature=0.7,
-                                    max_tokens=2000
-                                )
-                                initial_memo = response.choices[0].message.content
-                                
-                                # Stage 2: VC Critical Review
-                                vc_review_prompt = f"""
-                                Answer the following question based solely on the provided context. If the context is insufficient, say 'I don't know.' Do not make up facts.
-
-                                Now overlook this memo with a critical eye. You are a venture capitalist, and your savings are being invested into this endeavor, you only want to put your money into the best ideas. However, you want to cast a wide net, because if you invest in even one idea that becomes big, you've struck gold.
-
-                                Here is the investment memo to review:
-
-                                {initial_memo}
-
-                                Please provide a comprehensive VC analysis that includes:
-                                1. **Investment Thesis**: Why this could be a winning investment
-                                2. **Key Strengths**: What makes this company compelling
-                                3. **Major Risks**: What could go wrong
-                                4. **Market Opportunity**: Assessment of the market size and timing
-                                5. **Team Assessment**: Evaluation of the founding team
-                                6. **Competitive Analysis**: How they stack up against competitors
-                                7. **Financial Health**: Assessment of current financials and runway
-                                8. **Investment Recommendation**: Pass, Consider, or Invest with reasoning
-                                9. **Due Diligence Items**: What you'd want to investigate further
-                                10. **Exit Potential**: Realistic exit scenarios and timelines
-
-                                Format this as a professional VC analysis report with clear sections and actionable insights.
-                                Base all analysis solely on the information provided in the memo. If any information is missing or unclear, explicitly state what additional information would be needed for a complete assessment.
-                                """
-                                
-                                vc_response = client.chat.completions.create(
-                                    model="gpt-4",
-                                    messages=[{"role": "user", "content": vc_review_prompt}],
-                                    temperature=0.6,
-                                    max_tokens=2500
-                                )
-                                vc_analysis = vc_response.choices[0].message.content
-                                
-                                # Combine the memo and VC analysis
-                                final_memo = f"""
-                                # Investment Memo
-                                
-                                {initial_memo}
-                                
-                                ---
-                                
-                                # Venture Capital Analysis
-                                
-                                {vc_analysis}
-                                """
-                                st.markdown("---")
-                                st.markdown("## Generated Investment Memo & VC Analysis")
-                                
-                                # Display memo with proper styling
-                                st.markdown(f"""
-                                <div class="memo-container">
-                                    {final_memo}
-                                </div>
-                                """, unsafe_allow_html=True)
-                                
-                                # Market Size Hierarchy Visualization
-                                st.markdown("---")
-                                st.markdown("## Market Size Hierarchy")
-                                
-                                # Create and display the TAM > SAM > SOM visualization
-                                market_hierarchy_fig = create_market_size_hierarchy(tam, sam, som, company_name)
-                                if market_hierarchy_fig:
-                                    st.plotly_chart(market_hierarchy_fig, use_container_width=True)
-                                    
-                                    # Add explanation
-                                    st.markdown("""
-                                    **Market Size Definitions:**
-                                    - **TAM (Total Addressable Market):** The total market demand for a product or service
-                                    - **SAM (Serviceable Addressable Market):** The portion of TAM that your product can realistically serve
-                                    - **SOM (Serviceable Obtainable Market):** The portion of SAM that you can realistically capture in 3-5 years
-                                    """)
-                                else:
-                                    pass
-                                
-                                # Investment Stage Analysis
-                                st.markdown("---")
-                                st.markdown("## Investment Stage Analysis")
-                                
-                                # Create and display the investment stage visualization
-                                stage_analysis_fig = create_investment_stage_visualization(
-                                    stage, company_name, revenue, burn_rate, team_size, prev_raised, round_size
-                                )
-                                if stage_analysis_fig:
-                                    st.plotly_chart(stage_analysis_fig, use_container_width=True)
-                                    
-                                    # Add stage-specific insights
-                                    stage_insights = {
-                                        "Pre-seed": "**Pre-seed Stage:** Focus on idea validation and MVP development. Key metrics: product-market fit signals, early user feedback, technical feasibility.",
-                                        "Seed": "**Seed Stage:** Building product-market fit and acquiring early customers. Key metrics: customer acquisition cost, retention rates, revenue growth.",
-                                        "Series A": "**Series A Stage:** Scaling operations and expanding market reach. Key metrics: unit economics, market penetration, team scaling.",
-                                        "Series B": "**Series B Stage:** Rapid growth and market leadership. Key metrics: market share, competitive positioning, operational efficiency.",
-                                        "Series C": "**Series C Stage:** Market dominance and IPO preparation. Key metrics: market leadership, profitability, international expansion.",
-                                        "Series D+": "**Series D+ Stage:** Late-stage growth and exit preparation. Key metrics: exit readiness, market consolidation, strategic partnerships."
-                                    }
-                                    
-                                    current_stage = stage or "Series A"
-                                    insight = stage_insights.get(current_stage, stage_insights["Series A"])
-                                    st.info(insight)
-                                else:
-                                    pass
-                                
-                                # Market Analysis Section
-                                st.markdown("---")
-                                st.markdown("## Market Analysis")
-                                
-                                # Function to analyze market data
-                                def analyze_market_data(market_category, market_size, revenue, stage):
-                                    analysis_prompt = f"""
-                                    Analyze this startup's market position:
-                                    
-                                    Market Category: {market_category}
-                                    Market Size (TAM): {market_size}
-                                    Current Revenue: {revenue}
-                                    Stage: {stage}
-                                    
-                                    Provide analysis in JSON format with:
-                                    - market_penetration_percentage: Calculate what percentage of TAM they've captured
-                                    - typical_penetration_range: Typical range for companies at this stage in this market
-                                    - market_opportunity: Remaining market opportunity
-                                    - competitive_position: How they compare to typical companies
-                                    - growth_potential: Assessment of growth potential
-                                    - market_maturity: Is this market early, growing, or mature
-                                    - stage_appropriateness: Is their penetration appropriate for their stage
-                                    
-                                    Return only valid JSON.
-                                    """
-                                    
-                                    try:
-                                        client = openai.OpenAI(api_key=openai.api_key)
-                                        response = client.chat.completions.create(
-                                            model="gpt-4",
-                                            messages=[{"role": "user", "content": analysis_prompt}],
-                                            temperature=0.3,
-                                            max_tokens=800
-                                        )
-                                        
-                                        import json
-                                        data_text = response.choices[0].message.content
-                                        
-                                        # Extract JSON
-                                        start_idx = data_text.find('{')
-                                        end_idx = data_text.rfind('}') + 1
-                                        json_str = data_text[start_idx:end_idx]
-                                        return json.loads(json_str)
-                                    except Exception as e:
-                                        st.error(f"Error analyzing market data: {e}")
-                                        return None
-                                
-                                # Perform market analysis
-                                final_market_size = market_size or categorized_data.get("market_size")
-                                final_revenue = revenue or categorized_data.get("revenue")
-                                final_stage = stage or categorized_data.get("stage")
-                                
-                                if market_category and final_market_size and final_revenue:
-                                    with st.spinner("Analyzing market position..."):
-                                        market_analysis = analyze_market_data(market_category, final_market_size, final_revenue, final_stage)
-                                        
-                                        if market_analysis:
-                                            # Display market analysis
-                                            col1, col2 = st.columns(2)
-                                            
-                                            with col1:
-                                                st.markdown("### Market Position Analysis")
-                                                st.metric("Market Penetration", 
-                                                         f"{market_analysis.get('market_penetration_percentage', 'N/A')}%")
-                                                st.metric("Typical Range", 
-                                                         market_analysis.get('typical_penetration_range', 'N/A'))
-                                                st.metric("Market Maturity", 
-                                                         market_analysis.get('market_maturity', 'N/A'))
-                                            
-                                            with col2:
-                                                st.markdown("### Growth Assessment")
-                                                st.metric("Remaining Opportunity", 
-                                                         market_analysis.get('market_opportunity', 'N/A'))
-                                                st.metric("Competitive Position", 
-                                                         market_analysis.get('competitive_position', 'N/A'))
-                                                st.metric("Stage Appropriateness", 
-                                                         market_analysis.get('stage_appropriateness', 'N/A'))
-                                            
-                                            # Market penetration visualization
-                                            st.markdown("### Market Penetration Visualization")
-                                            
-                                            try:
-                                                import plotly.graph_objects as go
-                                                import plotly.express as px
-                                                
-                                                # Extract percentage for visualization
-                                                penetration_text = market_analysis.get('market_penetration_percentage', '0')
-                                                if isinstance(penetration_text, str):
-                                                    # Clean the text and extract number
-                                                    penetration_text = penetration_text.replace('%', '').replace(',', '').strip()
-                                                    try:
-                                                        penetration = float(penetration_text)
-                                                    except:
-                                                        penetration = 0.0
-                                                else:
-                                                    penetration = float(penetration_text)
-                                                
-                                                # Ensure penetration is reasonable
-                                                penetration = max(0, min(100, penetration))
-                                                
-                                                # Create gauge chart for market penetration
-                                                fig = go.Figure(go.Indicator(
-                                                    mode = "gauge+number+delta",
-                                                    value = penetration,
-                                                    domain = {'x': [0, 1], 'y': [0, 1]},
-                                                    title = {'text': f"Market Penetration (%)"},
-                                                    delta = {'reference': 5},  # Typical early stage
-                                                    gauge = {
-                                                        'axis': {'range': [None, 100]},
-                                                        'bar': {'color': "#3b82f6"},
-                                                        'steps': [
-                                                            {'range': [0, 5], 'color': "lightgray"},
-                                                            {'range': [5, 20], 'color': "yellow"},
-                                                            {'range': [20, 100], 'color': "green"}
-                                                        ],
-                                                        'threshold': {
-                                                            'line': {'color': "red", 'width': 4},
-                                                            'thickness': 0.75,
-                                                            'value': 90
-                                                        }
-                                                    }
-                                                ))
-                                                
-                                                fig.update_layout(
-                                                    title=f"{company_name} - Market Penetration Analysis",
-                                                    font=dict(size=14),
-                                                    height=400
-                                                )
-                                                
-                                                st.plotly_chart(fig, use_container_width=True)
-                                                
-                                                # Market opportunity pie chart
-                                                if penetration < 100:
-                                                    remaining = 100 - penetration
-                                                    
-                                                    fig2 = go.Figure(data=[go.Pie(
-                                                        labels=['Captured Market', 'Remaining Opportunity'],
-                                                        values=[penetration, remaining],
-                                                        hole=.3,
-                                                        marker_colors=['#3b82f6', '#e5e7eb']
-                                                    )])
-                                                    
-                                                    fig2.update_layout(
-                                                        title=f"Market Opportunity Breakdown",
-                                                        height=400
-                                                    )
-                                                    
-                                                    st.plotly_chart(fig2, use_container_width=True)
-                                                
-                                                # Growth potential assessment
-                                                st.markdown("### Growth Potential Assessment")
-                                                growth_potential = market_analysis.get('growth_potential', 'N/A')
-                                                st.info(f"**Growth Potential:** {growth_potential}")
-                                                
-                                            except ImportError:
-                                                st.warning("Plotly not available. Install with: pip install plotly")
-                                                st.json(market_analysis)
-                                            except Exception as e:
-                                                st.error(f"Error creating market penetration visualization: {e}")
-                                                st.json(market_analysis)
-                                            
-                                            # Market insights
-                                            st.markdown("### Market Insights")
-                                            insights = f"""
-                                            **Market Category:** {market_category}
-                                            **Total Addressable Market:** {final_market_size}
-                                            **Current Revenue:** {final_revenue}
-                                            **Company Stage:** {final_stage}
-                                            
-                                            **Key Insights:**
-                                            - Market Penetration: {market_analysis.get('market_penetration_percentage', 'N/A')}%
-                                            - Typical Range for {final_stage} companies: {market_analysis.get('typical_penetration_range', 'N/A')}
-                                            - Market Maturity: {market_analysis.get('market_maturity', 'N/A')}
-                                            - Competitive Position: {market_analysis.get('competitive_position', 'N/A')}
-                                            """
-                                            st.markdown(insights)
-                                
-                                # Download buttons
-                                col1, col2 = st.columns(2)
-                                
-                                with col1:
-                                    st.download_button(
-                                        label="Download Memo as Markdown",
-                                        data=final_memo,
-                                        file_name=f"{company_name}_investment_memo.md",
-                                        mime="text/markdown",
-                                        use_container_width=True
-                                    )
-                                
-                                with col2:
-                                    # Generate PDF
-                                    pdf_bytes = convert_memo_to_pdf(final_memo, company_name)
-                                    if pdf_bytes:
-                                        st.download_button(
-                                            label="Download Memo as PDF",
-                                            data=pdf_bytes,
-                                            file_name=f"{company_name}_investment_memo.pdf",
-                                            mime="application/pdf",
-                                            use_container_width=True
-                                        )
-                                    else:
-                                        st.info("PDF download requires additional libraries. Install with: pip install weasyprint")
-                                
-                                # Alternative PDF generation method
-                                st.markdown("---")
-                                st.markdown("### Alternative PDF Generation")
-                                st.markdown("""
-                                If the PDF download doesn't work, you can:
-                                1. **Copy the memo text** from above
-                                2. **Paste into a word processor** (Google Docs, Microsoft Word, etc.)
-                                3. **Export as PDF** from there
-                                4. **Or use online converters** like markdown-to-pdf.com
-                                """)
-                                
-                            except Exception as e:
-                                st.error(f"Error generating memo: {e}")
-                        else:
-                            st.error("Failed to categorize company data. Please try again.") 
\ No newline at end of file
+                    # Compiled once per process; re-read only when the file changes
+                    base_prompt = load_template("base_prompt.txt")
+                    
+                    form_data = {
+                        "company_name": company_name,
+                        "company_overview": company_overview,
+                        "team_background": team_background,
+                        "website": website,
+                        "launch_year": launch_year,
+                        "team_size": team_size,
+                        "stage": stage,
+                        "market_size": market_size,
+                        "tam": tam,
+                        "sam": sam,
+                        "som": som,
+                        "current_cash": current_cash,
+                        "burn_rate": burn_rate,
+                        "revenue": revenue,
+                        "prev_raised": prev_raised,
+                        "round_size": round_size,
+                        "post_money_valuation": post_money_valuation,
+                        "use_of_capital": use_of_capital,
+                    }
+                    
+                    # Sections from the last sectioned run; unchanged ones are reused as-is
+                    previous_sections = st.session_state.get("memo_sections") if use_llm_cache else None
+                    
+                    # Generate in a background job: widget clicks and reruns no longer abort it,
+                    # and the result is kept for later reruns (e.g. the download buttons)
+                    st.session_state.memo_job_id = job_manager.submit(
+                        form_data, base_prompt, use_cache=use_llm_cache,
+                        sectioned=sectioned_memo, previous_sections=previous_sections
+                    )
+                    remember_run(job_manager.get(st.session_state.memo_job_id).trace)
+            
+            # Show the current job's progress, or its finished memo, on every rerun
+            memo_job = job_manager.get(st.session_state.get("memo_job_id"))
+            if memo_job is not None:
+                render_memo_job(memo_job, stream_memo)
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Generate investment memos headlessly for a CSV or JSONL file of companies.
+
+Each row uses the same fields as the Streamlit form (company_name,
+company_overview, team_background, website, stage, revenue, ...). The
+startup_data keys from prompts.py (one_liner, founder_1, bio_1,
+cash_status, previous_funding, ...) are accepted as well.
+
+Usage:
+    python batch_memo.py companies.csv --out memos --jobs 4 --pdf
+
+Finished rows are recorded in <out>/batch_manifest.jsonl, so re-running the
+same command after an interruption only generates the missing memos.
+"""
+
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import os
+import re
+import statistics
+import sys
+import time
+
+import memo_export
+import telemetry
+from llm import LLMRuntime, model_router, request_scheduler, response_cache
+from memo_pipeline import run_memo_pipeline
+from prompt_template import load_template
+
+MANIFEST_NAME = "batch_manifest.jsonl"
+
+# prompts.py / base_prompt.txt names -> Streamlit form field names
+FIELD_ALIASES = {
+    "company_description": "company_overview",
+    "misc_notes": "team_background",
+    "cash_status": "current_cash",
+    "previous_funding": "prev_raised",
+    "valuation": "post_money_valuation",
+}
+
+FORM_FIELDS = [
+    "company_name", "company_overview", "team_background", "website", "launch_year",
+    "team_size", "stage", "market_size", "tam", "sam", "som", "current_cash",
+    "burn_rate", "revenue", "prev_raised", "round_size", "post_money_valuation",
+    "use_of_capital",
+]
+
+
+def read_rows(path):
+    """Read company rows from a .csv or .jsonl file"""
+    if path.lower().endswith((".jsonl", ".ndjson")):
+        with open(path, "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def normalize_row(row):
+    """Map a CSV/JSONL row onto the form_data dict expected by run_memo_pipeline"""
+    row = {key.strip(): str(value).strip() for key, value in row.items() if key and value is not None}
+    for alias, field in FIELD_ALIASES.items():
+        if row.get(alias) and not row.get(field):
+            row[field] = row[alias]
+
+    if not row.get("company_overview") and row.get("one_liner"):
+        row["company_overview"] = row["one_liner"]
+
+    if not row.get("team_background"):
+        founders = []
+        for i in range(1, 5):
+            name = row.get(f"founder_{i}") or row.get(f"founder_{i}_name")
+            bio = row.get(f"bio_{i}") or row.get(f"founder_{i}_bio")
+            if name:
+                founders.append(f"{name} – {bio}" if bio else name)
+        row["team_background"] = "; ".join(founders)
+
+    return {field: row.get(field, "") for field in FORM_FIELDS}
+
+
+def row_key(form_data):
+    """Stable identity of a row; editing any field makes it a new job"""
+    payload = json.dumps(form_data, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def output_stem(form_data, key):
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", form_data["company_name"]).strip("_") or "company"
+    return f"{slug}_{key[:8]}"
+
+
+def load_manifest(out_dir):
+    """Return the set of row keys already completed in a previous run"""
+    done = set()
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    done.add(json.loads(line)["key"])
+                except (ValueError, KeyError):
+                    continue
+    return done
+
+
+def write_atomic(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data.encode("utf-8") if isinstance(data, str) else data)
+    os.replace(tmp_path, path)
+
+
+async def generate_one(client, form_data, key, base_prompt, args, semaphore, manifest, stats):
+    async with semaphore:
+        started = time.perf_counter()
+        name = form_data.get("company_name") or key[:8]
+        trace = telemetry.RunTrace("batch", company=name, key=key)
+        status = "failed"
+        try:
+            with telemetry.activate(trace):
+                result = await run_memo_pipeline(client, form_data, base_prompt, use_cache=not args.no_cache)
+                stats["unfilled"].update(result.get("unfilled_placeholders", []))
+
+                error = result["errors"].get("categorize") or result["errors"].get("memo")
+                if error is not None:
+                    stats["failed"] += 1
+                    print(f"  ✗ {name}: {error}", file=sys.stderr)
+                    return
+
+                stem = os.path.join(args.out, output_stem(form_data, key))
+                final_memo = memo_export.compose_final_memo(result["initial_memo"], result["vc_analysis"])
+                write_atomic(stem + ".md", final_memo)
+                outputs = [stem + ".md"]
+
+                if args.pdf:
+                    with trace.span("pdf", "pdf"):
+                        try:
+                            pdf_bytes = await asyncio.to_thread(memo_export.convert_memo_to_pdf, final_memo, name)
+                            write_atomic(stem + ".pdf", pdf_bytes)
+                            outputs.append(stem + ".pdf")
+                        except Exception as e:
+                            print(f"  ! {name}: PDF export failed ({e}); Markdown written", file=sys.stderr)
+
+            elapsed = time.perf_counter() - started
+            manifest.write(json.dumps({"key": key, "company_name": name, "outputs": outputs, "seconds": round(elapsed, 2)}) + "\n")
+            manifest.flush()
+            status = "done"
+        except Exception as e:
+            # Anything else that goes wrong with one row (a write error, a pipeline bug) fails
+            # that row only; the rest of the batch carries on
+            stats["failed"] += 1
+            print(f"  ✗ {name}: {e}", file=sys.stderr)
+            return
+        finally:
+            trace.finish(status)
+            totals = trace.totals()
+            stats["tokens"] += totals["prompt_tokens"] + totals["completion_tokens"]
+            stats["cost_usd"] += totals["cost_usd"] or 0.0
+
+        stats["latencies"].append(elapsed)
+        stats["done"] += 1
+        print(f"  ✓ {name} ({elapsed:.1f}s)")
+
+
+async def run_batch(client, jobs, base_prompt, args):
+    semaphore = asyncio.Semaphore(args.jobs)
+    stats = {"done": 0, "failed": 0, "latencies": [], "unfilled": set(), "tokens": 0, "cost_usd": 0.0}
+    with open(os.path.join(args.out, MANIFEST_NAME), "a", encoding="utf-8") as manifest:
+        await asyncio.gather(*[
+            generate_one(client, form_data, key, base_prompt, args, semaphore, manifest, stats)
+            for form_data, key in jobs
+        ])
+    return stats
+
+
+def print_summary(total, skipped, invalid, stats, wall_time, runtime):
+    latencies = stats["latencies"]
+    print("\nBatch summary")
+    print(f"  rows:       {total} ({skipped} already done, {invalid} invalid)")
+    print(f"  generated:  {stats['done']}   failed: {stats['failed']}")
+    print(f"  wall time:  {wall_time:.1f}s")
+    if latencies:
+        print(f"  throughput: {stats['done'] / wall_time * 60:.1f} memos/min")
+        print(f"  per memo:   mean {statistics.mean(latencies):.1f}s, median {statistics.median(latencies):.1f}s, max {max(latencies):.1f}s")
+    if stats["tokens"]:
+        print(f"  spend:      {stats['tokens']:,} tokens, ~${stats['cost_usd']:.2f} estimated")
+    if stats["unfilled"]:
+        print(f"  prompt:     no data for {', '.join(sorted(stats['unfilled']))} (left blank)")
+    connections = runtime.connection_stats.snapshot()
+    print(f"  API:        {connections['requests']} requests, {connections['reused']} on reused connections")
+    scheduler_stats = request_scheduler.snapshot()
+    print(f"  scheduler:  {scheduler_stats['rate_limited']} rate-limited, {scheduler_stats['retries']} retries, "
+          f"{scheduler_stats['failed']} failed, {scheduler_stats['queue_seconds']:.1f}s queued")
+    if response_cache is not None:
+        cache_stats = response_cache.stats()
+        print(f"  cache:      {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+    for route, route_stat in model_router.latency_stats().items():
+        latency = f"mean {route_stat['mean']:.1f}s, max {route_stat['max']:.1f}s" if route_stat["calls"] else "cached only"
+        print(f"  {route:<21} {route_stat['model']}: {route_stat['calls']} calls, {latency}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate investment memos for a CSV/JSONL file of companies.")
+    parser.add_argument("input", help="CSV or JSONL file with one company per row")
+    parser.add_argument("--out", default="memos", help="output directory (default: memos)")
+    parser.add_argument("--jobs", type=int, default=4, help="memos generated concurrently (default: 4)")
+    parser.add_argument("--pdf", action="store_true", help="also write a PDF next to each Markdown memo")
+    parser.add_argument("--no-cache", action="store_true", help="bypass the LLM response cache")
+    parser.add_argument("--prompt", default="base_prompt.txt", help="memo prompt template (default: base_prompt.txt)")
+    args = parser.parse_args(argv)
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        parser.error("set the OPENAI_API_KEY environment variable")
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+
+    os.makedirs(args.out, exist_ok=True)
+    base_prompt = load_template(args.prompt)
+
+    rows = read_rows(args.input)
+    done = load_manifest(args.out)
+    jobs, skipped, invalid = [], 0, 0
+    for row in rows:
+        form_data = normalize_row(row)
+        if not form_data["company_name"] or not form_data["company_overview"]:
+            invalid += 1
+            continue
+        key = row_key(form_data)
+        if key in done:
+            skipped += 1
+            continue
+        done.add(key)
+        jobs.append((form_data, key))
+
+    print(f"Generating {len(jobs)} memo(s) with {args.jobs} concurrent job(s)...")
+    runtime = LLMRuntime.from_env(api_key)
+    started = time.perf_counter()
+    try:
+        stats = runtime.run(run_batch(runtime.client, jobs, base_prompt, args))
+    except KeyboardInterrupt:
+        print("\nInterrupted; re-run the same command to resume.", file=sys.stderr)
+        return 130
+    print_summary(len(rows), skipped, invalid, stats, time.perf_counter() - started, runtime)
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+End-to-end latency benchmark for the memo generation flow.
+
+Drives run_memo_pipeline (plus memo composition and HTML rendering, as the
+Generate button does) against the local fake API server and reports
+p50/p95/p99 per stage and end to end. No tokens are spent.
+
+Usage:
+    python benchmark.py --runs 20 --concurrency 4 --latency 0.3 --tokens-per-second 200 --stream
+    python benchmark.py --base-url http://127.0.0.1:8000/v1   # an already running server
+
+Regression runs from a cassette (see llm_cassette.py): record one real run,
+then replay it with the original per-call timings, no network needed:
+    python benchmark.py --runs 1 --warmup 0 --base-url https://api.openai.com/v1 --record cassettes/memo_run.jsonl
+    python benchmark.py --replay cassettes/memo_run.jsonl --trace-memory --json baseline.json
+    python benchmark.py --replay cassettes/memo_run.jsonl --trace-memory --baseline baseline.json
+Replaying with --replay-speed 0 leaves only orchestration and rendering time.
+
+The response cache is disabled and the rate limits are lifted unless
+LLM_CACHE_DISABLED / LLM_RPM / LLM_TPM are set explicitly, so the numbers
+measure the pipeline rather than the cache or the scheduler's throttling.
+"""
+
+import os
+
+os.environ.setdefault("LLM_CACHE_DISABLED", "1")
+os.environ.setdefault("LLM_RPM", "1000000")
+os.environ.setdefault("LLM_TPM", "1000000000")
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+import tracemalloc
+
+import memo_export
+from batch_memo import FORM_FIELDS
+from fake_openai_server import CANNED_TEST_COMPANY, FakeOpenAIServer
+from llm import LLMRuntime, request_scheduler
+from llm_cassette import Cassette
+from memo_pipeline import run_memo_pipeline
+from prompt_template import load_template
+
+STAGE_ORDER = [
+    "market_size_estimate", "company_profile", "market_category", "categorize", "market_analysis",
+    "memo_first_token", "memo", "vc_review", "pipeline", "render", "end_to_end",
+]
+
+# Slower than the baseline by more than the tolerance *and* this many seconds
+REGRESSION_SLACK = 0.005
+
+
+def percentile(values, pct):
+    """Linearly interpolated percentile of a non-empty list"""
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return ordered[0]
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def benchmark_form(path=None):
+    """
+    A form as submitted from the UI, leaving TAM/SAM/SOM for the estimate
+    stage. A JSON file of form fields can be given instead; a replay must use
+    the form its cassette was recorded with.
+    """
+    if path:
+        with open(path, "r") as f:
+            values = json.load(f)
+        return {field: str(values.get(field, "")) for field in FORM_FIELDS}
+    form = {field: CANNED_TEST_COMPANY.get(field, "") for field in FORM_FIELDS}
+    form.update(tam="", sam="", som="")
+    return form
+
+
+async def run_once(client, form, base_prompt, args):
+    """One Generate click; returns {stage: seconds} or raises the first stage error"""
+    started = time.perf_counter()
+    first_token = {}
+
+    def on_delta(stage, text):
+        if stage == "memo" and "memo" not in first_token:
+            first_token["memo"] = time.perf_counter() - started
+
+    result = await run_memo_pipeline(
+        client, form, base_prompt, use_cache=False,
+        on_delta=on_delta if args.stream else None,
+        structured_profile=not args.legacy_profile,
+        sectioned=args.sections, parallel_sections=not args.sequential_sections
+    )
+    for stage in ("categorize", "memo"):
+        if result["errors"].get(stage) is not None:
+            raise result["errors"][stage]
+
+    render_started = time.perf_counter()
+    final_memo = memo_export.compose_final_memo(result["initial_memo"], result["vc_analysis"])
+    memo_export.memo_to_html(final_memo, form["company_name"])
+    finished = time.perf_counter()
+
+    timings = dict(result["timings"])
+    timings["pipeline"] = timings.pop("total")
+    timings["render"] = finished - render_started
+    timings["end_to_end"] = finished - started
+    if "memo" in first_token:
+        timings["memo_first_token"] = first_token["memo"]
+    return timings
+
+
+async def run_benchmark(client, base_prompt, args):
+    semaphore = asyncio.Semaphore(args.concurrency)
+    form = benchmark_form(args.form)
+    samples, errors = [], []
+
+    async def one():
+        async with semaphore:
+            try:
+                samples.append(await run_once(client, form, base_prompt, args))
+            except Exception as e:
+                errors.append(repr(e))
+
+    for _ in range(args.warmup):
+        await one()
+    samples.clear()
+    errors.clear()
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+    started = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(args.runs)])
+    return samples, errors, time.perf_counter() - started
+
+
+def summarize(samples):
+    """{stage: {n, p50, p95, p99, max}} in pipeline order"""
+    stages = [s for s in STAGE_ORDER if any(s in sample for sample in samples)]
+    summary = {}
+    for stage in stages:
+        values = [sample[stage] for sample in samples if stage in sample]
+        summary[stage] = {
+            "n": len(values),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+            "max": max(values),
+        }
+    return summary
+
+
+def find_regressions(summary, memory, baseline, tolerance):
+    """Human-readable list of stages (and memory) slower/larger than the baseline"""
+    regressions = []
+    for stage, stat in summary.items():
+        old = baseline.get("stages", {}).get(stage)
+        if not old:
+            continue
+        for key in ("p50", "p95"):
+            if stat[key] > old[key] * (1 + tolerance) + REGRESSION_SLACK:
+                regressions.append(f"{stage} {key}: {old[key] * 1000:.0f}ms -> {stat[key] * 1000:.0f}ms")
+    old_peak = (baseline.get("memory") or {}).get("peak_mb")
+    if memory and old_peak and memory["peak_mb"] > old_peak * (1 + tolerance):
+        regressions.append(f"peak memory: {old_peak:.1f}MB -> {memory['peak_mb']:.1f}MB")
+    return regressions
+
+
+def print_report(summary, errors, wall_time, runtime, args, memory=None):
+    source = f"replaying {args.replay}" if args.replay else "fake server" if args.base_url is None else args.base_url
+    print(f"\n{args.runs} run(s), concurrency {args.concurrency}, "
+          f"{'streaming' if args.stream else 'non-streaming'}, "
+          f"{'legacy' if args.legacy_profile else 'structured'} profile, "
+          f"{('sequential' if args.sequential_sections else 'parallel') + ' sections' if args.sections else 'single memo'}, "
+          f"{source}")
+    print(f"{'stage':<22}{'n':>5}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    for stage, stat in summary.items():
+        print(f"{stage:<22}{stat['n']:>5}" + "".join(f"{stat[k] * 1000:>8.0f}ms" for k in ("p50", "p95", "p99", "max")))
+    completed = summary.get("end_to_end", {}).get("n", 0)
+    print(f"\nwall time {wall_time:.2f}s, {completed / wall_time:.2f} memos/s, {len(errors)} failed")
+    connections = runtime.connection_stats.snapshot()
+    scheduler_stats = request_scheduler.snapshot()
+    print(f"API: {connections['requests']} requests, {connections['new_connections']} connections opened, "
+          f"{scheduler_stats['retries']} retries, {scheduler_stats['queue_seconds']:.2f}s queued")
+    if memory:
+        print(f"memory: peak {memory['peak_mb']:.1f}MB, {memory['retained_mb']:.1f}MB still allocated after the runs")
+    if runtime.cassette is not None and runtime.cassette.misses:
+        print(f"cassette: {runtime.cassette.misses} request(s) not found in {runtime.cassette.path}", file=sys.stderr)
+    for error in sorted(set(errors)):
+        print(f"  error: {error}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the memo pipeline against a fake OpenAI server.")
+    parser.add_argument("--runs", type=int, default=20, help="measured runs (default: 20)")
+    parser.add_argument("--warmup", type=int, default=1, help="unmeasured runs first (default: 1)")
+    parser.add_argument("--concurrency", type=int, default=1, help="runs in flight at once (default: 1)")
+    parser.add_argument("--stream", action="store_true", help="stream the memo and review as the app does")
+    parser.add_argument("--legacy-profile", action="store_true", help="use the two-call category + categorize path")
+    parser.add_argument("--sections", action="store_true", help="build the memo from per-section requests")
+    parser.add_argument("--sequential-sections", action="store_true", help="with --sections, request sections one at a time")
+    parser.add_argument("--prompt", default="base_prompt.txt", help="memo prompt template (default: base_prompt.txt)")
+    parser.add_argument("--base-url", help="benchmark an already running server instead of starting one")
+    parser.add_argument("--latency", type=float, default=0.3, help="fake server seconds to first token (default: 0.3)")
+    parser.add_argument("--jitter", type=float, default=0.05, help="fake server latency jitter (default: 0.05)")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="fake server token rate (default: 200)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fake server error injection rate (default: 0)")
+    parser.add_argument("--error-status", type=int, default=429, choices=[429, 500, 502, 503])
+    parser.add_argument("--seed", type=int, default=0, help="fake server random seed (default: 0)")
+    parser.add_argument("--form", help="JSON file of form fields to submit instead of the built-in company")
+    parser.add_argument("--record", metavar="CASSETTE", help="record every API exchange to this cassette")
+    parser.add_argument("--replay", metavar="CASSETTE", help="serve API calls from this cassette instead of a server")
+    parser.add_argument("--replay-speed", type=float, default=1.0, help="replay time scale; 0 = no waiting (default: 1)")
+    parser.add_argument("--trace-memory", action="store_true", help="report peak Python memory with tracemalloc")
+    parser.add_argument("--json", help="also write the summary as JSON to this path")
+    parser.add_argument("--baseline", help="summary JSON from an earlier --json run; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown vs --baseline (default: 0.2)")
+    args = parser.parse_args(argv)
+    if args.runs < 1 or args.concurrency < 1:
+        parser.error("--runs and --concurrency must be at least 1")
+    if args.record and args.replay:
+        parser.error("--record and --replay are mutually exclusive")
+
+    base_prompt = load_template(args.prompt)
+
+    cassette = None
+    if args.record:
+        cassette = Cassette(args.record, "record")
+    elif args.replay:
+        cassette = Cassette(args.replay, "replay", speed=args.replay_speed)
+
+    server = None
+    base_url = args.base_url
+    if base_url is None and args.replay is None:
+        server = FakeOpenAIServer(
+            latency=args.latency, jitter=args.jitter, tokens_per_second=args.tokens_per_second,
+            error_rate=args.error_rate, error_status=args.error_status, retry_after=0.1, seed=args.seed
+        ).start()
+        base_url = server.base_url
+
+    runtime = LLMRuntime.from_env(os.getenv("OPENAI_API_KEY", "fake"), base_url=base_url, cassette=cassette)
+    if args.trace_memory:
+        tracemalloc.start()
+    try:
+        samples, errors, wall_time = runtime.run(run_benchmark(runtime.client, base_prompt, args))
+    finally:
+        if server is not None:
+            server.stop()
+    memory = None
+    if args.trace_memory:
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        memory = {"peak_mb": peak / 1024 / 1024, "retained_mb": current / 1024 / 1024}
+
+    summary = summarize(samples)
+    print_report(summary, errors, wall_time, runtime, args, memory)
+    if args.record:
+        print(f"recorded {len(cassette)} exchange(s) to {args.record}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "wall_time": wall_time, "failed": len(errors), "stages": summary,
+                       "memory": memory}, f, indent=2)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            regressions = find_regressions(summary, memory, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"  regression: {regression}", file=sys.stderr)
+        if not regressions:
+            print(f"no regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 1 if errors or regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
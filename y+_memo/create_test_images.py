@@ -44,11 +44,8 @@ def create_test_image(text, filename, size=(600, 400), bg_color="white", text_co
     img.save(filename)
     print(f"Created: {filename}")
 
-def main():
-    """Create test images"""
-    
-    # Test Image 1: Company Overview
-    company_overview = """TechFlow Solutions - Company Overview
+# Test Image 1: Company Overview
+COMPANY_OVERVIEW = """TechFlow Solutions - Company Overview
 AI-powered workflow automation platform
 Target Market: Mid to large enterprises  
 Business Model: SaaS subscription
@@ -57,11 +54,9 @@ Team Size: 12 employees
 Stage: Series A
 Revenue: $450K ARR
 Burn Rate: $75K/month"""
-    
-    create_test_image(company_overview, "test_company_overview.png")
-    
-    # Test Image 2: Financial Data
-    financial_data = """Financial Metrics - TechFlow Solutions
+
+# Test Image 2: Financial Data
+FINANCIAL_DATA = """Financial Metrics - TechFlow Solutions
 Current Cash: $800K
 Monthly Burn: $75K/month
 Revenue: $450K ARR
@@ -69,11 +64,9 @@ Previous Funding: $2.5M Seed
 Current Round: $8M Series A
 Post-Money Valuation: $35M
 Use of Capital: Team expansion, sales scaling"""
-    
-    create_test_image(financial_data, "test_financial_metrics.png", bg_color="#f0f0f0")
-    
-    # Test Image 3: Team Information
-    team_info = """Founding Team - TechFlow Solutions
+
+# Test Image 3: Team Information
+TEAM_INFO = """Founding Team - TechFlow Solutions
 CEO: Sarah Chen
 Former Google engineering lead, 10+ years experience
 Built automation tools at Slack
@@ -83,14 +76,24 @@ Ex-McKinsey consultant, Stanford MBA
 Previously scaled sales at Salesforce and Box
 
 Deep expertise in workflow automation and AI/ML"""
+
+# (file name, text, background); ocr_benchmark.py scores OCR output against the text
+TEST_IMAGES = [
+    ("test_company_overview.png", COMPANY_OVERVIEW, "white"),
+    ("test_financial_metrics.png", FINANCIAL_DATA, "#f0f0f0"),
+    ("test_team_info.png", TEAM_INFO, "#e8f4f8"),
+]
+
+def main():
+    """Create test images"""
     
-    create_test_image(team_info, "test_team_info.png", bg_color="#e8f4f8")
+    for filename, text, bg_color in TEST_IMAGES:
+        create_test_image(text, filename, bg_color=bg_color)
     
     print("\n✅ Test images created successfully!")
     print("📸 Files created:")
-    print("  - test_company_overview.png")
-    print("  - test_financial_metrics.png") 
-    print("  - test_team_info.png")
+    for filename, _, _ in TEST_IMAGES:
+        print(f"  - {filename}")
     print("\n🧪 Use these images to test OCR functionality!")
 
 if __name__ == "__main__":
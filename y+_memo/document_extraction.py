@@ -0,0 +1,272 @@
+"""
+Company information extraction from uploaded document text.
+
+The single-request mode only sends the first DOCUMENT_CHAR_BUDGET
+characters of the combined documents, so with several files usually only
+the first one is read. The chunked (map-reduce) mode reads everything:
+
+    map     the combined text is split into ~DOCUMENT_CHUNK_TOKENS chunks
+            (at file and line boundaries, small files packed together) and
+            every chunk is extracted concurrently
+    reduce  the per-chunk JSON is merged into one profile locally, with no
+            further request, so latency stays roughly that of one chunk
+            however many documents there are
+
+Conflict resolution when merging:
+    company_name, stage   majority vote across the chunks that state one;
+                          ties go to the value seen first in document order
+    company_overview      the first chunk's overview (decks lead with it);
+                          differing overviews are kept in additional_notes
+    everything else       distinct values in document order, joined, with
+                          values repeated or contained in another dropped
+Losing values of voted fields are reported as conflicts.
+
+Settings come from the environment:
+    DOCUMENT_CHUNK_TOKENS  approximate tokens of document text per chunk (default: 1500)
+    DOCUMENT_MAX_CHUNKS    chunks read per extraction; text beyond is ignored (default: 24)
+"""
+
+import asyncio
+import os
+import re
+from collections import Counter
+
+import telemetry
+from file_extraction import DOCUMENT_CHAR_BUDGET
+from llm import achat_completion
+from memo_pipeline import parse_json_object
+
+DOCUMENT_FIELDS = [
+    "company_name", "company_overview", "team_background", "financials",
+    "market_info", "stage", "key_metrics", "additional_notes",
+]
+VOTED_FIELDS = ["company_name", "stage"]
+
+# Same ~4 characters per token estimate as llm.estimate_tokens
+CHARS_PER_TOKEN = 4
+
+DOCUMENT_HEADER = re.compile(r"^=== (.+?) ===$", re.MULTILINE)
+
+
+def chunk_chars():
+    return int(os.getenv("DOCUMENT_CHUNK_TOKENS", 1500)) * CHARS_PER_TOKEN
+
+
+def max_chunks():
+    return int(os.getenv("DOCUMENT_MAX_CHUNKS", 24))
+
+
+def chunked_char_budget():
+    """Characters of document text the chunked mode can read (what extractors need to produce)"""
+    return chunk_chars() * max_chunks()
+
+
+def split_documents(text):
+    """Split combined upload text on its "=== file name ===" headers into (name, body) pairs"""
+    matches = list(DOCUMENT_HEADER.finditer(text))
+    if not matches:
+        return [("", text.strip())] if text.strip() else []
+    documents = []
+    if text[:matches[0].start()].strip():
+        documents.append(("", text[:matches[0].start()].strip()))
+    for match, following in zip(matches, matches[1:] + [None]):
+        body = text[match.end():following.start() if following else len(text)].strip()
+        if body:
+            documents.append((match.group(1), body))
+    return documents
+
+
+def _pieces(body, limit):
+    # Pack whole lines up to limit characters; a single longer line is split hard
+    piece, size = [], 0
+    for line in body.splitlines():
+        while len(line) > limit:
+            if piece:
+                yield "\n".join(piece)
+                piece, size = [], 0
+            yield line[:limit]
+            line = line[limit:]
+        if size + len(line) + 1 > limit and piece:
+            yield "\n".join(piece)
+            piece, size = [], 0
+        piece.append(line)
+        size += len(line) + 1
+    if piece:
+        yield "\n".join(piece)
+
+
+def chunk_text(text, limit=None):
+    """
+    Split combined document text into chunks of at most ~limit characters.
+    Small documents share a chunk; large ones are split at line boundaries,
+    each piece keeping its file header (with the part number).
+    """
+    limit = limit or chunk_chars()
+    chunks, current, size = [], [], 0
+
+    def add(block):
+        nonlocal current, size
+        if current and size + len(block) > limit:
+            chunks.append("\n\n".join(current))
+            current, size = [], 0
+        current.append(block)
+        size += len(block) + 2
+
+    for name, body in split_documents(text):
+        pieces = list(_pieces(body, limit))
+        for part, piece in enumerate(pieces, 1):
+            if not name:
+                add(piece)
+            elif len(pieces) == 1:
+                add(f"=== {name} ===\n{piece}")
+            else:
+                add(f"=== {name} (part {part} of {len(pieces)}) ===\n{piece}")
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def extraction_prompt(document_content, excerpt=None):
+    """The extraction prompt; excerpt=(index, total) marks one chunk of the chunked mode"""
+    scope = "document"
+    note = ""
+    if excerpt is not None:
+        scope = "excerpt"
+        note = f"\n    This is excerpt {excerpt[0]} of {excerpt[1]} from the company's documents; report only what this excerpt states.\n"
+    return f"""
+    Analyze the following document text and extract company information for an investment memo.
+    {note}
+    Document Content:
+    {document_content}
+
+    Extract and return the following information in JSON format:
+    - company_name: Company name if mentioned
+    - company_overview: Business description, what they do, target market, business model (3-4 sentences)
+    - team_background: Information about founders, team members, their backgrounds (if available)
+    - financials: Any financial information mentioned (revenue, funding, burn rate, etc.)
+    - market_info: Market size, competitors, market opportunity (if mentioned)
+    - stage: Investment stage if mentioned (Pre-seed, Seed, Series A, etc.)
+    - key_metrics: Important numbers or KPIs mentioned
+    - additional_notes: Any other relevant information for investment analysis
+
+    If information is not available in the {scope}, set the field to empty string.
+    Return only valid JSON.
+    """
+
+
+def _value(value):
+    # Models sometimes return lists or numbers for free-text fields
+    if isinstance(value, list):
+        return "; ".join(str(item).strip() for item in value if str(item).strip())
+    if isinstance(value, dict):
+        return "; ".join(f"{key}: {item}" for key, item in value.items())
+    return str(value or "").strip()
+
+
+def _normalized(value):
+    return re.sub(r"\W+", " ", value.casefold()).strip()
+
+
+def _distinct(values):
+    """Values in order, dropping empties, repeats and values contained in another one"""
+    kept = []
+    for value in values:
+        if not value:
+            continue
+        normalized = _normalized(value)
+        if any(normalized in _normalized(other) for other in kept):
+            continue
+        kept = [other for other in kept if _normalized(other) not in normalized]
+        kept.append(value)
+    return kept
+
+
+def merge_extractions(extractions):
+    """
+    Reduce per-chunk extractions (in document order) into one profile.
+    Returns (profile, conflicts) where conflicts maps a voted field to every
+    distinct value the chunks gave for it.
+    """
+    values = {field: [_value(extraction.get(field)) for extraction in extractions] for field in DOCUMENT_FIELDS}
+    profile, conflicts = {}, {}
+
+    for field in VOTED_FIELDS:
+        stated = [value for value in values[field] if value]
+        votes = Counter(_normalized(value) for value in stated)
+        if not votes:
+            profile[field] = ""
+            continue
+        top = max(votes.values())
+        # First value in document order among the most frequent
+        profile[field] = next(value for value in stated if votes[_normalized(value)] == top)
+        distinct = {}
+        for value in stated:
+            distinct.setdefault(_normalized(value), value)
+        if len(distinct) > 1:
+            conflicts[field] = list(distinct.values())
+
+    overviews = _distinct(values["company_overview"])
+    profile["company_overview"] = overviews[0] if overviews else ""
+
+    for field in DOCUMENT_FIELDS:
+        if field in profile:
+            continue
+        field_values = values[field]
+        if field == "additional_notes":
+            field_values = field_values + overviews[1:]
+        profile[field] = "\n".join(_distinct(field_values))
+    return {field: profile[field] for field in DOCUMENT_FIELDS}, conflicts
+
+
+async def extract_chunk(client, chunk, index, total, use_cache=True):
+    response = await achat_completion(
+        client,
+        [{"role": "user", "content": extraction_prompt(chunk, excerpt=(index, total))}],
+        route="document_extraction",
+        use_cache=use_cache
+    )
+    return parse_json_object(response)
+
+
+async def extract_company_info(client, text_content, use_cache=True, chunked=True):
+    """
+    Extract company information from combined document text.
+
+    Returns (profile, report). report has "chunks" (requests made),
+    "failed_chunks", "skipped_chars" (text beyond DOCUMENT_MAX_CHUNKS) and
+    "conflicts" (see merge_extractions). Raises if no chunk could be read.
+    """
+    if not chunked:
+        response = await achat_completion(
+            client,
+            [{"role": "user", "content": extraction_prompt(text_content[:DOCUMENT_CHAR_BUDGET])}],
+            route="document_extraction",
+            use_cache=use_cache
+        )
+        skipped = max(len(text_content) - DOCUMENT_CHAR_BUDGET, 0)
+        return parse_json_object(response), {"chunks": 1, "failed_chunks": 0, "skipped_chars": skipped, "conflicts": {}}
+
+    chunks = chunk_text(text_content)
+    read = chunks[:max_chunks()]
+    skipped = sum(len(chunk) for chunk in chunks[len(read):])
+
+    with telemetry.stage("document_map"):
+        outcomes = await asyncio.gather(
+            *[extract_chunk(client, chunk, i, len(read), use_cache) for i, chunk in enumerate(read, 1)],
+            return_exceptions=True
+        )
+    extractions = [outcome for outcome in outcomes if isinstance(outcome, dict)]
+    if not extractions:
+        errors = [outcome for outcome in outcomes if isinstance(outcome, BaseException)]
+        if errors:
+            raise errors[0]
+        raise ValueError("No document text to extract from")
+
+    with telemetry.stage("document_reduce"):
+        profile, conflicts = merge_extractions(extractions)
+    return profile, {
+        "chunks": len(read),
+        "failed_chunks": len(read) - len(extractions),
+        "skipped_chars": skipped,
+        "conflicts": conflicts,
+    }
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenAI chat completions API, for benchmarking and
+offline development without spending tokens.
+
+Implements POST /v1/chat/completions (plain and streaming, including forced
+function calls) with configurable latency, token rate and error injection.
+Responses are canned per prompt: each prompt in app.py / memo_pipeline.py
+gets JSON or Markdown of the shape its caller parses.
+
+Usage:
+    python fake_openai_server.py --port 8000 --latency 0.5 --tokens-per-second 40
+    OPENAI_BASE_URL=http://127.0.0.1:8000/v1 OPENAI_API_KEY=fake streamlit run app.py
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_PROFILE = {
+    "market_category": "Fintech",
+    "website": "https://ledgerly.io",
+    "launch_year": "2022",
+    "team_size": "14",
+    "stage": "Seed",
+    "one_liner": "Ledgerly automates month-end close for mid-market finance teams.",
+    "market_size": "$12B TAM",
+    "current_cash": "$1.8M in cash",
+    "burn_rate": "$95k/month",
+    "revenue": "$420k ARR",
+    "prev_raised": "$2.5M Pre-seed",
+    "round_size": "$6M Seed",
+    "post_money_valuation": "$30M",
+    "use_of_capital": "Expand the engineering team and build out enterprise integrations. Fund a first outbound sales motion.",
+    "named_competitors": "BlackLine, FloQast, Numeric",
+    "founder_1_name": "Priya Raman",
+    "founder_1_bio": "Former controller at Stripe. Led the close automation program across 14 entities.",
+    "founder_2_name": "Daniel Ortiz",
+    "founder_2_bio": "Staff engineer at Plaid for six years. Built the bank data reconciliation pipeline.",
+    "founder_3_name": "",
+    "founder_3_bio": "",
+    "founder_4_name": "",
+    "founder_4_bio": "",
+    "misc_notes": "Design partners include two public SaaS companies.",
+    "pros": "Founder-market fit; strong net revenue retention; short sales cycles; clear wedge",
+    "cons": "Crowded category; incumbents bundle close tools; long enterprise security reviews",
+    "best_case": "Becomes the system of record for the close and expands into FP&A. Category leader by Series C.",
+    "worst_case": "Incumbents copy the workflow features and pricing pressure stalls growth below $10M ARR.",
+}
+
+CANNED_TEST_COMPANY = {
+    "company_name": "Ledgerly",
+    "company_overview": "Ledgerly is an AI close-automation platform for mid-market finance teams. It reconciles bank, card and ERP data continuously so the month-end close takes days instead of weeks. Customers pay a per-entity SaaS subscription. The product plugs into NetSuite, Sage Intacct and QuickBooks.",
+    "team_background": "Priya Raman ran close automation as a controller at Stripe. Daniel Ortiz built bank reconciliation at Plaid as a staff engineer. Together they have shipped finance tooling used by thousands of companies.",
+    "website": "https://ledgerly.io",
+    "launch_year": "2022",
+    "team_size": "14",
+    "stage": "Seed",
+    "market_size": "$12B TAM",
+    "tam": "$12B",
+    "sam": "$1.8B",
+    "som": "$250M",
+    "current_cash": "$1.8M in cash",
+    "burn_rate": "$95k/month",
+    "revenue": "$420k ARR",
+    "prev_raised": "$2.5M Pre-seed",
+    "round_size": "$6M Seed",
+    "post_money_valuation": "$30M",
+    "use_of_capital": "Expand the engineering team and build out enterprise integrations. Fund a first outbound sales motion.",
+}
+
+CANNED_EXTRACTION = {
+    "company_name": "Ledgerly",
+    "company_overview": CANNED_TEST_COMPANY["company_overview"],
+    "team_background": CANNED_TEST_COMPANY["team_background"],
+    "financials": "$420k ARR, $95k/month burn, $1.8M cash",
+    "market_info": "$12B TAM; competitors BlackLine, FloQast",
+    "stage": "Seed",
+    "key_metrics": "130% net revenue retention, 45 customers",
+    "additional_notes": "",
+}
+
+CANNED_MARKET_SIZES = {"tam": "$12B", "sam": "$1.8B", "som": "$250M"}
+
+CANNED_MARKET_ANALYSIS = {
+    "market_penetration_percentage": "0.0035%",
+    "typical_penetration_range": "0.001% - 0.01% at Seed",
+    "market_opportunity": "$11.99B remaining",
+    "competitive_position": "Ahead of typical Seed companies on revenue",
+    "growth_potential": "High",
+    "market_maturity": "Growing",
+    "stage_appropriateness": "Appropriate for Seed",
+}
+
+MEMO_SECTIONS = [
+    "Executive Summary", "Company Overview", "Founders & Team", "Market Opportunity",
+    "Competitive Landscape", "Traction & Financials", "Unicorn Potential", "Risks", "Recommendation",
+]
+
+REVIEW_SECTIONS = [
+    "Investment Thesis", "Key Strengths", "Major Risks", "Market Opportunity", "Team Assessment",
+    "Competitive Analysis", "Financial Health", "Investment Recommendation", "Due Diligence Items", "Exit Potential",
+]
+
+FILLER = (
+    "The company shows early evidence of product-market fit with a focused wedge into a large category. "
+    "Retention and expansion metrics are strong for the stage, and the founders bring direct operating experience. "
+    "Key open questions are the durability of the moat against bundled incumbents and the cost of enterprise sales. "
+)
+
+
+def markdown_document(title, sections, max_tokens):
+    """Markdown with one paragraph per section, sized to roughly max_tokens words"""
+    words_per_section = max(20, (max_tokens or 1000) * 3 // 4 // len(sections))
+    filler_words = FILLER.split()
+    lines = [f"# {title}", ""]
+    for section in sections:
+        paragraph = [filler_words[i % len(filler_words)] for i in range(words_per_section)]
+        lines += [f"## {section}", "", " ".join(paragraph), ""]
+    return "\n".join(lines)
+
+
+def canned_reply(request):
+    """Return (content, tool_call) for a chat completion request body"""
+    prompt = "\n".join(str(message.get("content") or "") for message in request.get("messages", []))
+    max_tokens = request.get("max_tokens")
+
+    tools = request.get("tools")
+    if tools:
+        function = tools[0]["function"]
+        properties = function.get("parameters", {}).get("properties", {})
+        arguments = {name: CANNED_PROFILE.get(name, "") for name in properties}
+        return None, {"name": function["name"], "arguments": json.dumps(arguments)}
+
+    if "extract the market category" in prompt:
+        return CANNED_PROFILE["market_category"], None
+    if "categorize and populate all investment memo fields" in prompt:
+        profile = {k: v for k, v in CANNED_PROFILE.items() if k != "market_category"}
+        return json.dumps(profile, indent=2), None
+    if "Estimate realistic market size" in prompt:
+        return json.dumps(CANNED_MARKET_SIZES), None
+    if "Analyze this startup's market position" in prompt:
+        return json.dumps(CANNED_MARKET_ANALYSIS, indent=2), None
+    if "Generate a realistic startup company profile" in prompt:
+        return json.dumps(CANNED_TEST_COMPANY, indent=2), None
+    if "extract company information for an investment memo" in prompt:
+        return json.dumps(CANNED_EXTRACTION, indent=2), None
+    section = re.search(r'You are writing only the "([^"]+)" section', prompt)
+    if section:
+        return markdown_document(section.group(1), ["Analysis"], max_tokens).replace("# ", "## ", 1), None
+    if "critical eye" in prompt:
+        return markdown_document("VC Analysis", REVIEW_SECTIONS, max_tokens), None
+    return markdown_document("Investment Memo", MEMO_SECTIONS, max_tokens), None
+
+
+def split_tokens(text):
+    """Approximate tokens as words plus their trailing whitespace"""
+    return re.findall(r"\S+\s*|\s+", text) or [""]
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeOpenAI/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status):
+        if status == 429:
+            error = {"message": "Rate limit reached (injected)", "type": "requests", "code": "rate_limit_exceeded"}
+            headers = {"retry-after-ms": str(int(self.server.retry_after * 1000))}
+        else:
+            error = {"message": "The server had an error (injected)", "type": "server_error", "code": None}
+            headers = {}
+        self._send_json(status, {"error": error}, headers)
+
+    def do_POST(self):
+        if self.path.rstrip("/") not in ("/v1/chat/completions", "/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"message": "Invalid JSON body", "type": "invalid_request_error"}})
+            return
+
+        server = self.server
+        server.count_request()
+        time.sleep(server.first_token_delay())
+        if server.should_fail():
+            self._send_error(server.error_status)
+            return
+
+        content, tool_call = canned_reply(request)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        model = request.get("model", "gpt-4")
+        prompt_tokens = sum(len(str(m.get("content") or "")) for m in request.get("messages", [])) // 4
+        tokens = split_tokens(tool_call["arguments"] if tool_call else content)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                 "total_tokens": prompt_tokens + len(tokens)}
+
+        if request.get("stream"):
+            self._stream(completion_id, model, content, tool_call, tokens, usage, request)
+            return
+
+        time.sleep(len(tokens) * server.seconds_per_token)
+        message = {"role": "assistant", "content": content}
+        if tool_call:
+            message["tool_calls"] = [{"id": f"call_{uuid.uuid4().hex[:24]}", "type": "function", "function": tool_call}]
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if tool_call else "stop"}],
+            "usage": usage,
+        })
+
+    def _stream(self, completion_id, model, content, tool_call, tokens, usage, request):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def chunk(delta, finish_reason=None):
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        chunk({"role": "assistant", "content": ""})
+        for token in tokens:
+            time.sleep(self.server.seconds_per_token)
+            if tool_call:
+                chunk({"tool_calls": [{"index": 0, "function": {"arguments": token}}]})
+            else:
+                chunk({"content": token})
+        chunk({}, "tool_calls" if tool_call else "stop")
+        if (request.get("stream_options") or {}).get("include_usage"):
+            payload = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                       "model": model, "choices": [], "usage": usage}
+            self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """
+    Threaded fake API server.
+
+    latency:           seconds before the first token (plus up to +/- jitter)
+    tokens_per_second: generation speed after the first token (0 = instant)
+    error_rate:        fraction of requests answered with error_status
+    retry_after:       Retry-After sent with injected 429s, in seconds
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.5, jitter=0.1, tokens_per_second=50.0,
+                 error_rate=0.0, error_status=429, retry_after=0.5, seed=None, verbose=False):
+        super().__init__((host, port), FakeOpenAIHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.seconds_per_token = 1.0 / tokens_per_second if tokens_per_second > 0 else 0.0
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.verbose = verbose
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def first_token_delay(self):
+        with self._lock:
+            return max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+
+    def should_fail(self):
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def start(self):
+        """Serve on a daemon thread; returns self so it can be used as a one-liner"""
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a fake OpenAI chat completions API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds to first token (default: 0.5)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="+/- random latency in seconds (default: 0.1)")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="generation speed; 0 = instant (default: 50)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail (default: 0)")
+    parser.add_argument("--error-status", type=int, default=429, choices=[429, 500, 502, 503], help="status of injected errors")
+    parser.add_argument("--retry-after", type=float, default=0.5, help="Retry-After for injected 429s, in seconds")
+    parser.add_argument("--seed", type=int, help="random seed for jitter and error injection")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+
+    server = FakeOpenAIServer(args.host, args.port, args.latency, args.jitter, args.tokens_per_second,
+                              args.error_rate, args.error_status, args.retry_after, args.seed, args.verbose)
+    print(f"Fake OpenAI API listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
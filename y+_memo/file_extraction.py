@@ -0,0 +1,766 @@
+"""
+Text extraction from uploaded documents (PDF, Word, Excel, text/CSV, images).
+
+PyPDF2 parsing, pandas Excel parsing and tesseract OCR are CPU-bound, so
+``extract_files`` runs them in a process pool shared by the whole app
+and yields each file's result as soon as it finishes, instead of working
+through the uploads one after another on the Streamlit script thread.
+
+The extractors are plain functions with no Streamlit calls, so worker
+processes can import this module. A failure raises ``ExtractionError``
+with a message that can be shown to the user as-is; a problem that only
+degrades the text (a scanned page that could not be OCR'd) is reported
+with ``report_warning`` and comes back with the file's result instead.
+
+PDFs are read page by page and only as far as needed: with a character
+budget (``max_chars``) parsing stops once enough text has been collected,
+and ``page_ranges`` limits which pages are read at all. Pages without a
+text layer (scans, image-only slides) are rendered with pypdfium2 (or
+PyMuPDF) and OCR'd in a thread pool while the text pages are read, so
+OCR time grows with the number of scanned pages only.
+
+Images are preprocessed (size guard, grayscale, downscale, deskew,
+binarize) and very tall ones OCR'd in parallel tiles, see ``ocr.py``.
+OCR output is cached on disk, keyed by a hash of the image bytes plus the
+OCR backend, tesseract version, language, config and preprocessing
+settings, so re-uploading a screenshot costs a lookup instead of another
+OCR pass.
+
+Settings come from the environment:
+    EXTRACTION_WORKERS  worker processes (default: CPU count, at most 4;
+                        0 extracts in the calling thread instead)
+    PDF_OCR             set to 0 to skip OCR of scanned PDF pages (default: 1)
+    PDF_OCR_DPI         resolution scanned pages are rendered at (default: 200)
+    PDF_OCR_MIN_CHARS   pages with less text than this are OCR'd (default: 20)
+    EXCEL_MAX_ROWS      rows shown (or summarized) per sheet (default: 200)
+    EXCEL_MAX_COLS      columns read per sheet (default: 50)
+    EXCEL_SCAN_ROWS     rows read per sheet at most (default: 5000)
+    OCR_LANG            tesseract language(s) (default: eng)
+    OCR_CONFIG          extra tesseract options, e.g. "--psm 6" (default: none)
+    OCR_BACKEND, OCR_PREPROCESS, ...  OCR engine and image preprocessing, see ocr.py
+    OCR_CACHE_PATH      SQLite file (default: .cache/ocr_results.sqlite3)
+    OCR_CACHE_TTL       entry lifetime in seconds (default: 30 days)
+    OCR_CACHE_MAX_MB    size budget before LRU eviction (default: 50)
+    OCR_CACHE_DISABLED  set to 1 to turn the OCR cache off
+"""
+
+import concurrent.futures
+import contextlib
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+
+import telemetry
+from disk_cache import DiskCache
+from ocr import ImageTooLarge, engine_version, ocr_backend, ocr_image, ocr_pil_image, ocr_settings, tile_workers
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".tiff", ".bmp")
+
+# Characters of document text the company-information prompt looks at
+DOCUMENT_CHAR_BUDGET = 4000
+
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionError(Exception):
+    """A file could not be turned into text; the message is meant for the user"""
+
+
+_warnings = threading.local()
+
+
+def report_warning(message):
+    """Log a problem that did not stop extraction; extract_files also returns it with the file's result"""
+    logger.warning(message)
+    collected = getattr(_warnings, "messages", None)
+    if collected is not None:
+        collected.append(message)
+
+
+def parse_page_ranges(spec):
+    """
+    Parse a page selection like "1-5, 8, 12-" into [(1, 5), (8, 8), (12, None)]
+    (1-based, inclusive; None = to the last page). An empty spec returns None,
+    meaning every page. Raises ValueError for anything else.
+    """
+    if not spec or not spec.strip():
+        return None
+    ranges = []
+    for part in spec.replace(";", ",").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        start, dash, end = part.partition("-")
+        try:
+            start = int(start) if start.strip() else 1
+            end = (int(end) if end.strip() else None) if dash else start
+        except ValueError:
+            raise ValueError(f"Invalid page range: {part!r} (use e.g. 1-5, 8, 12-)")
+        if start < 1 or (end is not None and end < start):
+            raise ValueError(f"Invalid page range: {part!r}")
+        ranges.append((start, end))
+    return ranges or None
+
+
+def selected_pages(page_count, page_ranges=None):
+    """1-based page numbers of a document in reading order, each at most once"""
+    if page_ranges is None:
+        return list(range(1, page_count + 1))
+    pages = []
+    for start, end in page_ranges:
+        for number in range(start, min(end or page_count, page_count) + 1):
+            if number not in pages:
+                pages.append(number)
+    return pages
+
+
+def iter_pdf_pages(file_bytes, page_ranges=None):
+    """Yield (page_number, text) for the selected pages, parsing each page only when it is requested"""
+    try:
+        import PyPDF2
+    except ImportError:
+        raise ExtractionError("PDF processing library not available. Install with: pip install PyPDF2")
+
+    try:
+        pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_bytes))
+        page_count = len(pdf_reader.pages)
+    except Exception as e:
+        raise ExtractionError(f"Error extracting text from PDF: {e}") from e
+
+    for number in selected_pages(page_count, page_ranges):
+        try:
+            text = pdf_reader.pages[number - 1].extract_text() or ""
+        except Exception as e:
+            raise ExtractionError(f"Error extracting text from PDF page {number}: {e}") from e
+        yield number, text
+
+
+def pdf_ocr_settings():
+    """(enabled, dpi, min_chars) for OCR of PDF pages without a text layer"""
+    enabled = os.getenv("PDF_OCR", "1").lower() not in ("0", "false", "no")
+    return enabled, int(os.getenv("PDF_OCR_DPI", 200)), int(os.getenv("PDF_OCR_MIN_CHARS", 20))
+
+
+def pdf_rasterizer():
+    """The installed PDF page renderer, "pypdfium2" or "fitz" (PyMuPDF), or None"""
+    for name in ("pypdfium2", "fitz"):
+        try:
+            __import__(name)
+            return name
+        except ImportError:
+            continue
+    return None
+
+
+# pdfium and MuPDF are not thread-safe, even across documents
+_render_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def pdf_page_renderer(file_bytes, max_pixels):
+    """
+    Yield render(page_number, dpi) returning a grayscale PIL image of the page.
+    Pages that would exceed max_pixels at that DPI are rendered smaller.
+    """
+    name = pdf_rasterizer()
+
+    def scale_for(width_pt, height_pt, dpi):
+        scale = dpi / 72
+        if width_pt * height_pt * scale * scale > max_pixels:
+            scale = (max_pixels / (width_pt * height_pt)) ** 0.5
+        return scale
+
+    if name == "pypdfium2":
+        import pypdfium2
+
+        with _render_lock:
+            document = pypdfium2.PdfDocument(file_bytes)
+
+        def render(number, dpi):
+            with _render_lock:
+                page = document[number - 1]
+                try:
+                    bitmap = page.render(scale=scale_for(*page.get_size(), dpi), grayscale=True)
+                    return bitmap.to_pil()
+                finally:
+                    page.close()
+    elif name == "fitz":
+        import fitz
+        from PIL import Image
+
+        with _render_lock:
+            document = fitz.open(stream=file_bytes, filetype="pdf")
+
+        def render(number, dpi):
+            with _render_lock:
+                page = document[number - 1]
+                scale = scale_for(page.rect.width, page.rect.height, dpi)
+                pixmap = page.get_pixmap(matrix=fitz.Matrix(scale, scale), colorspace=fitz.csGRAY)
+                return Image.frombytes("L", (pixmap.width, pixmap.height), pixmap.samples)
+    else:
+        raise ExtractionError("No PDF renderer available. Install with: pip install pypdfium2")
+
+    try:
+        yield render
+    finally:
+        with _render_lock:
+            document.close()
+
+
+def _ocr_pdf_page(image, lang, config, settings, cache, key):
+    # Runs in the page OCR thread pool
+    text = ocr_pil_image(image, lang, config, settings)
+    if key is not None:
+        cache.set(key, text)
+    return text
+
+
+def extract_text_from_pdf(file_bytes, max_chars=None, page_ranges=None):
+    """
+    Extract text from PDF file, stopping at the first page that brings the
+    text to max_chars characters (pages after it are never parsed).
+
+    Pages with less than PDF_OCR_MIN_CHARS of text are rendered and OCR'd
+    (cached like images, per page) when a renderer and an OCR backend are
+    installed. Rendering happens here, page by page; the OCR runs in a pool
+    of OCR_TILE_WORKERS threads while later pages are read. Page texts are
+    collected in page order, and at most two per worker are held in flight.
+    A page whose OCR fails keeps its text-layer text, with a warning.
+    """
+    enabled, dpi, min_chars = pdf_ocr_settings()
+    renderer = pdf_rasterizer()
+    use_ocr = enabled and renderer is not None and ocr_available()
+    workers = tile_workers()
+    lang = os.getenv("OCR_LANG", "eng")
+    config = os.getenv("OCR_CONFIG", "")
+    # Pages are the unit of parallelism, so a page is not split into tiles as well
+    settings = dict(ocr_settings(), tile_height=0)
+    cache = ocr_cache() if use_ocr else None
+    digest = hashlib.sha256(file_bytes).hexdigest() if cache is not None else None
+
+    parts = []  # page texts in page order; a Future while the page is being OCR'd
+    fallbacks = {}  # Future -> (page number, text-layer text)
+    resolved = collected = scanned = 0
+    errors = []
+
+    def ocr_failed(number, text, error):
+        errors.append(error)
+        report_warning(f"Could not OCR PDF page {number}, using its text layer instead: {error}")
+        return text
+
+    def page_text(part):
+        if not isinstance(part, concurrent.futures.Future):
+            return part
+        try:
+            return part.result()
+        except Exception as e:
+            return ocr_failed(*fallbacks[part], e)
+
+    with contextlib.ExitStack() as stack:
+        render = pool = None
+        for number, text in iter_pdf_pages(file_bytes, page_ranges):
+            if len(text.strip()) >= min_chars or not enabled:
+                parts.append(text)
+            elif not use_ocr:
+                scanned += 1
+                parts.append(text)
+            else:
+                try:
+                    key = ocr_cache_key(
+                        digest, lang, config, settings, page=number, dpi=dpi, renderer=renderer
+                    ) if cache is not None else None
+                    cached = cache.get(key) if key is not None else None
+                    if cached is not None:
+                        parts.append(cached)
+                    else:
+                        if pool is None:
+                            render = stack.enter_context(pdf_page_renderer(file_bytes, settings["max_pixels"]))
+                            pool = stack.enter_context(concurrent.futures.ThreadPoolExecutor(max_workers=workers))
+                            # Runs before the pool's exit if reading fails: pages not started are dropped
+                            stack.callback(lambda: [part.cancel() for part in parts if isinstance(part, concurrent.futures.Future)])
+                        future = pool.submit(_ocr_pdf_page, render(number, dpi), lang, config, settings, cache, key)
+                        fallbacks[future] = (number, text)
+                        parts.append(future)
+                except Exception as e:
+                    parts.append(ocr_failed(number, text, e))
+
+            # Count finished pages in order; wait for the oldest page when too many are in flight
+            while resolved < len(parts):
+                part = parts[resolved]
+                if isinstance(part, concurrent.futures.Future):
+                    in_flight = sum(isinstance(p, concurrent.futures.Future) for p in parts[resolved:])
+                    if not part.done() and in_flight <= 2 * workers:
+                        break
+                    part = parts[resolved] = page_text(part)
+                collected += len(part) + 1
+                resolved += 1
+            if max_chars is not None and collected >= max_chars:
+                # Pages after the budget are not needed: drop those not yet started
+                for part in parts[resolved:]:
+                    if isinstance(part, concurrent.futures.Future):
+                        part.cancel()
+                del parts[resolved:]
+                break
+
+        parts = [page_text(part) for part in parts]
+
+    text = "\n".join(parts).strip()
+    if not text and scanned:
+        raise ExtractionError(
+            "This PDF has no text layer (it looks scanned). To OCR it, install pypdfium2 and tesserocr "
+            "(or pytesseract with Tesseract OCR)"
+        )
+    if not text and errors:
+        raise ExtractionError(f"This PDF has no text layer (it looks scanned) and OCR failed: {errors[0]}")
+    return text
+
+
+def extract_text_from_docx(file_bytes):
+    """Extract text from Word document"""
+    try:
+        from docx import Document
+    except ImportError:
+        raise ExtractionError("Word document processing library not available. Install with: pip install python-docx")
+
+    try:
+        doc = Document(io.BytesIO(file_bytes))
+        text = ""
+        for paragraph in doc.paragraphs:
+            text += paragraph.text + "\n"
+        return text.strip()
+    except Exception as e:
+        raise ExtractionError(f"Error extracting text from Word document: {e}") from e
+
+
+# Sheet name / row label keywords of the financial sheets that get a compact summary
+FINANCIAL_SHEET_KEYWORDS = {
+    "P&L": ("p&l", "p & l", "income statement", "profit", "revenue", "sales", "cogs", "cost of", "gross margin",
+            "ebitda", "opex", "operating expenses", "net income", "expenses"),
+    "Cap table": ("cap table", "captable", "shareholder", "shares", "ownership", "fully diluted", "option pool",
+                  "esop", "preferred", "common stock"),
+    "KPIs": ("kpi", "metrics", "mrr", "arr", "churn", "retention", "cac", "ltv", "customers", "users", "nps",
+             "bookings", "pipeline"),
+    "Cash flow": ("cash flow", "cashflow", "balance sheet", "cash", "burn", "runway", "funding"),
+}
+
+
+def excel_limits():
+    """Per-sheet (rows shown, columns read, rows scanned) caps"""
+    return (
+        int(os.getenv("EXCEL_MAX_ROWS", 200)),
+        int(os.getenv("EXCEL_MAX_COLS", 50)),
+        int(os.getenv("EXCEL_SCAN_ROWS", 5000)),
+    )
+
+
+def _cell_text(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return str(value)
+    if isinstance(value, int):
+        return f"{value:,}"
+    if isinstance(value, float):
+        return f"{value:,.0f}" if abs(value) >= 1000 or value.is_integer() else f"{value:,.2f}"
+    if hasattr(value, "strftime"):
+        return value.strftime("%Y-%m-%d")
+    return str(value).strip()
+
+
+def _period_text(value):
+    # Column headers of monthly models are first-of-month dates
+    if hasattr(value, "strftime") and getattr(value, "day", None) == 1:
+        return value.strftime("%b %Y")
+    return _cell_text(value)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def financial_sheet_kind(sheet_name, labels):
+    """The FINANCIAL_SHEET_KEYWORDS kind a sheet looks like (from its name and row labels), or None"""
+    name = sheet_name.casefold()
+    scores = {}
+    for kind, keywords in FINANCIAL_SHEET_KEYWORDS.items():
+        score = 3 * sum(1 for keyword in keywords if keyword in name)
+        score += sum(1 for label in labels for keyword in keywords if keyword in label.casefold())
+        scores[kind] = score
+    kind = max(scores, key=scores.get)
+    return kind if scores[kind] >= 3 else None
+
+
+def _summarize_financial_sheet(sheet_name, kind, header, rows, max_rows, scanned, total_rows):
+    # One line per labelled row with numbers: "Revenue: 12,000 (Jan 2024) → 1,450,000 (Dec 2027)"
+    lines = [f"Sheet: {sheet_name} ({kind} summary, {scanned if total_rows is None else total_rows} rows)"]
+    periods = [_period_text(value) for value in header] if header else []
+    named_periods = [period for period in periods[1:] if period]
+    if len(named_periods) > 1:
+        lines.append(f"Periods: {named_periods[0]} … {named_periods[-1]} ({len(named_periods)} columns)")
+
+    def at(column):
+        period = periods[column] if column < len(periods) else ""
+        return f" ({period})" if period else ""
+
+    summarized = 0
+    for row in rows:
+        label = next((str(value).strip() for value in row if isinstance(value, str) and value.strip()), None)
+        numbers = [(column, value) for column, value in enumerate(row) if _is_number(value)]
+        if label is None or not numbers:
+            continue
+        if summarized == max_rows:
+            lines.append("… (more rows not summarized)")
+            break
+        summarized += 1
+        (first_column, first), (last_column, last) = numbers[0], numbers[-1]
+        if len(numbers) == 1:
+            lines.append(f"{label}: {_cell_text(first)}{at(first_column)}")
+        else:
+            lines.append(f"{label}: {_cell_text(first)}{at(first_column)} → {_cell_text(last)}{at(last_column)}")
+    return "\n".join(lines)
+
+
+def _excel_sheet_text(worksheet, max_rows, max_cols, scan_rows):
+    """
+    Text of one read-only worksheet. Reads max_rows rows of max_cols columns;
+    a sheet that looks financial by then is read on, up to scan_rows rows.
+    """
+    total_rows = worksheet.max_row if isinstance(worksheet.max_row, int) else None
+    rows, labels, header = [], [], None
+    for row in worksheet.iter_rows(max_col=max_cols, values_only=True):
+        if len(rows) == scan_rows or (len(rows) == max_rows and financial_sheet_kind(worksheet.title, labels) is None):
+            break
+        if not any(value is not None and str(value).strip() for value in row):
+            continue
+        rows.append(row)
+        label = next((value for value in row if isinstance(value, str) and value.strip()), None)
+        if label is not None:
+            labels.append(label)
+        if header is None and sum(1 for value in row if value is not None) >= 2 and \
+                sum(1 for value in row if isinstance(value, str) or hasattr(value, "strftime")) * 2 >= \
+                sum(1 for value in row if value is not None):
+            header = row
+
+    kind = financial_sheet_kind(worksheet.title, labels)
+    if kind is not None:
+        return _summarize_financial_sheet(worksheet.title, kind, header, rows, max_rows, len(rows), total_rows)
+
+    lines = [f"Sheet: {worksheet.title}"]
+    for row in rows[:max_rows]:
+        cells = [_cell_text(value) for value in row]
+        while cells and not cells[-1]:
+            cells.pop()
+        lines.append(" | ".join(cells))
+    shown = min(len(rows), max_rows)
+    if total_rows is not None and total_rows > shown:
+        lines.append(f"… ({total_rows - shown:,} more rows not shown)")
+    elif len(rows) > shown:
+        lines.append("… (more rows not shown)")
+    return "\n".join(lines)
+
+
+def extract_text_from_excel(file_bytes, max_chars=None):
+    """
+    Extract text from Excel file.
+
+    .xlsx workbooks are streamed with openpyxl in read-only mode, sheet by
+    sheet, so memory stays flat however large the workbook is: each sheet
+    contributes at most EXCEL_MAX_ROWS rows of EXCEL_MAX_COLS columns, and
+    sheets that look financial (P&L, cap table, KPIs, cash flow) are
+    condensed to one "label: first → last" line per row. Extraction stops
+    once max_chars characters have been produced. Legacy .xls files go
+    through pandas, capped the same way.
+    """
+    max_rows, max_cols, scan_rows = excel_limits()
+    if file_bytes[:4] != b"PK\x03\x04":
+        return _extract_text_from_xls(file_bytes, max_rows, max_cols)
+
+    try:
+        import openpyxl
+    except ImportError:
+        raise ExtractionError("Excel processing library not available. Install with: pip install openpyxl")
+
+    try:
+        workbook = openpyxl.load_workbook(io.BytesIO(file_bytes), read_only=True, data_only=True)
+    except Exception as e:
+        raise ExtractionError(f"Error extracting text from Excel file: {e}") from e
+    try:
+        parts = []
+        collected = 0
+        for worksheet in workbook.worksheets:
+            text = _excel_sheet_text(worksheet, max_rows, max_cols, scan_rows)
+            parts.append(text)
+            collected += len(text) + 2
+            if max_chars is not None and collected >= max_chars:
+                break
+        return "\n\n".join(parts).strip()
+    except Exception as e:
+        raise ExtractionError(f"Error extracting text from Excel file: {e}") from e
+    finally:
+        workbook.close()
+
+
+def _extract_text_from_xls(file_bytes, max_rows, max_cols):
+    try:
+        import pandas as pd
+        excel_data = pd.read_excel(io.BytesIO(file_bytes), sheet_name=None, nrows=max_rows)
+    except ImportError:
+        raise ExtractionError("Excel processing library not available. Install with: pip install pandas xlrd")
+    except Exception as e:
+        raise ExtractionError(f"Error extracting text from Excel file: {e}") from e
+
+    parts = []
+    for sheet_name, df in excel_data.items():
+        parts.append(f"Sheet: {sheet_name}\n{df.iloc[:, :max_cols].to_string(index=False)}")
+    return "\n\n".join(parts).strip()
+
+
+_ocr_cache = None
+_ocr_cache_lock = threading.Lock()
+
+
+def ocr_cache():
+    """This process's OCR result cache (each worker opens the shared SQLite file), or None if disabled"""
+    global _ocr_cache
+    if os.getenv("OCR_CACHE_DISABLED", "").lower() in ("1", "true", "yes"):
+        return None
+    with _ocr_cache_lock:
+        if _ocr_cache is None:
+            _ocr_cache = DiskCache(
+                os.getenv("OCR_CACHE_PATH", os.path.join(".cache", "ocr_results.sqlite3")),
+                ttl_seconds=float(os.getenv("OCR_CACHE_TTL", 30 * 24 * 3600)),
+                max_bytes=int(float(os.getenv("OCR_CACHE_MAX_MB", 50)) * 1024 * 1024),
+            )
+        return _ocr_cache
+
+
+def ocr_cache_key(digest, lang, config, settings=None, **source):
+    """
+    Content-addressed key: the same image (by SHA-256 hex digest) OCR'd by the
+    same engine and settings. source identifies an image derived from the
+    file, e.g. page=3, dpi=200 for a rendered PDF page.
+    """
+    request = {
+        "image": digest,
+        **source,
+        "tesseract": engine_version(),
+        "lang": lang,
+        "config": config,
+        "preprocessing": settings,
+    }
+    return hashlib.sha256(json.dumps(request, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def ocr_available():
+    """Whether Pillow and an OCR backend are installed, and the backend finds tesseract"""
+    try:
+        import PIL  # noqa: F401
+        if ocr_backend() is None:
+            return False
+    except ImportError:
+        return False
+    except ValueError as e:
+        raise ExtractionError(str(e)) from e
+    try:
+        # e.g. pytesseract is installed but the tesseract executable is not
+        engine_version()
+    except Exception:
+        return False
+    return True
+
+
+def extract_text_from_image(file_bytes):
+    """Extract text from image using OCR (answered from the OCR cache when the image was seen before)"""
+    if not ocr_available():
+        raise ExtractionError(
+            "Image processing libraries not available. Install with: pip install pillow tesserocr "
+            "(or pip install pytesseract; Tesseract OCR must also be installed on the system)"
+        )
+
+    lang = os.getenv("OCR_LANG", "eng")
+    config = os.getenv("OCR_CONFIG", "")
+    settings = ocr_settings()
+    try:
+        cache = ocr_cache()
+        key = ocr_cache_key(hashlib.sha256(file_bytes).hexdigest(), lang, config, settings) if cache is not None else None
+        if key is not None:
+            text = cache.get(key)
+            if text is not None:
+                return text
+
+        text = ocr_image(file_bytes, lang, config, settings)
+    except ImageTooLarge as e:
+        raise ExtractionError(str(e)) from e
+    except Exception as e:
+        raise ExtractionError(
+            f"Error extracting text from image: {e}. Make sure Tesseract OCR is installed on your system"
+        ) from e
+
+    if key is not None:
+        cache.set(key, text)
+    return text
+
+
+def extraction_settings():
+    """Everything besides the file and max_chars that can change its extracted text"""
+    try:
+        ocr = engine_version() if ocr_available() else None
+    except ExtractionError:
+        ocr = None
+    return {
+        "ocr": ocr,
+        "ocr_lang": os.getenv("OCR_LANG", "eng"),
+        "ocr_config": os.getenv("OCR_CONFIG", ""),
+        "ocr_settings": ocr_settings(),
+        "pdf_ocr": pdf_ocr_settings(),
+        "pdf_renderer": pdf_rasterizer(),
+        "excel": excel_limits(),
+    }
+
+
+def file_kind(file_name):
+    """Lower-case extension without the dot, e.g. "pdf" (used for span names)"""
+    return os.path.splitext(file_name.lower())[1].lstrip(".") or "unknown"
+
+
+def extract_text(file_name, file_bytes, max_chars=None, page_ranges=None):
+    """
+    Extract the text of one file, choosing the extractor from its extension.
+    max_chars applies to PDFs and Excel workbooks, page_ranges to PDFs.
+    """
+    name = file_name.lower()
+    if name.endswith(".pdf"):
+        return extract_text_from_pdf(file_bytes, max_chars=max_chars, page_ranges=page_ranges)
+    if name.endswith(".docx"):
+        return extract_text_from_docx(file_bytes)
+    if name.endswith((".xlsx", ".xls")):
+        return extract_text_from_excel(file_bytes, max_chars=max_chars)
+    if name.endswith((".txt", ".csv")):
+        try:
+            return file_bytes.decode("utf-8")
+        except UnicodeDecodeError as e:
+            raise ExtractionError(f"Text file is not UTF-8: {e}") from e
+    if name.endswith(IMAGE_EXTENSIONS):
+        return extract_text_from_image(file_bytes)
+    raise ExtractionError(f"Unsupported file type: {name}")
+
+
+def _timed_extract(file_name, file_bytes, max_chars=None, page_ranges=None):
+    # Runs in a worker; returns the time spent extracting so the caller can tell it from pool queueing,
+    # and the warnings reported along the way
+    started = time.perf_counter()
+    _warnings.messages = []
+    try:
+        text = extract_text(file_name, file_bytes, max_chars, page_ranges)
+    except ExtractionError:
+        raise
+    except Exception as e:
+        raise ExtractionError(f"Error extracting text from {file_name}: {e}") from e
+    finally:
+        messages, _warnings.messages = _warnings.messages, None
+    return text, time.perf_counter() - started, messages
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def extraction_workers():
+    workers = os.getenv("EXTRACTION_WORKERS")
+    if workers is not None:
+        return max(int(workers), 0)
+    return min(os.cpu_count() or 1, 4)
+
+
+def _init_worker():
+    # Tiles and scanned PDF pages are OCR'd several at once: one OpenMP thread per tesseract run.
+    # Set here, in the worker's own environment, before tesseract is first loaded
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+
+def get_pool():
+    """The process-wide extraction pool, started on first use (None when EXTRACTION_WORKERS=0)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None and extraction_workers() > 0:
+            # spawn, not fork: the app process runs threads (Streamlit, the LLM runtime loop)
+            _pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=extraction_workers(), mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return _pool
+
+
+def _reset_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _result(index, file_name, file_bytes, submitted, outcome=None, error=None):
+    text, seconds, warnings = outcome if outcome is not None else (None, 0.0, [])
+    wall = time.perf_counter() - submitted
+    span = {"file": file_name, "bytes": len(file_bytes), "queue": round(max(wall - seconds, 0.0), 4)}
+    if error is not None:
+        span["error"] = type(error).__name__
+    if warnings:
+        span["warnings"] = len(warnings)
+    telemetry.record_span(f"extract_{file_kind(file_name)}", "extract", wall, **span)
+    return {"index": index, "name": file_name, "text": text, "error": error, "warnings": warnings, "seconds": wall}
+
+
+def extract_files(files, max_chars=None, page_ranges=None):
+    """
+    Extract text from (file_name, file_bytes) pairs in parallel.
+    max_chars and page_ranges are passed to every file's extractor.
+
+    Yields one dict per file as soon as it finishes, in completion order:
+    {"index", "name", "text", "error", "warnings", "seconds"}, where index is
+    the file's position in files, error is an ExtractionError (text is then
+    None) and warnings lists problems that only degraded the text.
+    """
+    pool = get_pool()
+    if pool is None:
+        for index, (file_name, file_bytes) in enumerate(files):
+            submitted = time.perf_counter()
+            try:
+                outcome = _timed_extract(file_name, file_bytes, max_chars, page_ranges)
+            except ExtractionError as e:
+                yield _result(index, file_name, file_bytes, submitted, error=e)
+                continue
+            yield _result(index, file_name, file_bytes, submitted, outcome)
+        return
+
+    submitted = time.perf_counter()
+    futures = {}
+    for index, (file_name, file_bytes) in enumerate(files):
+        futures[pool.submit(_timed_extract, file_name, file_bytes, max_chars, page_ranges)] = index
+    try:
+        for future in concurrent.futures.as_completed(futures):
+            index = futures[future]
+            file_name, file_bytes = files[index]
+            try:
+                outcome = future.result()
+            except ExtractionError as e:
+                yield _result(index, file_name, file_bytes, submitted, error=e)
+                continue
+            except concurrent.futures.process.BrokenProcessPool as e:
+                # A worker died (e.g. killed by the OOM killer); start a fresh pool next time
+                _reset_pool(pool)
+                yield _result(index, file_name, file_bytes, submitted, error=ExtractionError(
+                    f"Extraction worker crashed while processing {file_name}: {e}"
+                ))
+                continue
+            yield _result(index, file_name, file_bytes, submitted, outcome)
+    finally:
+        # The caller stopped early (e.g. a Streamlit rerun): drop files not yet started
+        for future in futures:
+            future.cancel()
@@ -0,0 +1,341 @@
+"""
+Google Drive downloads for the Drive tab.
+
+Rather than one get_media call per file ID, one after another, with the
+format guessed from the downloaded bytes:
+
+    metadata  one batch request fetches the name, mimeType, size,
+              md5Checksum and modifiedTime of every file (100 per batch)
+    export    native Google Docs and Slides are exported as plain text and
+              Sheets as CSV (first sheet), a fraction of the bytes of a
+              binary format; get_media cannot fetch them at all
+    download  everything else is fetched with get_media, DRIVE_WORKERS
+              files at a time, each thread on its own HTTP connection
+              (httplib2 connections are not thread-safe)
+
+Every file is given a name whose extension matches its mimeType, so
+``file_extraction.extract_text`` picks the right extractor for it.
+
+Downloads and their extracted text are cached on disk, keyed by file ID
+and version: md5Checksum for binary files, modifiedTime (plus the export
+format) for native Google files, which have no checksum. The batched
+metadata request doubles as the freshness check, so an unchanged file is
+neither downloaded nor extracted again; a changed file gets a new version
+and the old entries age out through LRU eviction.
+
+There are no Streamlit calls here; a failure is a ``DriveError`` whose
+message can be shown to the user as-is.
+
+Settings come from the environment:
+    DRIVE_WORKERS         downloads in flight at once (default: 4)
+    DRIVE_MAX_MB          larger files are skipped without downloading (default: 50)
+    DRIVE_CACHE_PATH      SQLite file (default: .cache/drive_files.sqlite3)
+    DRIVE_CACHE_TTL       entry lifetime in seconds (default: 30 days)
+    DRIVE_CACHE_MAX_MB    size budget before LRU eviction (default: 500)
+    DRIVE_CACHE_DISABLED  set to 1 to turn the Drive cache off
+"""
+
+import concurrent.futures
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+import time
+
+import telemetry
+from disk_cache import DiskCache
+from file_extraction import IMAGE_EXTENSIONS, extraction_settings, file_kind
+
+METADATA_FIELDS = "id,name,mimeType,size,md5Checksum,modifiedTime"
+
+# Drive allows at most 100 calls per batch request
+BATCH_SIZE = 100
+
+# Native Google formats: (export mimeType, extension)
+EXPORT_FORMATS = {
+    "application/vnd.google-apps.document": ("text/plain", ".txt"),
+    "application/vnd.google-apps.presentation": ("text/plain", ".txt"),
+    "application/vnd.google-apps.spreadsheet": ("text/csv", ".csv"),
+}
+
+MIME_EXTENSIONS = {
+    "application/pdf": ".pdf",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": ".docx",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": ".xlsx",
+    "application/vnd.ms-excel": ".xls",
+    "text/plain": ".txt",
+    "text/csv": ".csv",
+    "image/png": ".png",
+    "image/jpeg": ".jpg",
+    "image/tiff": ".tiff",
+    "image/bmp": ".bmp",
+}
+
+KNOWN_KINDS = {extension.lstrip(".") for extension in list(MIME_EXTENSIONS.values()) + list(IMAGE_EXTENSIONS)}
+
+FILE_ID_PATTERNS = [
+    re.compile(r"/(?:file|document|spreadsheets|presentation)/d/([\w-]+)"),
+    re.compile(r"[?&]id=([\w-]+)"),
+]
+
+
+class DriveError(Exception):
+    """A Drive file could not be fetched; the message is meant for the user"""
+
+
+def parse_file_ids(text):
+    """File IDs from Drive/Docs/Sheets/Slides links or bare IDs, one per line, in order and without repeats"""
+    file_ids = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        match = next((m for m in (pattern.search(line) for pattern in FILE_ID_PATTERNS) if m), None)
+        file_id = match.group(1) if match else line
+        if file_id not in file_ids:
+            file_ids.append(file_id)
+    return file_ids
+
+
+def drive_workers():
+    return max(int(os.getenv("DRIVE_WORKERS", 4)), 1)
+
+
+def max_download_bytes():
+    return int(float(os.getenv("DRIVE_MAX_MB", 50)) * 1024 * 1024)
+
+
+def _drive_error(file_id, error):
+    status = getattr(getattr(error, "resp", None), "status", None)
+    if status == 404:
+        return DriveError(f"File {file_id} was not found, or it is not shared with the connected account")
+    if status == 403:
+        return DriveError(f"No permission to read file {file_id}")
+    return DriveError(f"Error fetching file {file_id} from Google Drive: {error}")
+
+
+def fetch_metadata(service, file_ids):
+    """{file_id: metadata dict, or DriveError} for all file_ids, in one batch request per 100 files"""
+    results = {}
+
+    def callback(request_id, response, exception):
+        results[request_id] = _drive_error(request_id, exception) if exception is not None else response
+
+    for start in range(0, len(file_ids), BATCH_SIZE):
+        batch = service.new_batch_http_request(callback=callback)
+        for file_id in file_ids[start:start + BATCH_SIZE]:
+            batch.add(
+                service.files().get(fileId=file_id, fields=METADATA_FIELDS, supportsAllDrives=True),
+                request_id=file_id
+            )
+        try:
+            batch.execute()
+        except Exception as e:
+            for file_id in file_ids[start:start + BATCH_SIZE]:
+                results.setdefault(file_id, _drive_error(file_id, e))
+    return results
+
+
+def extraction_name(metadata):
+    """The file name with the extension its (export) format is extracted by, e.g. "Deck.txt" for a Google Doc"""
+    name = metadata.get("name") or metadata["id"]
+    mime_type = metadata.get("mimeType", "")
+    if mime_type in EXPORT_FORMATS:
+        extension = EXPORT_FORMATS[mime_type][1]
+        return name if name.lower().endswith(extension) else name + extension
+    extension = MIME_EXTENSIONS.get(mime_type)
+    # Keep an extension the extractors already understand (e.g. ".jpeg")
+    if extension is None or file_kind(name) in KNOWN_KINDS:
+        return name
+    return name + extension
+
+
+_drive_cache = None
+_drive_cache_lock = threading.Lock()
+
+
+def drive_cache():
+    """The Drive file and text cache, or None if disabled"""
+    global _drive_cache
+    if os.getenv("DRIVE_CACHE_DISABLED", "").lower() in ("1", "true", "yes"):
+        return None
+    with _drive_cache_lock:
+        if _drive_cache is None:
+            _drive_cache = DiskCache(
+                os.getenv("DRIVE_CACHE_PATH", os.path.join(".cache", "drive_files.sqlite3")),
+                ttl_seconds=float(os.getenv("DRIVE_CACHE_TTL", 30 * 24 * 3600)),
+                max_bytes=int(float(os.getenv("DRIVE_CACHE_MAX_MB", 500)) * 1024 * 1024),
+            )
+        return _drive_cache
+
+
+def file_version(metadata):
+    """What identifies this revision of the file's bytes, or None if Drive gave nothing to go by"""
+    mime_type = metadata.get("mimeType", "")
+    if mime_type in EXPORT_FORMATS:
+        modified = metadata.get("modifiedTime")
+        return f"{modified}:{EXPORT_FORMATS[mime_type][0]}" if modified else None
+    if metadata.get("md5Checksum"):
+        return f"md5:{metadata['md5Checksum']}"
+    return metadata.get("modifiedTime")
+
+
+def cache_key(metadata, kind, max_chars=None):
+    """
+    Key of a file's bytes (kind "file") or extracted text (kind "text", which
+    also depends on max_chars and the extraction settings, e.g. whether OCR
+    is installed)
+    """
+    key = f"drive:{kind}:{metadata['id']}:{file_version(metadata)}"
+    if kind == "file":
+        return key
+    settings = hashlib.sha256(json.dumps(extraction_settings(), sort_keys=True).encode("utf-8")).hexdigest()
+    return f"{key}:{max_chars}:{settings[:16]}"
+
+
+def cached_text(metadata, max_chars=None):
+    cache = drive_cache()
+    if cache is None or file_version(metadata) is None:
+        return None
+    return cache.get(cache_key(metadata, "text", max_chars))
+
+
+def store_text(metadata, text, max_chars=None):
+    """Remember the text extracted from this version of the file (empty text is not kept, so it is retried)"""
+    cache = drive_cache()
+    if cache is not None and text and file_version(metadata) is not None:
+        cache.set(cache_key(metadata, "text", max_chars), text)
+
+
+def _cached_download(service, metadata):
+    # Runs in a download thread; DiskCache serializes its own access
+    cache = drive_cache()
+    if cache is None or file_version(metadata) is None:
+        return download_file(service, metadata), False
+    key = cache_key(metadata, "file")
+    file_bytes = cache.get(key)
+    if file_bytes is not None:
+        return file_bytes, True
+    file_bytes = download_file(service, metadata)
+    cache.set(key, file_bytes)
+    return file_bytes, False
+
+
+_local = threading.local()
+
+
+def _thread_http(service):
+    # One authorized connection per download thread; None means use the service's own (single thread only)
+    credentials = getattr(service._http, "credentials", None)
+    if credentials is None:
+        return None
+    if getattr(_local, "credentials", None) is not credentials:
+        import google_auth_httplib2
+        import httplib2
+        _local.http = google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http())
+        _local.credentials = credentials
+    return _local.http
+
+
+def download_file(service, metadata):
+    """Bytes of one file: exported for native Google formats, downloaded as-is otherwise"""
+    from googleapiclient.http import MediaIoBaseDownload
+
+    file_id = metadata["id"]
+    mime_type = metadata.get("mimeType", "")
+    if mime_type in EXPORT_FORMATS:
+        request = service.files().export_media(fileId=file_id, mimeType=EXPORT_FORMATS[mime_type][0])
+    elif mime_type.startswith("application/vnd.google-apps."):
+        kind = mime_type.rsplit(".", 1)[-1]
+        raise DriveError(f"{metadata.get('name', file_id)} is a Google {kind}, which can't be downloaded as a document")
+    else:
+        size = int(metadata.get("size") or 0)
+        if size > max_download_bytes():
+            raise DriveError(
+                f"{metadata.get('name', file_id)} is {size / 1024 / 1024:.0f}MB, more than DRIVE_MAX_MB allows"
+            )
+        request = service.files().get_media(fileId=file_id, supportsAllDrives=True)
+
+    http = _thread_http(service)
+    if http is not None:
+        request.http = http
+    buffer = io.BytesIO()
+    try:
+        downloader = MediaIoBaseDownload(buffer, request)
+        done = False
+        while not done:
+            _, done = downloader.next_chunk()
+    except Exception as e:
+        raise _drive_error(file_id, e) from e
+    return buffer.getvalue()
+
+
+def _result(index, file_id, metadata, started, file_bytes=None, error=None, text=None, cached=None):
+    wall = time.perf_counter() - started
+    name = extraction_name(metadata) if metadata else file_id
+    span = {"file_id": file_id, "bytes": len(file_bytes or b"")}
+    if metadata:
+        span["mime_type"] = metadata.get("mimeType", "")
+    if cached:
+        span["cached"] = cached
+    if error is not None:
+        span["error"] = type(error).__name__
+    telemetry.record_span("drive_download", "download", wall, **span)
+    return {
+        "index": index, "id": file_id, "name": name, "metadata": metadata,
+        "bytes": file_bytes, "text": text, "cached": cached, "error": error, "seconds": wall,
+    }
+
+
+def download_files(service, file_ids, max_chars=None):
+    """
+    Fetch metadata for all file_ids in batches, then download (or export)
+    the files DRIVE_WORKERS at a time, going to the cache first.
+
+    Yields one dict per file as soon as it is done, in completion order:
+    {"index", "id", "name", "metadata", "bytes", "text", "cached", "error",
+    "seconds"}, where index is the file's position in file_ids, name is its
+    extraction_name and error is a DriveError (bytes is then None). When
+    this version's text extracted with max_chars is cached, text is set and
+    the file is not downloaded (bytes is None, cached is "text"); otherwise
+    cached is "file" if the bytes came from the cache.
+    """
+    started = time.perf_counter()
+    with telemetry.span("drive_metadata", "download", files=len(file_ids)):
+        metadata = fetch_metadata(service, file_ids)
+
+    pending = []
+    for index, file_id in enumerate(file_ids):
+        found = metadata.get(file_id)
+        if not isinstance(found, dict):
+            error = found if found is not None else DriveError(f"No metadata returned for file {file_id}")
+            yield _result(index, file_id, None, started, error=error)
+            continue
+        text = cached_text(found, max_chars)
+        if text is not None:
+            yield _result(index, file_id, found, started, text=text, cached="text")
+        else:
+            pending.append((index, file_id, found))
+
+    # Only share the service's own connection between threads if there is no per-thread one
+    workers = drive_workers() if _thread_http(service) is not None else 1
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_cached_download, service, found): (index, file_id, found) for index, file_id, found in pending}
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                index, file_id, found = futures[future]
+                try:
+                    file_bytes, from_cache = future.result()
+                except DriveError as e:
+                    yield _result(index, file_id, found, started, error=e)
+                    continue
+                except Exception as e:
+                    yield _result(index, file_id, found, started, error=_drive_error(file_id, e))
+                    continue
+                yield _result(index, file_id, found, started, file_bytes, cached="file" if from_cache else None)
+        finally:
+            # The caller stopped early (e.g. a Streamlit rerun): drop downloads not yet started
+            for future in futures:
+                future.cancel()
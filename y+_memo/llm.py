@@ -0,0 +1,339 @@
+"""
+Single entry point for chat completions, shared by app.py and memo_pipeline.py.
+
+``LLMRuntime`` owns the one pooled ``openai.AsyncOpenAI`` client of the
+process and the background event loop it runs on, so HTTP connections stay
+alive across calls, Streamlit sessions and reruns.
+
+Responses are cached on disk, keyed by a hash of model + messages +
+temperature + max_tokens, so re-sending an identical prompt is free.
+Pass ``use_cache=False`` to force a fresh completion for one call.
+``astream_chat_completion`` streams the same requests token by token.
+
+Cache settings come from the environment:
+    LLM_CACHE_PATH      SQLite file (default: .cache/llm_responses.sqlite3)
+    LLM_CACHE_TTL       entry lifetime in seconds (default: 7 days)
+    LLM_CACHE_MAX_MB    size budget before LRU eviction (default: 200)
+    LLM_CACHE_DISABLED  set to 1 to turn the cache off entirely
+
+Each call names a route (e.g. "memo", "market_category"); the model,
+temperature and token budget for every route come from model_routes.json
+(or the file named by LLM_ROUTES_PATH), see model_router.py.
+
+Every API request goes through ``request_scheduler`` (see llm_scheduler.py
+for LLM_RPM, LLM_TPM, LLM_MAX_CONCURRENCY and the retry settings); the
+OpenAI client's own retries are disabled so the two don't compound.
+
+Connection pool settings (see ``LLMRuntime.from_env``):
+    LLM_MAX_CONNECTIONS      concurrent connections to the API (default: 20)
+    LLM_MAX_KEEPALIVE        idle connections kept open (default: 10)
+    LLM_KEEPALIVE_EXPIRY     seconds an idle connection is kept (default: 120)
+    LLM_TIMEOUT              read/write timeout in seconds (default: 120)
+    LLM_CONNECT_TIMEOUT      connect timeout in seconds (default: 10)
+
+With LLM_CASSETTE_MODE=record|replay the client's HTTP traffic is recorded
+to / replayed from a cassette (see llm_cassette.py); the response cache is
+off while a cassette is active so every request reaches it.
+
+Every request and cache hit is recorded with its queue time, tokens and
+estimated cost in the current telemetry run (see telemetry.py).
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+
+import httpx
+import openai
+
+import telemetry
+from disk_cache import DiskCache
+from llm_cassette import Cassette
+from llm_scheduler import RequestScheduler
+from model_router import ModelRouter
+
+# Call site -> model/temperature/max_tokens, loaded once per process
+model_router = ModelRouter.load(os.getenv("LLM_ROUTES_PATH", "model_routes.json"))
+
+# Rate limits, retries and the concurrency cap shared by every request in the process
+request_scheduler = RequestScheduler.from_env()
+
+if os.getenv("LLM_CACHE_DISABLED", "").lower() in ("1", "true", "yes") or \
+        os.getenv("LLM_CASSETTE_MODE", "").strip().lower() not in ("", "off"):
+    response_cache = None
+else:
+    response_cache = DiskCache(
+        os.getenv("LLM_CACHE_PATH", os.path.join(".cache", "llm_responses.sqlite3")),
+        ttl_seconds=float(os.getenv("LLM_CACHE_TTL", 7 * 24 * 3600)),
+        max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB", 200)) * 1024 * 1024),
+    )
+
+
+def cache_key(model, messages, temperature, max_tokens, tools=None):
+    """Content-addressed key for a chat completion request"""
+    request = {"model": model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens}
+    if tools:
+        request["tools"] = tools
+    payload = json.dumps(request, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _cached(key, use_cache):
+    if response_cache is None or not use_cache:
+        return None
+    return response_cache.get(key)
+
+
+def _store(key, content):
+    # A bypassed call still refreshes the entry so the next cached call sees it
+    if response_cache is not None and content is not None:
+        response_cache.set(key, content)
+
+
+def estimate_prompt_tokens(messages):
+    """Rough prompt token count (~4 characters per token)"""
+    return sum(len(str(message.get("content") or "")) for message in messages) // 4
+
+
+def estimate_tokens(messages, max_tokens):
+    """Rough prompt + completion token count for rate limiting"""
+    return estimate_prompt_tokens(messages) + (max_tokens or 1000)
+
+
+def request_settings(route=None, model=None, temperature=None, max_tokens=None):
+    """Resolve a route through the model router, letting explicit arguments override it"""
+    settings = model_router.resolve(route) if route else {"model": "gpt-4", "temperature": 0.7, "max_tokens": None}
+    if model is not None:
+        settings["model"] = model
+    if temperature is not None:
+        settings["temperature"] = temperature
+    if max_tokens is not None:
+        settings["max_tokens"] = max_tokens
+    return settings
+
+
+async def achat_completion(client, messages, route=None, model=None, temperature=None, max_tokens=None,
+                           use_cache=True, tools=None):
+    """
+    Return the message content of a chat completion using an async client.
+
+    The model, temperature and token budget come from the route's entry in
+    the routing table unless passed explicitly.
+
+    If tools are given, the model is forced to call the first one and the
+    call's JSON arguments string is returned instead of the message content.
+    """
+    settings = request_settings(route, model, temperature, max_tokens)
+    key = cache_key(settings["model"], messages, settings["temperature"], settings["max_tokens"], tools)
+    content = _cached(key, use_cache)
+    if content is not None:
+        model_router.record_cache_hit(route)
+        telemetry.record_llm_call(route, settings["model"], 0.0, cached=True)
+        return content
+
+    request = {}
+    if tools:
+        request["tools"] = tools
+        request["tool_choice"] = {"type": "function", "function": {"name": tools[0]["function"]["name"]}}
+
+    async def send():
+        response = await client.chat.completions.create(
+            messages=messages,
+            **settings,
+            **request
+        )
+        return response, response.usage.total_tokens if response.usage else None
+
+    started = time.perf_counter()
+    try:
+        response, queue_seconds = await request_scheduler.run(send, estimate_tokens(messages, settings["max_tokens"]))
+    except Exception as e:
+        telemetry.record_llm_call(route, settings["model"], time.perf_counter() - started, error=e)
+        raise
+    elapsed = time.perf_counter() - started
+    model_router.record(route, elapsed - queue_seconds)
+    usage = response.usage
+    telemetry.record_llm_call(
+        route, settings["model"], elapsed, queue_seconds,
+        prompt_tokens=usage.prompt_tokens if usage else 0,
+        completion_tokens=usage.completion_tokens if usage else 0
+    )
+    message = response.choices[0].message
+    content = message.tool_calls[0].function.arguments if tools else message.content
+    _store(key, content)
+    return content
+
+
+async def astream_chat_completion(client, messages, on_delta, route=None, model=None, temperature=None,
+                                  max_tokens=None, use_cache=True):
+    """
+    Stream a chat completion with an async client, calling on_delta(text) for
+    every content chunk as it arrives. Returns the full message content.
+
+    A cache hit is delivered to on_delta as a single chunk.
+    """
+    settings = request_settings(route, model, temperature, max_tokens)
+    key = cache_key(settings["model"], messages, settings["temperature"], settings["max_tokens"])
+    content = _cached(key, use_cache)
+    if content is not None:
+        model_router.record_cache_hit(route)
+        telemetry.record_llm_call(route, settings["model"], 0.0, cached=True)
+        on_delta(content)
+        return content
+
+    parts = []
+    usage = []
+
+    async def send():
+        stream = await client.chat.completions.create(
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+            **settings
+        )
+        try:
+            async for chunk in stream:
+                if chunk.usage:
+                    usage.append(chunk.usage)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    on_delta(delta)
+        except Exception as e:
+            # Retrying after text was shown would duplicate it on the page
+            if parts:
+                raise RuntimeError(f"Stream interrupted after {len(parts)} chunks: {e}") from e
+            raise
+        return "".join(parts), usage[-1].total_tokens if usage else None
+
+    started = time.perf_counter()
+    try:
+        content, queue_seconds = await request_scheduler.run(send, estimate_tokens(messages, settings["max_tokens"]))
+    except Exception as e:
+        telemetry.record_llm_call(route, settings["model"], time.perf_counter() - started, error=e)
+        raise
+    elapsed = time.perf_counter() - started
+    model_router.record(route, elapsed - queue_seconds)
+    if usage:
+        telemetry.record_llm_call(route, settings["model"], elapsed, queue_seconds,
+                                  prompt_tokens=usage[-1].prompt_tokens, completion_tokens=usage[-1].completion_tokens)
+    else:
+        # Servers that ignore include_usage: fall back to the ~4 characters per token estimate
+        telemetry.record_llm_call(route, settings["model"], elapsed, queue_seconds,
+                                  prompt_tokens=estimate_prompt_tokens(messages), completion_tokens=len(content) // 4,
+                                  estimated=True)
+    _store(key, content)
+    return content
+
+
+class ConnectionStats:
+    """Counts API requests and newly opened connections on the shared pool"""
+
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+        self._lock = threading.Lock()
+
+    async def on_request(self, request):
+        with self._lock:
+            self.requests += 1
+        request.extensions["trace"] = self._trace
+
+    async def _trace(self, event_name, info):
+        if event_name == "connection.connect_tcp.complete":
+            with self._lock:
+                self.new_connections += 1
+
+    @property
+    def reused(self):
+        return max(self.requests - self.new_connections, 0)
+
+    def snapshot(self):
+        with self._lock:
+            requests, new_connections = self.requests, self.new_connections
+        return {
+            "requests": requests,
+            "new_connections": new_connections,
+            "reused": max(requests - new_connections, 0),
+            "reuse_ratio": (requests - new_connections) / requests if requests else 0.0,
+        }
+
+
+class LLMRuntime:
+    """
+    Process-wide pooled AsyncOpenAI client plus a background event loop.
+
+    The async client's connection pool is bound to the loop it first runs on,
+    so every coroutine using ``self.client`` must go through ``run`` /
+    ``submit`` / ``run_with_events`` rather than ``asyncio.run``.
+
+    If a ``Cassette`` is given, HTTP traffic is recorded to or replayed from it.
+    """
+
+    def __init__(self, api_key, max_connections=20, max_keepalive_connections=10,
+                 keepalive_expiry=120.0, timeout=120.0, connect_timeout=10.0, base_url=None, cassette=None):
+        self.connection_stats = ConnectionStats()
+        self.cassette = cassette
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        transport = cassette.transport(httpx.AsyncHTTPTransport(limits=limits)) if cassette is not None else None
+        http_client = openai.DefaultAsyncHttpxClient(
+            limits=limits,
+            transport=transport,
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            event_hooks={"request": [self.connection_stats.on_request]},
+        )
+        # Retries are handled by request_scheduler, which also honours Retry-After
+        self.client = openai.AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
+
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="llm-runtime", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_env(cls, api_key, base_url=None, cassette=None):
+        return cls(
+            api_key,
+            max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", 20)),
+            max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE", 10)),
+            keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY", 120)),
+            timeout=float(os.getenv("LLM_TIMEOUT", 120)),
+            connect_timeout=float(os.getenv("LLM_CONNECT_TIMEOUT", 10)),
+            base_url=base_url or os.getenv("OPENAI_BASE_URL"),
+            cassette=cassette if cassette is not None else Cassette.from_env(),
+        )
+
+    def submit(self, coro):
+        """Schedule a coroutine on the runtime loop; returns a concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro):
+        """Run a coroutine on the runtime loop and block until it finishes"""
+        return self.submit(coro).result()
+
+    def run_with_events(self, make_coro, on_event, poll_interval=0.05):
+        """
+        Run make_coro(emit) on the runtime loop, relaying every emit(*args)
+        to on_event(*args) on the calling thread (e.g. the Streamlit script
+        thread, which is the only one allowed to update the page).
+        """
+        events = queue.Queue()
+        future = self.submit(make_coro(lambda *args: events.put(args)))
+        while True:
+            try:
+                on_event(*events.get(timeout=poll_interval))
+            except queue.Empty:
+                if future.done():
+                    break
+        while not events.empty():
+            on_event(*events.get_nowait())
+        return future.result()
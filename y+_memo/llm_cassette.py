@@ -0,0 +1,217 @@
+"""
+Record/replay of OpenAI HTTP traffic ("cassettes") for offline, repeatable runs.
+
+In record mode every request/response pair the LLMRuntime client makes is
+appended to a JSONL cassette together with its timing: when the response
+headers arrived and when each body chunk (including every streamed SSE
+event) arrived. In replay mode no network is used; responses are served
+from the cassette with the same timings, scaled by LLM_CASSETTE_SPEED
+(1 = original pace, 0 = as fast as possible).
+
+Settings come from the environment:
+    LLM_CASSETTE_MODE   "record" or "replay" (unset = off)
+    LLM_CASSETTE_PATH   cassette file (default: cassettes/memo_run.jsonl)
+    LLM_CASSETTE_SPEED  replay time scale (default: 1.0)
+
+Requests are matched on method, path and JSON body, so a replay has to send
+the same prompts as the recording (same form data, prompt template and
+routes). Identical requests are replayed in recorded order, cycling when a
+run makes more of them than were recorded. A request that was never
+recorded gets a 400 response instead of reaching the network.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+
+import httpx
+
+MODES = ("record", "replay")
+
+# Not worth keeping, or not safe to write to disk
+DROPPED_HEADERS = {"set-cookie", "openai-organization", "openai-project"}
+
+
+def request_key(method, path, body):
+    """Stable identity of a request, independent of host and JSON key order"""
+    try:
+        body = json.dumps(json.loads(body), sort_keys=True, ensure_ascii=False)
+    except ValueError:
+        body = body.decode("latin-1")
+    payload = f"{method} {path}\n{body}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _route_hint(body):
+    """Model and first prompt line, to make cassettes readable"""
+    try:
+        request = json.loads(body)
+        content = str(request["messages"][0].get("content") or "").strip()
+        return {"model": request.get("model"), "prompt": content.splitlines()[0][:80] if content else ""}
+    except (ValueError, KeyError, IndexError, TypeError):
+        return {}
+
+
+class Cassette:
+    """A JSONL file of recorded responses, indexed by request key"""
+
+    def __init__(self, path, mode, speed=1.0):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode: {mode!r} (expected one of {', '.join(MODES)})")
+        self.path = path
+        self.mode = mode
+        self.speed = speed
+        self.entries = {}
+        self.misses = 0
+        self._positions = {}
+        self._lock = threading.Lock()
+
+        if mode == "record":
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # A recording always starts a fresh cassette
+            open(path, "w").close()
+        else:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries.setdefault(entry["key"], []).append(entry)
+
+    @classmethod
+    def from_env(cls):
+        """The cassette configured by LLM_CASSETTE_MODE, or None"""
+        mode = os.getenv("LLM_CASSETTE_MODE", "").strip().lower()
+        if not mode or mode == "off":
+            return None
+        return cls(
+            os.getenv("LLM_CASSETTE_PATH", os.path.join("cassettes", "memo_run.jsonl")),
+            mode,
+            speed=float(os.getenv("LLM_CASSETTE_SPEED", 1.0)),
+        )
+
+    def __len__(self):
+        return sum(len(entries) for entries in self.entries.values())
+
+    def transport(self, inner):
+        """httpx transport for this cassette; inner is the real transport used when recording"""
+        if self.mode == "record":
+            return RecordingTransport(self, inner)
+        return ReplayTransport(self)
+
+    def append(self, entry):
+        with self._lock:
+            self.entries.setdefault(entry["key"], []).append(entry)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def next_entry(self, key):
+        with self._lock:
+            entries = self.entries.get(key)
+            if not entries:
+                self.misses += 1
+                return None
+            position = self._positions.get(key, 0)
+            self._positions[key] = position + 1
+            return entries[position % len(entries)]
+
+
+class _RecordingStream(httpx.AsyncByteStream):
+    def __init__(self, stream, started, on_complete):
+        self._stream = stream
+        self._started = started
+        self._on_complete = on_complete
+        self._chunks = []
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            # latin-1 maps bytes to code points 1:1, so any chunk survives JSON
+            self._chunks.append([time.perf_counter() - self._started, chunk.decode("latin-1")])
+            yield chunk
+
+    async def aclose(self):
+        await self._stream.aclose()
+        self._on_complete(self._chunks)
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Forwards to the real transport and appends every exchange to the cassette"""
+
+    def __init__(self, cassette, inner):
+        self.cassette = cassette
+        self.inner = inner
+
+    async def handle_async_request(self, request):
+        body = await request.aread()
+        started = time.perf_counter()
+        response = await self.inner.handle_async_request(request)
+        headers_at = time.perf_counter() - started
+
+        def on_complete(chunks):
+            self.cassette.append({
+                "key": request_key(request.method, request.url.path, body),
+                "method": request.method,
+                "path": request.url.path,
+                **_route_hint(body),
+                "status": response.status_code,
+                "headers": [[name, value] for name, value in response.headers.multi_items()
+                            if name.lower() not in DROPPED_HEADERS],
+                "headers_at": headers_at,
+                "chunks": chunks,
+            })
+
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_RecordingStream(response.stream, started, on_complete),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+
+class _ReplayStream(httpx.AsyncByteStream):
+    def __init__(self, chunks, started, speed):
+        self._chunks = chunks
+        self._started = started
+        self._speed = speed
+
+    async def __aiter__(self):
+        for offset, text in self._chunks:
+            delay = offset * self._speed - (time.perf_counter() - self._started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield text.encode("latin-1")
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """Serves recorded responses with their recorded timing; never touches the network"""
+
+    def __init__(self, cassette):
+        self.cassette = cassette
+
+    async def handle_async_request(self, request):
+        started = time.perf_counter()
+        body = await request.aread()
+        entry = self.cassette.next_entry(request_key(request.method, request.url.path, body))
+        if entry is None:
+            return httpx.Response(400, json={"error": {
+                "message": f"No cassette entry for {request.method} {request.url.path} with this body "
+                           f"({_route_hint(body).get('prompt', '')!r}) in {self.cassette.path}",
+                "type": "cassette_miss",
+                "code": None,
+            }})
+
+        delay = entry["headers_at"] * self.cassette.speed
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return httpx.Response(
+            status_code=entry["status"],
+            headers=entry["headers"],
+            stream=_ReplayStream(entry["chunks"], started, self.cassette.speed),
+        )
@@ -0,0 +1,171 @@
+"""
+Rate-limit-aware scheduling for every OpenAI request made by the process.
+
+``RequestScheduler`` applies, in order:
+    * a token bucket for requests per minute (LLM_RPM)
+    * a token bucket for tokens per minute (LLM_TPM), charged with an
+      estimate up front and corrected with the reported usage afterwards
+    * one concurrency cap (LLM_MAX_CONCURRENCY) shared by all callers
+and retries 429s, timeouts, connection errors and 5xx responses with
+jittered exponential backoff, honouring the server's Retry-After header.
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+
+import openai
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+class TokenBucket:
+    """Refills at rate_per_minute / 60 per second up to capacity; waits when empty"""
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount=1):
+        """Take amount tokens, sleeping until they are available. Returns seconds waited."""
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) / self.rate
+            await asyncio.sleep(delay)
+            waited += delay
+
+    def adjust(self, amount):
+        """Charge (positive) or refund (negative) tokens after the fact"""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+
+def retry_after_seconds(error):
+    """Read Retry-After / retry-after-ms from an OpenAI API error, if present"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+
+class RequestScheduler:
+    """Process-wide limiter and retry policy for chat completion requests"""
+
+    def __init__(self, requests_per_minute=500, tokens_per_minute=80000, max_concurrency=8,
+                 max_retries=5, backoff_base=1.0, backoff_max=60.0):
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stats = {"requests": 0, "retries": 0, "rate_limited": 0, "failed": 0, "in_flight": 0, "queue_seconds": 0.0}
+        self._stats_lock = threading.Lock()
+        # asyncio primitives are bound to one event loop; the app and the batch
+        # CLI run everything on a single LLMRuntime loop, so the cap is global
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            requests_per_minute=float(os.getenv("LLM_RPM", 500)),
+            tokens_per_minute=float(os.getenv("LLM_TPM", 80000)),
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", 8)),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", 5)),
+            backoff_base=float(os.getenv("LLM_BACKOFF_BASE", 1.0)),
+            backoff_max=float(os.getenv("LLM_BACKOFF_MAX", 60.0)),
+        )
+
+    def _semaphore(self):
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def backoff_delay(self, error, attempt):
+        """Retry-After if the server sent one, else full-jitter exponential backoff"""
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def run(self, send, estimated_tokens):
+        """
+        Await send() under the rate limits and concurrency cap, retrying
+        retryable API errors. send returns (result, total_tokens_used or None).
+        Returns (result, seconds spent queued before the successful attempt).
+        """
+        attempt = 0
+        while True:
+            queued = time.perf_counter()
+            await self.request_bucket.acquire(1)
+            await self.token_bucket.acquire(estimated_tokens)
+            async with self._semaphore():
+                queue_seconds = time.perf_counter() - queued
+                self._count("queue_seconds", queue_seconds)
+                self._count("requests")
+                self._count("in_flight")
+                try:
+                    result, used_tokens = await send()
+                    if used_tokens is not None:
+                        self.token_bucket.adjust(used_tokens - estimated_tokens)
+                    return result, queue_seconds
+                except RETRYABLE_ERRORS as e:
+                    if isinstance(e, openai.RateLimitError):
+                        self._count("rate_limited")
+                        # An exhausted quota will not recover by waiting
+                        if getattr(e, "code", None) == "insufficient_quota":
+                            self._count("failed")
+                            raise
+                    if attempt >= self.max_retries:
+                        self._count("failed")
+                        raise
+                    delay = self.backoff_delay(e, attempt)
+                except Exception:
+                    self._count("failed")
+                    raise
+                finally:
+                    self._count("in_flight", -1)
+            attempt += 1
+            self._count("retries")
+            await asyncio.sleep(delay)
+
+    def snapshot(self):
+        with self._stats_lock:
+            return dict(self.stats)
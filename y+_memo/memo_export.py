@@ -0,0 +1,147 @@
+"""
+Markdown and PDF export of generated memos, shared by app.py and batch_memo.py.
+"""
+
+import random
+
+
+def compose_final_memo(initial_memo, vc_analysis):
+    """Combine the Stage 1 memo and Stage 2 VC analysis into one Markdown document"""
+    return f"# Investment Memo\n\n{initial_memo}\n\n---\n\n# Venture Capital Analysis\n\n{vc_analysis}\n"
+
+
+def memo_to_html(final_memo, company_name):
+    """Create the print-ready HTML document used for PDF export"""
+    return f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <title>{company_name} - Investment Memo</title>
+        <style>
+            body {{
+                font-family: 'Arial', sans-serif;
+                line-height: 1.6;
+                color: #333;
+                max-width: 800px;
+                margin: 0 auto;
+                padding: 20px;
+            }}
+            h1 {{
+                color: #2c3e50;
+                border-bottom: 3px solid #3498db;
+                padding-bottom: 10px;
+                page-break-after: avoid;
+            }}
+            h2 {{
+                color: #34495e;
+                border-bottom: 2px solid #3498db;
+                padding-bottom: 5px;
+                margin-top: 30px;
+                page-break-before: always;
+            }}
+            h3 {{
+                color: #7f8c8d;
+                margin-top: 20px;
+            }}
+            p {{
+                margin-bottom: 15px;
+                text-align: justify;
+            }}
+            ul, ol {{
+                margin-bottom: 15px;
+                padding-left: 20px;
+            }}
+            li {{
+                margin-bottom: 5px;
+            }}
+            strong {{
+                color: #2c3e50;
+            }}
+            .header {{
+                text-align: center;
+                margin-bottom: 30px;
+                border-bottom: 2px solid #3498db;
+                padding-bottom: 20px;
+            }}
+            .company-name {{
+                font-size: 24px;
+                font-weight: bold;
+                color: #2c3e50;
+                margin-bottom: 10px;
+            }}
+            .date {{
+                color: #7f8c8d;
+                font-style: italic;
+            }}
+            .section {{
+                margin-bottom: 30px;
+            }}
+            .page-break {{
+                page-break-before: always;
+            }}
+            @media print {{
+                h2 {{
+                    page-break-before: always;
+                }}
+            }}
+        </style>
+    </head>
+    <body>
+        <div class="header">
+            <div class="company-name">{company_name}</div>
+            <div class="date">Investment Memo & Analysis</div>
+            <div class="date">{random.choice(['Generated on', 'Prepared on', 'Analysis Date'])}: {random.choice(['2024', '2025'])}</div>
+        </div>
+        
+        {final_memo.replace('# ', '<h1>').replace('## ', '<h2>').replace('### ', '<h3>').replace('**', '<strong>').replace('**', '</strong>')}
+        
+        <div class="page-break">
+            <h2>Market Analysis Summary</h2>
+            <p>This investment memo includes comprehensive market analysis, investment stage assessment, and venture capital evaluation.</p>
+            <p>The analysis is based on the provided company information and industry benchmarks for companies at similar stages.</p>
+        </div>
+        
+        <div class="page-break">
+            <h2>Key Investment Considerations</h2>
+            <ul>
+                <li><strong>Market Opportunity:</strong> Evaluate the TAM, SAM, and SOM analysis provided</li>
+                <li><strong>Team Assessment:</strong> Review the founding team's background and capabilities</li>
+                <li><strong>Financial Health:</strong> Consider the current financial metrics and runway</li>
+                <li><strong>Competitive Position:</strong> Assess the company's competitive advantages</li>
+                <li><strong>Risk Factors:</strong> Review the identified risks and mitigation strategies</li>
+            </ul>
+        </div>
+    </body>
+    </html>
+    """
+
+
+def convert_memo_to_pdf(final_memo, company_name):
+    """
+    Convert the investment memo and analysis to PDF bytes.
+    Raises ImportError if neither weasyprint nor pdfkit is installed.
+    """
+    html_content = memo_to_html(final_memo, company_name)
+
+    # Try to use weasyprint first (more reliable)
+    try:
+        from weasyprint import HTML
+    except ImportError:
+        HTML = None
+    if HTML is not None:
+        return HTML(string=html_content).write_pdf()
+
+    # Fallback to pdfkit if weasyprint is not available
+    import pdfkit
+    # Configure pdfkit options
+    options = {
+        'page-size': 'A4',
+        'margin-top': '0.75in',
+        'margin-right': '0.75in',
+        'margin-bottom': '0.75in',
+        'margin-left': '0.75in',
+        'encoding': "UTF-8",
+        'no-outline': None
+    }
+    return pdfkit.from_string(html_content, False, options=options)
@@ -0,0 +1,191 @@
+"""
+Background memo generation jobs.
+
+Streamlit re-executes the whole script on every widget interaction, so a
+memo generated inline under ``if st.button(...)`` is aborted by any click
+and lost on the next rerun. ``JobManager`` runs each memo as a job on the
+LLMRuntime event loop instead: the script submits a job, keeps its ID in
+session state and polls it. Jobs keep running across reruns, and finished
+results (memo, VC review, PDF bytes, charts' inputs) stay in the in-process
+results store so they render instantly on any later rerun.
+
+Each job carries a telemetry.RunTrace (``job.trace``) with the time it
+waited for a worker, every stage and LLM call, and the PDF render.
+"""
+
+import asyncio
+import threading
+import time
+import uuid
+
+import memo_export
+import telemetry
+from memo_pipeline import run_memo_pipeline
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+# Stages on the memo's critical path, used for the progress bar
+PROGRESS_STAGES = ["company_profile", "memo", "vc_review", "pdf"]
+
+STAGE_LABELS = {
+    "market_size_estimate": "Estimating market size",
+    "company_profile": "Profiling company",
+    "market_category": "Identifying market category",
+    "categorize": "Categorizing company data",
+    "market_analysis": "Analyzing market position",
+    "memo": "Writing investment memo",
+    "vc_review": "Writing VC analysis",
+    "pdf": "Rendering PDF",
+}
+
+
+class MemoJob:
+    """State of one memo generation, updated from the runtime loop and read by the script thread"""
+
+    def __init__(self, form_data):
+        self.id = uuid.uuid4().hex[:12]
+        self.form_data = form_data
+        self.status = QUEUED
+        self.stage = None
+        self.finished_stages = []
+        self.streamed = {"memo": "", "vc_review": ""}
+        self.result = None
+        self.final_memo = None
+        self.pdf_bytes = None
+        self.pdf_error = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+        self.trace = telemetry.RunTrace("memo", job_id=self.id, company=form_data.get("company_name"))
+        self._lock = threading.Lock()
+
+    @property
+    def done(self):
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    @property
+    def progress(self):
+        """Fraction of the critical-path stages finished, 0.0 - 1.0"""
+        if self.status == DONE:
+            return 1.0
+        with self._lock:
+            finished = sum(1 for stage in PROGRESS_STAGES if stage in self.finished_stages)
+            # The legacy profile path reports categorize instead of company_profile
+            if "categorize" in self.finished_stages and "company_profile" not in self.finished_stages:
+                finished += 1
+        return finished / len(PROGRESS_STAGES)
+
+    @property
+    def stage_label(self):
+        if self.status == QUEUED:
+            return "Waiting for a free worker"
+        return STAGE_LABELS.get(self.stage, "Starting")
+
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def streamed_text(self):
+        with self._lock:
+            return dict(self.streamed)
+
+    def _on_delta(self, stage, text):
+        with self._lock:
+            self.streamed[stage] += text
+
+    def _on_stage(self, stage, status):
+        with self._lock:
+            if status == "started":
+                self.stage = stage
+            else:
+                self.finished_stages.append(stage)
+
+
+class JobManager:
+    """
+    Runs memo jobs on an LLMRuntime loop, at most max_running at a time, and
+    keeps the last keep_finished finished jobs as the results store.
+    """
+
+    def __init__(self, runtime, max_running=2, keep_finished=50):
+        self.runtime = runtime
+        self.max_running = max_running
+        self.keep_finished = keep_finished
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._slots = None
+
+    def submit(self, form_data, base_prompt, render_pdf=True, **pipeline_options):
+        """Queue a memo for form_data; returns the job ID immediately"""
+        job = MemoJob(form_data)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        job.future = self.runtime.submit(self._run(job, base_prompt, render_pdf, pipeline_options))
+        return job.id
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None and not job.done and job.future is not None:
+            job.future.cancel()
+
+    def jobs(self):
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda job: job.created_at, reverse=True)
+
+    def _prune(self):
+        finished = sorted((job for job in self._jobs.values() if job.done), key=lambda job: job.created_at)
+        for job in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[job.id]
+
+    async def _run(self, job, base_prompt, render_pdf, pipeline_options):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_running)
+        trace = job.trace
+        try:
+            with telemetry.activate(trace):
+                async with self._slots:
+                    job.status = RUNNING
+                    job.started_at = time.time()
+                    trace.add_span("waiting_for_worker", "queue", 0.0, trace.offset())
+                    result = await run_memo_pipeline(
+                        self.runtime.client, job.form_data, base_prompt,
+                        on_delta=job._on_delta, on_stage=job._on_stage, **pipeline_options
+                    )
+                    job.result = result
+                    error = result["errors"].get("categorize") or result["errors"].get("memo")
+                    if error is not None:
+                        job.error = error
+                        job.status = FAILED
+                        return
+
+                    job.final_memo = memo_export.compose_final_memo(result["initial_memo"], result["vc_analysis"])
+                    if render_pdf:
+                        job._on_stage("pdf", "started")
+                        with trace.span("pdf", "pdf") as pdf_span:
+                            try:
+                                job.pdf_bytes = await asyncio.to_thread(
+                                    memo_export.convert_memo_to_pdf, job.final_memo, job.form_data["company_name"]
+                                )
+                                pdf_span["bytes"] = len(job.pdf_bytes) if job.pdf_bytes else 0
+                            except Exception as e:
+                                job.pdf_error = e
+                                pdf_span["error"] = type(e).__name__
+                        job._on_stage("pdf", "finished")
+                    job.status = DONE
+        except asyncio.CancelledError:
+            job.status = CANCELLED
+            raise
+        except Exception as e:
+            job.error = e
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+            trace.finish(job.status)
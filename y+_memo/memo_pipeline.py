@@ -0,0 +1,564 @@
+"""
+LLM stages of the "Generate Investment Memo" flow.
+
+Every stage is a coroutine that takes an ``openai.AsyncOpenAI`` client, so
+stages that don't depend on each other can be awaited concurrently by
+``run_memo_pipeline``.
+"""
+
+import asyncio
+import json
+import time
+
+import telemetry
+from llm import achat_completion, astream_chat_completion
+from memo_sections import generate_sectioned_memo
+from prompt_template import PromptTemplate, compile_template
+
+# base_prompt.txt placeholder -> company_data key, where the two names differ
+TEMPLATE_ALIASES = {
+    "market_category": "market",
+    "founder_1": "founder_1_name",
+    "bio_1": "founder_1_bio",
+    "founder_2": "founder_2_name",
+    "bio_2": "founder_2_bio",
+    "cash_status": "current_cash",
+    "valuation": "post_money_valuation",
+    "previous_funding": "prev_raised",
+}
+
+
+def parse_json_object(data_text):
+    """Parse the outermost JSON object out of a model response"""
+    start_idx = data_text.find('{')
+    end_idx = data_text.rfind('}') + 1
+    json_str = data_text[start_idx:end_idx]
+    return json.loads(json_str)
+
+
+def format_prompt(data, prompt):
+    """Replace {{key}} placeholders in the prompt template, leaving unknown ones in place"""
+    return compile_template(prompt).render(data, missing=None)
+
+
+def memo_prompt_data(company_data):
+    """company_data plus the template's alternative names for the same fields"""
+    data = dict(company_data)
+    for placeholder, key in TEMPLATE_ALIASES.items():
+        data.setdefault(placeholder, company_data.get(key, ""))
+    return data
+
+
+# Function to extract the market category from the company overview
+async def extract_market_category(client, company_overview, use_cache=True):
+    market_extraction_prompt = f"""
+    Based on this company overview, extract the market category:
+
+    Company Overview: {company_overview}
+
+    Return only the market category (e.g., "Fintech", "Healthtech", "Edtech", "Enterprise SaaS", "Consumer", "Marketplace", "Hardware", etc.) in a single word or short phrase.
+    """
+
+    try:
+        market_response = await achat_completion(
+            client,
+            [{"role": "user", "content": market_extraction_prompt}],
+            route="market_category",
+            use_cache=use_cache
+        )
+        return market_response.strip()
+    except:
+        return "Technology"
+
+
+# Function to intelligently categorize and populate company data
+async def categorize_company_data(client, company_name, company_description, market_category, use_cache=True):
+    categorization_prompt = f"""
+    Based on this company information, intelligently categorize and populate all investment memo fields:
+
+    Company Name: {company_name}
+    Company Description: {company_description}
+    Market Category: {market_category}
+
+    Generate a complete company profile in JSON format with realistic data:
+    - website: A realistic website URL
+    - launch_year: A year between 2020-2024
+    - team_size: A number between 2-50
+    - stage: One of: Pre-seed, Seed, Series A, Series B, Series C (based on description)
+    - one_liner: A compelling one-sentence description
+    - market_size: Realistic market size for this category (e.g., "$10B TAM")
+    - current_cash: Current cash position (e.g., "$500k in cash")
+    - burn_rate: Monthly burn rate (e.g., "$50k/month")
+    - revenue: Current revenue (e.g., "$200k ARR")
+    - prev_raised: Previously raised amount (e.g., "$2M Seed")
+    - round_size: Current round size (e.g., "$5M Series A")
+    - post_money_valuation: Post-money valuation (e.g., "$25M")
+    - use_of_capital: What they need money for (2-3 sentences)
+    - named_competitors: 3-4 realistic competitor names for this market
+    - founder_1_name: First founder name
+    - founder_1_bio: First founder bio (2-3 sentences)
+    - founder_2_name: Second founder name
+    - founder_2_bio: Second founder bio (2-3 sentences)
+    - founder_3_name: Third founder name (optional)
+    - founder_3_bio: Third founder bio (optional)
+    - founder_4_name: Fourth founder name (optional)
+    - founder_4_bio: Fourth founder bio (optional)
+    - misc_notes: Additional context about the company
+    - pros: 3-4 key advantages
+    - cons: 3-4 key risks
+    - best_case: Best case scenario (2-3 sentences)
+    - worst_case: Worst case scenario (2-3 sentences)
+
+    Make it realistic and varied. Base the stage, financials, and team size on the description and market category.
+    Return only valid JSON.
+    """
+
+    data_text = await achat_completion(
+        client,
+        [{"role": "user", "content": categorization_prompt}],
+        route="categorize",
+        use_cache=use_cache
+    )
+
+    try:
+        return parse_json_object(data_text)
+    except:
+        # Fallback data
+        return {
+            "website": f"https://{company_name.lower().replace(' ', '')}.com",
+            "launch_year": "2023",
+            "team_size": "8",
+            "stage": "Series A",
+            "one_liner": f"{company_name} is revolutionizing the {market_category} space.",
+            "market_size": "$10B TAM",
+            "current_cash": "$500k in cash",
+            "burn_rate": "$50k/month",
+            "revenue": "$200k ARR",
+            "prev_raised": "$2M Seed",
+            "round_size": "$5M Series A",
+            "post_money_valuation": "$25M",
+            "use_of_capital": "Expanding team, scaling operations, and developing new features.",
+            "named_competitors": "Competitor A, Competitor B, Competitor C",
+            "founder_1_name": "Founder One",
+            "founder_1_bio": "Experienced entrepreneur with background in the industry.",
+            "founder_2_name": "Founder Two",
+            "founder_2_bio": "Technical expert with deep domain knowledge.",
+            "founder_3_name": "",
+            "founder_3_bio": "",
+            "founder_4_name": "",
+            "founder_4_bio": "",
+            "misc_notes": "Promising early traction in the market.",
+            "pros": "Strong team, good market timing, innovative approach",
+            "cons": "Competitive market, early stage risks, execution challenges",
+            "best_case": "Becomes market leader and achieves significant growth.",
+            "worst_case": "Fails to gain traction and runs out of funding."
+        }
+
+
+# Fields returned by the single-pass structured profile call
+COMPANY_PROFILE_FIELDS = {
+    "market_category": 'Market category in a single word or short phrase (e.g., "Fintech", "Healthtech", "Edtech", "Enterprise SaaS", "Consumer", "Marketplace", "Hardware")',
+    "website": "A realistic website URL",
+    "launch_year": "A year between 2020-2024",
+    "team_size": "A number between 2-50",
+    "stage": "One of: Pre-seed, Seed, Series A, Series B, Series C (based on description)",
+    "one_liner": "A compelling one-sentence description",
+    "market_size": 'Realistic market size for this category (e.g., "$10B TAM")',
+    "current_cash": 'Current cash position (e.g., "$500k in cash")',
+    "burn_rate": 'Monthly burn rate (e.g., "$50k/month")',
+    "revenue": 'Current revenue (e.g., "$200k ARR")',
+    "prev_raised": 'Previously raised amount (e.g., "$2M Seed")',
+    "round_size": 'Current round size (e.g., "$5M Series A")',
+    "post_money_valuation": 'Post-money valuation (e.g., "$25M")',
+    "use_of_capital": "What they need money for (2-3 sentences)",
+    "named_competitors": "3-4 realistic competitor names for this market",
+    "founder_1_name": "First founder name",
+    "founder_1_bio": "First founder bio (2-3 sentences)",
+    "founder_2_name": "Second founder name",
+    "founder_2_bio": "Second founder bio (2-3 sentences)",
+    "founder_3_name": "Third founder name (empty string if none)",
+    "founder_3_bio": "Third founder bio (empty string if none)",
+    "founder_4_name": "Fourth founder name (empty string if none)",
+    "founder_4_bio": "Fourth founder bio (empty string if none)",
+    "misc_notes": "Additional context about the company",
+    "pros": "3-4 key advantages",
+    "cons": "3-4 key risks",
+    "best_case": "Best case scenario (2-3 sentences)",
+    "worst_case": "Worst case scenario (2-3 sentences)",
+}
+
+COMPANY_PROFILE_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "record_company_profile",
+        "description": "Record the market category and complete investment memo profile for a company.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                field: {"type": "string", "description": description}
+                for field, description in COMPANY_PROFILE_FIELDS.items()
+            },
+            "required": list(COMPANY_PROFILE_FIELDS),
+        },
+    },
+}
+
+
+# Function to extract the market category and categorize company data in one structured call
+async def profile_company(client, company_name, company_description, use_cache=True):
+    """
+    Single-pass replacement for extract_market_category + categorize_company_data.
+    Returns (market_category, categorized_data).
+    """
+    profile_prompt = f"""
+    Based on this company information, identify its market category and intelligently populate all investment memo fields:
+
+    Company Name: {company_name}
+    Company Description: {company_description}
+
+    Make it realistic and varied. Base the stage, financials, and team size on the description and market category.
+    Record the result with the record_company_profile function.
+    """
+
+    arguments = await achat_completion(
+        client,
+        [{"role": "user", "content": profile_prompt}],
+        route="company_profile",
+        use_cache=use_cache,
+        tools=[COMPANY_PROFILE_TOOL]
+    )
+
+    categorized_data = json.loads(arguments)
+    market_category = categorized_data.pop("market_category", "").strip() or "Technology"
+    return market_category, categorized_data
+
+
+# Function to build the complete company data dictionary used by the memo prompt
+def build_company_data(form, categorized_data, market_category):
+    return {
+        "company_name": form["company_name"],
+        "website": form.get("website") or categorized_data.get("website", ""),
+        "launch_year": form.get("launch_year") or categorized_data.get("launch_year", ""),
+        "team_size": form.get("team_size") or categorized_data.get("team_size", ""),
+        "stage": form.get("stage") or categorized_data.get("stage", ""),
+        "one_liner": categorized_data.get("one_liner", ""),
+        "company_description": form["company_overview"],
+        "market_size": form.get("market_size") or categorized_data.get("market_size", ""),
+        "tam": form.get("tam") or categorized_data.get("tam", ""),
+        "sam": form.get("sam") or categorized_data.get("sam", ""),
+        "som": form.get("som") or categorized_data.get("som", ""),
+        "current_cash": form.get("current_cash") or categorized_data.get("current_cash", ""),
+        "burn_rate": form.get("burn_rate") or categorized_data.get("burn_rate", ""),
+        "revenue": form.get("revenue") or categorized_data.get("revenue", ""),
+        "prev_raised": form.get("prev_raised") or categorized_data.get("prev_raised", ""),
+        "round_size": form.get("round_size") or categorized_data.get("round_size", ""),
+        "post_money_valuation": form.get("post_money_valuation") or categorized_data.get("post_money_valuation", ""),
+        "use_of_capital": form.get("use_of_capital") or categorized_data.get("use_of_capital", ""),
+        "market": market_category,
+        "named_competitors": categorized_data.get("named_competitors", ""),
+        "founder_1_name": categorized_data.get("founder_1_name", ""),
+        "founder_1_bio": categorized_data.get("founder_1_bio", ""),
+        "founder_2_name": categorized_data.get("founder_2_name", ""),
+        "founder_2_bio": categorized_data.get("founder_2_bio", ""),
+        "founder_3_name": categorized_data.get("founder_3_name", ""),
+        "founder_3_bio": categorized_data.get("founder_3_bio", ""),
+        "founder_4_name": categorized_data.get("founder_4_name", ""),
+        "founder_4_bio": categorized_data.get("founder_4_bio", ""),
+        "misc_notes": form.get("team_background", ""),
+        "pros": categorized_data.get("pros", ""),
+        "cons": categorized_data.get("cons", ""),
+        "best_case": categorized_data.get("best_case", ""),
+        "worst_case": categorized_data.get("worst_case", "")
+    }
+
+
+# Stage 1: Generate initial memo
+async def generate_initial_memo(client, final_prompt, use_cache=True, on_delta=None):
+    if on_delta is not None:
+        return await astream_chat_completion(
+            client,
+            [{"role": "user", "content": final_prompt}],
+            on_delta,
+            route="memo",
+            use_cache=use_cache
+        )
+    return await achat_completion(
+        client,
+        [{"role": "user", "content": final_prompt}],
+        route="memo",
+        use_cache=use_cache
+    )
+
+
+# Stage 2: VC Critical Review
+async def generate_vc_review(client, initial_memo, use_cache=True, on_delta=None):
+    vc_review_prompt = f"""
+    Answer the following question based solely on the provided context. If the context is insufficient, say 'I don't know.' Do not make up facts.
+
+    Now overlook this memo with a critical eye. You are a venture capitalist, and your savings are being invested into this endeavor, you only want to put your money into the best ideas. However, you want to cast a wide net, because if you invest in even one idea that becomes big, you've struck gold.
+
+    Here is the investment memo to review:
+
+    {initial_memo}
+
+    Please provide a comprehensive VC analysis that includes:
+    1. **Investment Thesis**: Why this could be a winning investment
+    2. **Key Strengths**: What makes this company compelling
+    3. **Major Risks**: What could go wrong
+    4. **Market Opportunity**: Assessment of the market size and timing
+    5. **Team Assessment**: Evaluation of the founding team
+    6. **Competitive Analysis**: How they stack up against competitors
+    7. **Financial Health**: Assessment of current financials and runway
+    8. **Investment Recommendation**: Pass, Consider, or Invest with reasoning
+    9. **Due Diligence Items**: What you'd want to investigate further
+    10. **Exit Potential**: Realistic exit scenarios and timelines
+
+    Format this as a professional VC analysis report with clear sections and actionable insights.
+    Base all analysis solely on the information provided in the memo. If any information is missing or unclear, explicitly state what additional information would be needed for a complete assessment.
+    """
+
+    if on_delta is not None:
+        return await astream_chat_completion(
+            client,
+            [{"role": "user", "content": vc_review_prompt}],
+            on_delta,
+            route="vc_review",
+            use_cache=use_cache
+        )
+    return await achat_completion(
+        client,
+        [{"role": "user", "content": vc_review_prompt}],
+        route="vc_review",
+        use_cache=use_cache
+    )
+
+
+# Function to estimate missing TAM/SAM/SOM values with AI
+async def estimate_market_sizes(client, tam, sam, som, company_name, use_cache=True):
+    """
+    Return (tam, sam, som), filling in any missing value with an AI estimate
+    """
+    if tam and sam and som:
+        return tam, sam, som
+
+    estimation_prompt = f"""
+    Estimate realistic market size numbers for this company:
+
+    Company: {company_name}
+    Current TAM: {tam or 'Not provided'}
+    Current SAM: {sam or 'Not provided'}
+    Current SOM: {som or 'Not provided'}
+
+    Return only a JSON object with:
+    - tam: Total Addressable Market (e.g., "$50B")
+    - sam: Serviceable Addressable Market (e.g., "$5B")
+    - som: Serviceable Obtainable Market (e.g., "$500M")
+
+    Make SAM about 10-20% of TAM and SOM about 10-20% of SAM.
+    Return only valid JSON.
+    """
+
+    try:
+        response = await achat_completion(
+            client,
+            [{"role": "user", "content": estimation_prompt}],
+            route="market_size_estimate",
+            use_cache=use_cache
+        )
+
+        estimated_data = parse_json_object(response)
+
+        tam = tam or estimated_data.get('tam', '$50B')
+        sam = sam or estimated_data.get('sam', '$5B')
+        som = som or estimated_data.get('som', '$500M')
+
+    except:
+        # Fallback values
+        tam = tam or '$50B'
+        sam = sam or '$5B'
+        som = som or '$500M'
+
+    return tam, sam, som
+
+
+# Function to analyze market data
+async def analyze_market_data(client, market_category, market_size, revenue, stage, use_cache=True):
+    analysis_prompt = f"""
+    Analyze this startup's market position:
+
+    Market Category: {market_category}
+    Market Size (TAM): {market_size}
+    Current Revenue: {revenue}
+    Stage: {stage}
+
+    Provide analysis in JSON format with:
+    - market_penetration_percentage: Calculate what percentage of TAM they've captured
+    - typical_penetration_range: Typical range for companies at this stage in this market
+    - market_opportunity: Remaining market opportunity
+    - competitive_position: How they compare to typical companies
+    - growth_potential: Assessment of growth potential
+    - market_maturity: Is this market early, growing, or mature
+    - stage_appropriateness: Is their penetration appropriate for their stage
+
+    Return only valid JSON.
+    """
+
+    response = await achat_completion(
+        client,
+        [{"role": "user", "content": analysis_prompt}],
+        route="market_analysis",
+        use_cache=use_cache
+    )
+
+    return parse_json_object(response)
+
+
+async def run_memo_pipeline(client, form, base_prompt, use_cache=True, on_delta=None, structured_profile=True,
+                            sectioned=False, previous_sections=None, parallel_sections=True, on_stage=None):
+    """
+    Run every LLM stage of memo generation, overlapping independent stages.
+
+    Critical path: profile -> memo -> VC review. With structured_profile
+    (the default) the market category and the company profile come from one
+    function-calling request; otherwise the legacy two round trips
+    (market category -> categorization) are made.
+    The TAM/SAM/SOM estimate only needs the form, so it starts immediately;
+    the market analysis starts as soon as its inputs are known (right after
+    the category when the form has market size and revenue).
+
+    Returns a dict of stage outputs; stage failures are reported in
+    result["errors"] keyed by stage name instead of raising. With
+    use_cache=False every stage skips the LLM response cache.
+
+    If on_delta is given, the memo and VC review are streamed and
+    on_delta(stage, text) is called for each chunk, with stage "memo" or
+    "vc_review".
+
+    With sectioned=True the memo is built from per-section requests (see
+    memo_sections.py) and result["memo_sections"] holds the sections; pass
+    it back as previous_sections to regenerate only the sections whose
+    inputs changed. Sections are requested concurrently unless
+    parallel_sections is False.
+
+    result["timings"] maps each stage that ran to its wall time in seconds,
+    plus "total" for the whole pipeline. Stages and their LLM calls are also
+    recorded in the current telemetry run, if one is active.
+    If on_stage is given, on_stage(stage, "started"|"finished") is called
+    around every stage.
+
+    base_prompt is the memo template, as text or a compiled PromptTemplate.
+    Template fields with no data render empty and are listed in
+    result["unfilled_placeholders"].
+    """
+    template = base_prompt if isinstance(base_prompt, PromptTemplate) else compile_template(base_prompt)
+    result = {"errors": {}, "timings": {}}
+    pending = []
+    pipeline_started = time.perf_counter()
+
+    async def timed(stage, coro):
+        started = time.perf_counter()
+        if on_stage is not None:
+            on_stage(stage, "started")
+        try:
+            with telemetry.stage(stage):
+                return await coro
+        finally:
+            result["timings"][stage] = time.perf_counter() - started
+            if on_stage is not None:
+                on_stage(stage, "finished")
+
+    async def market_analysis_stage(market_category, market_size, revenue, stage):
+        try:
+            return await timed("market_analysis", analyze_market_data(
+                client, market_category, market_size, revenue, stage, use_cache=use_cache
+            ))
+        except Exception as e:
+            result["errors"]["market_analysis"] = e
+            return None
+
+    async def market_sizes_stage():
+        return await timed("market_size_estimate", estimate_market_sizes(
+            client, form.get("tam"), form.get("sam"), form.get("som"), form["company_name"], use_cache=use_cache
+        ))
+
+    def start(coro):
+        task = asyncio.ensure_future(coro)
+        pending.append(task)
+        return task
+
+    try:
+        market_sizes_task = start(market_sizes_stage())
+
+        market_analysis_task = None
+        if structured_profile:
+            try:
+                market_category, categorized_data = await timed("company_profile", profile_company(
+                    client, form["company_name"], form["company_overview"], use_cache=use_cache
+                ))
+            except Exception as e:
+                result["errors"]["categorize"] = e
+                return result
+        else:
+            market_category = await timed("market_category", extract_market_category(
+                client, form["company_overview"], use_cache=use_cache
+            ))
+
+            if market_category and form.get("market_size") and form.get("revenue"):
+                market_analysis_task = start(market_analysis_stage(
+                    market_category, form["market_size"], form["revenue"], form.get("stage")
+                ))
+
+            try:
+                categorized_data = await timed("categorize", categorize_company_data(
+                    client, form["company_name"], form["company_overview"], market_category, use_cache=use_cache
+                ))
+            except Exception as e:
+                result["errors"]["categorize"] = e
+                return result
+        result["market_category"] = market_category
+        result["categorized_data"] = categorized_data
+
+        result["final_market_size"] = form.get("market_size") or categorized_data.get("market_size")
+        result["final_revenue"] = form.get("revenue") or categorized_data.get("revenue")
+        result["final_stage"] = form.get("stage") or categorized_data.get("stage")
+
+        if market_analysis_task is None and market_category and result["final_market_size"] and result["final_revenue"]:
+            market_analysis_task = start(market_analysis_stage(
+                market_category, result["final_market_size"], result["final_revenue"], result["final_stage"]
+            ))
+
+        company_data = build_company_data(form, categorized_data, market_category)
+        result["company_data"] = company_data
+        prompt_data = memo_prompt_data(company_data)
+        result["unfilled_placeholders"] = template.unfilled(prompt_data)
+        final_prompt = template.render(prompt_data)
+
+        try:
+            memo_on_delta = (lambda text: on_delta("memo", text)) if on_delta else None
+            if sectioned:
+                initial_memo, result["memo_sections"] = await timed("memo", generate_sectioned_memo(
+                    client, company_data, template.text, previous=previous_sections, use_cache=use_cache,
+                    on_delta=memo_on_delta, parallel=parallel_sections
+                ))
+            else:
+                initial_memo = await timed("memo", generate_initial_memo(
+                    client, final_prompt, use_cache=use_cache, on_delta=memo_on_delta
+                ))
+            vc_analysis = await timed("vc_review", generate_vc_review(
+                client, initial_memo, use_cache=use_cache,
+                on_delta=(lambda text: on_delta("vc_review", text)) if on_delta else None
+            ))
+        except Exception as e:
+            result["errors"]["memo"] = e
+            return result
+        result["initial_memo"] = initial_memo
+        result["vc_analysis"] = vc_analysis
+
+        result["market_sizes"] = await market_sizes_task
+        result["market_analysis"] = await market_analysis_task if market_analysis_task else None
+        return result
+    finally:
+        for task in pending:
+            if not task.done():
+                task.cancel()
+        result["timings"]["total"] = time.perf_counter() - pipeline_started
@@ -0,0 +1,197 @@
+"""
+Investment memo built from independently generated sections.
+
+Each section declares the ``company_data`` fields it is written from. A
+section's fingerprint hashes its prompt inputs, so when an analyst corrects
+one field and regenerates, only the sections that read that field are
+requested again; the others are reused from the previous run (or answered
+by the response cache, which is keyed on the same prompt).
+
+Every section prompt starts with the same static preamble from
+base_prompt.txt, so sections can be requested concurrently (the default):
+wall time is then bounded by the longest section rather than the whole
+document, and the identical prefix is eligible for the API's prompt caching.
+"""
+
+import asyncio
+import hashlib
+import json
+
+from llm import achat_completion, astream_chat_completion
+
+FOUNDER_FIELDS = [
+    "founder_1_name", "founder_1_bio", "founder_2_name", "founder_2_bio",
+    "founder_3_name", "founder_3_bio", "founder_4_name", "founder_4_bio",
+]
+
+# In memo order (mirrors the [OUTPUT FORMAT] of base_prompt.txt)
+MEMO_SECTIONS = [
+    {
+        "name": "business_summary",
+        "title": "Business Summary",
+        "fields": ["company_name", "one_liner", "company_description", "website", "market", "launch_year",
+                   "stage", "round_size", "post_money_valuation", "use_of_capital"],
+        "instructions": "Summarize what the company does and for whom: overview, website, market category, "
+                        "launch year, stage, the round being raised and the planned use of capital.",
+    },
+    {
+        "name": "recommendation",
+        "title": "Investment Recommendation",
+        "fields": ["company_name", "one_liner", "market", "stage", "revenue", "round_size",
+                   "post_money_valuation", "pros", "cons"],
+        "instructions": "Give a decision (Invest / Pass / Further Due Diligence) with three key reasons, and "
+                        "judge whether the company can plausibly reach a $1B+ outcome within 7-10 years.",
+    },
+    {
+        "name": "strategic_framing",
+        "title": "Strategic Framing",
+        "fields": ["company_name", "company_description", "stage", "named_competitors", "pros", "cons",
+                   "best_case", "worst_case"],
+        "instructions": "Write a pre-mortem (end picture, roadmap, key risks) and a pre-parade "
+                        "(de-risk factors) for the investment.",
+    },
+    {
+        "name": "team",
+        "title": "Team",
+        "fields": ["company_name", "team_size", "misc_notes"] + FOUNDER_FIELDS,
+        "instructions": "Evaluate each founder's background and founder-market fit, the team's composition "
+                        "and gaps, and give a personality assessment of each founder from their bio.",
+    },
+    {
+        "name": "market",
+        "title": "Market",
+        "fields": ["company_name", "company_description", "market", "market_size", "tam", "sam", "som",
+                   "named_competitors"],
+        "instructions": "Assess the market size (TAM/SAM/SOM) and how credible it is, market timing, the "
+                        "named competitors and how the company differentiates.",
+    },
+    {
+        "name": "financials",
+        "title": "Financials",
+        "fields": ["company_name", "stage", "revenue", "current_cash", "burn_rate", "prev_raised",
+                   "round_size", "post_money_valuation", "use_of_capital"],
+        "instructions": "Analyze revenue, runway (cash divided by burn), capital efficiency, and how the "
+                        "round size and valuation compare with unicorn benchmarks for this stage.",
+    },
+]
+
+
+def static_preamble(base_prompt):
+    """The part of the memo prompt that does not depend on the company (role and heuristics)"""
+    preamble = base_prompt.split("[INPUT", 1)[0]
+    return preamble.split("{{", 1)[0].strip()
+
+
+def section_inputs(section, company_data):
+    return {field: str(company_data.get(field) or "") for field in section["fields"]}
+
+
+def section_prompt(section, company_data, preamble):
+    inputs = "\n".join(
+        f"- {field}: {value}" for field, value in section_inputs(section, company_data).items() if value
+    )
+    return (
+        f"{preamble}\n\n"
+        f"You are writing only the \"{section['title']}\" section of the memo.\n\n"
+        f"[INPUT: Company Information]\n\n{inputs}\n\n"
+        f"[TASK]\n\n{section['instructions']}\n"
+        f"Start with the heading \"## {section['title']}\" and return only this section in Markdown."
+    )
+
+
+def section_fingerprint(section, company_data, preamble):
+    """Changes whenever the section's prompt would change"""
+    payload = json.dumps([section["name"], section_prompt(section, company_data, preamble)], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def assemble_memo(company_name, sections):
+    """Stitch section texts together in MEMO_SECTIONS order"""
+    parts = [f"# Y+ Ventures Investment Memo – {company_name}"]
+    for section in MEMO_SECTIONS:
+        if section["name"] in sections:
+            parts.append(sections[section["name"]]["text"].strip())
+    return "\n\n".join(parts)
+
+
+async def generate_section(client, section, company_data, preamble, use_cache=True, on_delta=None):
+    messages = [{"role": "user", "content": section_prompt(section, company_data, preamble)}]
+    if on_delta is not None:
+        return await astream_chat_completion(client, messages, on_delta, route="memo_section", use_cache=use_cache)
+    return await achat_completion(client, messages, route="memo_section", use_cache=use_cache)
+
+
+async def generate_sectioned_memo(client, company_data, base_prompt, previous=None, use_cache=True, on_delta=None,
+                                  parallel=True):
+    """
+    Generate the memo section by section.
+
+    previous is the sections dict returned by an earlier call; any section
+    whose fingerprint is unchanged is reused from it without a request.
+    With parallel=True all remaining sections are requested at once; on_delta
+    still receives the text in memo order (the first unfinished section
+    streams live, later ones are held back until it completes).
+    Returns (memo_text, sections) where sections maps each section name to
+    {"title", "fingerprint", "text", "reused"}.
+    """
+    preamble = static_preamble(base_prompt)
+    previous = previous or {}
+    sections = {}
+    if on_delta is not None:
+        on_delta(f"# Y+ Ventures Investment Memo – {company_data.get('company_name', '')}\n\n")
+
+    order = [section["name"] for section in MEMO_SECTIONS]
+    buffered = {name: [] for name in order}
+    finished = set()
+    cursor = [0]
+
+    def flush():
+        # Emit buffered text in memo order, stopping at the first unfinished section
+        while cursor[0] < len(order):
+            name = order[cursor[0]]
+            if buffered[name]:
+                on_delta("".join(buffered[name]))
+                buffered[name].clear()
+            if name not in finished:
+                return
+            on_delta("\n\n")
+            cursor[0] += 1
+
+    def section_delta(name):
+        if on_delta is None:
+            return None
+
+        def emit(text):
+            buffered[name].append(text)
+            flush()
+        return emit
+
+    async def build(section):
+        fingerprint = section_fingerprint(section, company_data, preamble)
+        earlier = previous.get(section["name"])
+        if earlier and earlier.get("fingerprint") == fingerprint:
+            text, reused = earlier["text"], True
+            if on_delta is not None:
+                buffered[section["name"]].append(text)
+        else:
+            text = await generate_section(
+                client, section, company_data, preamble, use_cache=use_cache, on_delta=section_delta(section["name"])
+            )
+            reused = False
+        sections[section["name"]] = {"title": section["title"], "fingerprint": fingerprint, "text": text, "reused": reused}
+        finished.add(section["name"])
+        if on_delta is not None:
+            flush()
+
+    if parallel:
+        tasks = [asyncio.ensure_future(build(section)) for section in MEMO_SECTIONS]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+    else:
+        for section in MEMO_SECTIONS:
+            await build(section)
+    return assemble_memo(company_data.get("company_name", ""), sections), sections
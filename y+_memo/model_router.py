@@ -0,0 +1,79 @@
+"""
+Routing table mapping each LLM call site to a model, temperature and token budget.
+
+Routes are loaded once at startup from a JSON file (model_routes.json by
+default, overridable with LLM_ROUTES_PATH). Routes missing from the file fall
+back to DEFAULT_ROUTES, which reproduce the original all-GPT-4 settings.
+"""
+
+import json
+import os
+import statistics
+import threading
+
+DEFAULT_ROUTES = {
+    "market_category": {"model": "gpt-4", "temperature": 0.3, "max_tokens": 50},
+    "company_profile": {"model": "gpt-4", "temperature": 0.7, "max_tokens": 1500},
+    "categorize": {"model": "gpt-4", "temperature": 0.7, "max_tokens": 1500},
+    "memo": {"model": "gpt-4", "temperature": 0.7, "max_tokens": 2000},
+    "memo_section": {"model": "gpt-4", "temperature": 0.7, "max_tokens": 600},
+    "vc_review": {"model": "gpt-4", "temperature": 0.6, "max_tokens": 2500},
+    "market_size_estimate": {"model": "gpt-4", "temperature": 0.3, "max_tokens": 200},
+    "market_analysis": {"model": "gpt-4", "temperature": 0.3, "max_tokens": 800},
+    "test_company_data": {"model": "gpt-4", "temperature": 0.8, "max_tokens": 800},
+    "document_extraction": {"model": "gpt-4", "temperature": 0.3, "max_tokens": 1500},
+}
+
+
+class ModelRouter:
+    """Resolves route names to request settings and records latency per route"""
+
+    def __init__(self, routes=None):
+        self.routes = {name: dict(settings) for name, settings in DEFAULT_ROUTES.items()}
+        for name, settings in (routes or {}).items():
+            self.routes[name] = {**self.routes.get(name, {}), **settings}
+        self._latencies = {}
+        self._cache_hits = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        """Build a router from a JSON file of {route: {model, temperature, max_tokens}}"""
+        if not path or not os.path.exists(path):
+            return cls()
+        with open(path, "r") as f:
+            config = json.load(f)
+        return cls(config.get("routes", config))
+
+    def resolve(self, route):
+        """Return the {model, temperature, max_tokens} settings for a route"""
+        if route not in self.routes:
+            raise KeyError(f"Unknown LLM route: {route}")
+        return dict(self.routes[route])
+
+    def record(self, route, seconds):
+        route = route or "unrouted"
+        with self._lock:
+            self._latencies.setdefault(route, []).append(seconds)
+
+    def record_cache_hit(self, route):
+        route = route or "unrouted"
+        with self._lock:
+            self._cache_hits[route] = self._cache_hits.get(route, 0) + 1
+
+    def latency_stats(self):
+        """Per-route call count, cache hits and latency summary (seconds)"""
+        with self._lock:
+            latencies = {route: list(values) for route, values in self._latencies.items()}
+            cache_hits = dict(self._cache_hits)
+        stats = {}
+        for route in sorted(set(latencies) | set(cache_hits)):
+            values = latencies.get(route, [])
+            stats[route] = {
+                "model": self.routes.get(route, {}).get("model"),
+                "calls": len(values),
+                "cache_hits": cache_hits.get(route, 0),
+                "mean": statistics.mean(values) if values else None,
+                "max": max(values) if values else None,
+            }
+        return stats
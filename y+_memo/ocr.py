@@ -0,0 +1,457 @@
+"""
+OCR preprocessing and tiled recognition for uploaded images.
+
+Sending a full-resolution phone photo to tesseract as-is is slow (seconds
+per image) and a huge PNG can exhaust memory while decoding. Before OCR an
+image goes through:
+
+    guard      images that would decode to more than OCR_MAX_PIXELS pixels
+               are refused (JPEGs are decoded at reduced size first, so a
+               large photo usually passes)
+    grayscale  EXIF rotation applied, transparency flattened onto white
+    downscale  to OCR_TARGET_DPI when the file states a higher DPI, and to
+               at most OCR_MAX_WIDTH pixels wide (long pages keep their
+               height and are tiled instead)
+    deskew     the rotation (within OCR_DESKEW_MAX_ANGLE degrees) that makes
+               the text rows sharpest, estimated on a thumbnail
+    binarize   global Otsu threshold
+
+Images still taller than OCR_TILE_HEIGHT are cut into horizontal tiles that
+overlap by OCR_TILE_OVERLAP pixels, with cuts moved to the emptiest row
+nearby so text lines stay whole. Tiles are OCR'd in parallel threads (tesseract
+runs without holding the GIL) and lines repeated at the seams are
+dropped when the text is joined.
+
+Recognition backends, chosen once per process (OCR_BACKEND=auto picks the
+first one installed):
+
+    tesserocr    libtesseract in process. Engines are created on first use
+                 and kept loaded, at most OCR_TILE_WORKERS per language and
+                 config, so language data is read once per worker process
+                 rather than once per image
+    pytesseract  runs the tesseract executable for every image (and is used
+                 for OCR_CONFIG options the engine API can't express)
+
+The PIL, tesserocr and pytesseract imports are local so the app runs
+without them.
+
+Settings come from the environment:
+    OCR_BACKEND           auto, tesserocr or pytesseract (default: auto)
+    OCR_PREPROCESS        set to 0 to OCR the image as uploaded (default: 1)
+    OCR_MAX_PIXELS        decoded pixels allowed per image (default: 40000000)
+    OCR_TARGET_DPI        resolution images are reduced to (default: 300)
+    OCR_MAX_WIDTH         width in pixels after downscaling (default: 2500)
+    OCR_BINARIZE          set to 0 to skip thresholding (default: 1)
+    OCR_DESKEW_MAX_ANGLE  largest skew corrected, in degrees; 0 turns deskew off (default: 5)
+    OCR_TILE_HEIGHT       tile height in pixels (default: 1600)
+    OCR_TILE_OVERLAP      pixels shared by neighbouring tiles (default: 32)
+    OCR_TILE_WORKERS      tiles (or scanned PDF pages) OCR'd at once (default: CPU count, at most 4)
+    OMP_THREAD_LIMIT      OpenMP threads per tesseract run. Read when tesseract starts, so it is
+                          a startup setting; the extraction worker processes set it to 1, since
+                          they run several tesseract calls at once (set it yourself with
+                          EXTRACTION_WORKERS=0)
+"""
+
+import atexit
+import concurrent.futures
+import functools
+import io
+import math
+import os
+import queue
+import re
+import shlex
+import threading
+
+BACKENDS = ["tesserocr", "pytesseract"]
+
+
+class ImageTooLarge(ValueError):
+    """The image would decode to more pixels than OCR_MAX_PIXELS allows"""
+
+
+def _flag(name, default):
+    return os.getenv(name, default).lower() not in ("0", "false", "no")
+
+
+def ocr_settings():
+    """Preprocessing and tiling settings; everything here can change the OCR text, so it is part of the cache key"""
+    return {
+        "preprocess": _flag("OCR_PREPROCESS", "1"),
+        "max_pixels": int(float(os.getenv("OCR_MAX_PIXELS", 40_000_000))),
+        "target_dpi": int(os.getenv("OCR_TARGET_DPI", 300)),
+        "max_width": int(os.getenv("OCR_MAX_WIDTH", 2500)),
+        "binarize": _flag("OCR_BINARIZE", "1"),
+        "deskew_max_angle": float(os.getenv("OCR_DESKEW_MAX_ANGLE", 5)),
+        "tile_height": int(os.getenv("OCR_TILE_HEIGHT", 1600)),
+        "tile_overlap": int(os.getenv("OCR_TILE_OVERLAP", 32)),
+    }
+
+
+def tile_workers():
+    workers = os.getenv("OCR_TILE_WORKERS")
+    if workers is not None:
+        return max(int(workers), 1)
+    return min(os.cpu_count() or 1, 4)
+
+
+def _upright_width(image):
+    # EXIF orientations 5-8 are rotated by 90°: the stored height is the width
+    if image.format == "JPEG" and image.getexif().get(0x0112) in (5, 6, 7, 8):
+        return image.height
+    return image.width
+
+
+def _scale(width, dpi, settings):
+    # Downscale factor from the stated DPI and the width (never upscales)
+    scale = 1.0
+    if dpi and dpi[0] and float(dpi[0]) > settings["target_dpi"]:
+        scale = settings["target_dpi"] / float(dpi[0])
+    if width * scale > settings["max_width"]:
+        scale = settings["max_width"] / width
+    return scale
+
+
+def open_image(file_bytes, settings):
+    """
+    Open an image for OCR without decoding more than max_pixels pixels.
+    With preprocessing on, JPEGs are decoded directly at (about) the
+    downscaled size, which is much faster and smaller than decoding in full.
+    """
+    from PIL import Image
+
+    try:
+        image = Image.open(io.BytesIO(file_bytes))
+    except Image.DecompressionBombError as e:
+        raise ImageTooLarge(str(e)) from e
+
+    if settings["preprocess"] and image.format == "JPEG":
+        scale = _scale(_upright_width(image), image.info.get("dpi"), settings)
+        if scale < 1:
+            full_width = image.width
+            image.draft("L", (math.ceil(image.width * scale), math.ceil(image.height * scale)))
+            if image.info.get("dpi"):
+                # Decoded at 1/2, 1/4 or 1/8 size: the pixels are that much coarser
+                image.info["dpi"] = tuple(value * image.width / full_width for value in image.info["dpi"])
+
+    width, height = image.size
+    if width * height > settings["max_pixels"]:
+        raise ImageTooLarge(
+            f"Image is too large to OCR ({width}×{height} pixels, more than OCR_MAX_PIXELS={settings['max_pixels']})"
+        )
+    return image
+
+
+def _grayscale(image):
+    from PIL import Image, ImageOps
+
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info):
+        # Transparent areas would otherwise turn black
+        rgba = image.convert("RGBA")
+        background = Image.new("RGBA", rgba.size, "white")
+        image = Image.alpha_composite(background, rgba)
+    return image.convert("L")
+
+
+def otsu_threshold(histogram):
+    """Otsu's threshold for a 256-bin grayscale histogram: pixels above it are background"""
+    total = sum(histogram)
+    weighted_total = sum(value * count for value, count in enumerate(histogram))
+    best, threshold = -1.0, 127
+    weight, weighted = 0, 0
+    for value, count in enumerate(histogram):
+        weight += count
+        if weight == 0:
+            continue
+        if weight == total:
+            break
+        weighted += value * count
+        dark_mean = weighted / weight
+        light_mean = (weighted_total - weighted) / (total - weight)
+        between = weight * (total - weight) * (dark_mean - light_mean) ** 2
+        if between > best:
+            best, threshold = between, value
+    return threshold
+
+
+def _binarize(image, threshold):
+    return image.point(lambda value: 255 if value > threshold else 0)
+
+
+def row_ink(image):
+    """Mean darkness (0-255) of every pixel row of a grayscale image"""
+    from PIL import Image
+
+    column = image.resize((1, image.height), Image.BOX)
+    return [255 - value for value in column.getdata()]
+
+
+def _sharpness(thumbnail, angle):
+    from PIL import Image
+
+    rotated = thumbnail.rotate(angle, resample=Image.NEAREST, fillcolor=255)
+    ink = row_ink(rotated)
+    mean = sum(ink) / len(ink)
+    # Rows that are all text or all gap (rather than a blur of both) when aligned
+    return sum((value - mean) ** 2 for value in ink)
+
+
+def estimate_skew(image, max_angle, step=0.25):
+    """
+    Angle in degrees (counter-clockwise, as for Image.rotate) that levels
+    the text lines, found by maximizing the variance of the row profile on
+    a binarized thumbnail: coarse 1° steps, then step-sized refinement.
+    """
+    thumbnail = image.copy()
+    thumbnail.thumbnail((800, 800))
+    thumbnail = _binarize(thumbnail, otsu_threshold(thumbnail.histogram()))
+
+    def score(angle):
+        # Ties (e.g. a blank page) go to the smallest rotation
+        return _sharpness(thumbnail, angle), -abs(angle)
+
+    coarse = [float(angle) for angle in range(-math.floor(max_angle), math.floor(max_angle) + 1)] or [0.0]
+    best = max(coarse, key=score)
+    fine = [best + step * i for i in range(-3, 4) if abs(best + step * i) <= max_angle]
+    return max(fine, key=score)
+
+
+def preprocess_image(image, settings):
+    """Grayscale, downscale, deskew and binarize an opened image (see the module docstring)"""
+    from PIL import Image
+
+    dpi = image.info.get("dpi")
+    image = _grayscale(image)
+    scale = _scale(image.width, dpi, settings)
+    if scale < 1:
+        # JPEGs may already be drafted close to this size
+        size = (max(round(image.width * scale), 1), max(round(image.height * scale), 1))
+        if size[0] < image.width:
+            image = image.resize(size, Image.LANCZOS, reducing_gap=3.0)
+
+    if settings["deskew_max_angle"] > 0:
+        angle = estimate_skew(image, settings["deskew_max_angle"])
+        if abs(angle) >= 0.2:
+            image = image.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+
+    if settings["binarize"]:
+        image = _binarize(image, otsu_threshold(image.histogram()))
+    return image
+
+
+def tile_bounds(image, tile_height, overlap):
+    """(top, bottom) pixel rows of the tiles; one tile when the image is not taller than tile_height"""
+    if image.height <= tile_height or tile_height <= 0:
+        return [(0, image.height)]
+    ink = row_ink(image)
+    window = max(tile_height // 8, 1)
+    cuts, position = [0], 0
+    while image.height - position > tile_height:
+        nominal = position + tile_height
+        low, high = max(nominal - window, position + 1), min(nominal + window, image.height - 1)
+        # Cut where there is least ink, preferring the row nearest the nominal cut
+        cut = min(range(low, high + 1), key=lambda row: (ink[row], abs(row - nominal)))
+        cuts.append(cut)
+        position = cut
+    cuts.append(image.height)
+    return [(max(top - overlap, 0), min(bottom + overlap, image.height)) for top, bottom in zip(cuts, cuts[1:])]
+
+
+def _normalized_line(line):
+    return re.sub(r"\s+", " ", line).strip().casefold()
+
+
+def merge_tile_text(texts):
+    """Join tile texts top to bottom, dropping lines a tile repeats from the end of the previous one"""
+    lines = []
+    for text in texts:
+        new = text.strip().splitlines()
+        previous = [_normalized_line(line) for line in lines if line.strip()]
+        current = [_normalized_line(line) for line in new]
+        for size in range(min(len(previous), len(current), 3), 0, -1):
+            if previous[-size:] == current[:size]:
+                new = new[size:]
+                break
+        lines.extend(new)
+    return "\n".join(lines).strip()
+
+
+def _installed(backend):
+    try:
+        __import__(backend)
+        return True
+    except ImportError:
+        return False
+
+
+@functools.lru_cache(maxsize=1)
+def ocr_backend():
+    """The recognition backend this process uses, or None if none is installed"""
+    requested = os.getenv("OCR_BACKEND", "auto").lower()
+    if requested != "auto":
+        if requested not in BACKENDS:
+            raise ValueError(f"Unknown OCR_BACKEND {requested!r}; use auto, {' or '.join(BACKENDS)}")
+        return requested if _installed(requested) else None
+    return next((backend for backend in BACKENDS if _installed(backend)), None)
+
+
+@functools.lru_cache(maxsize=1)
+def engine_version():
+    """Backend and tesseract version, e.g. "tesserocr 5.3.0" (part of the OCR cache key)"""
+    backend = ocr_backend()
+    if backend == "tesserocr":
+        import tesserocr
+        # "tesseract 5.3.0\n leptonica-1.82.0\n ..."
+        return "tesserocr " + tesserocr.tesseract_version().split()[1]
+    import pytesseract
+    return f"pytesseract {pytesseract.get_tesseract_version()}"
+
+
+def engine_options(config):
+    """
+    OCR_CONFIG as tesserocr engine options: {"psm", "oem", "variables"}, or
+    None when it has options only the tesseract command line understands.
+    """
+    options = {"psm": None, "oem": None, "variables": {}}
+    tokens = shlex.split(config)
+    while tokens:
+        token = tokens.pop(0)
+        if token in ("--psm", "--oem") and tokens and tokens[0].isdigit():
+            options[token[2:]] = int(tokens.pop(0))
+        elif token == "-c" and tokens and "=" in tokens[0]:
+            name, value = tokens.pop(0).split("=", 1)
+            options["variables"][name] = value
+        else:
+            return None
+    return options
+
+
+class EnginePool:
+    """
+    Warm tesserocr engines for one language and config. An engine handles
+    one image at a time; up to size engines are created as threads need them
+    and then reused for the life of the process.
+    """
+
+    def __init__(self, lang, options, size):
+        self.lang = lang
+        self.options = options
+        self.size = size
+        self.created = 0
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+
+    def _create(self):
+        import tesserocr
+
+        kwargs = {"lang": self.lang}
+        if self.options["psm"] is not None:
+            kwargs["psm"] = self.options["psm"]
+        if self.options["oem"] is not None:
+            kwargs["oem"] = self.options["oem"]
+        engine = tesserocr.PyTessBaseAPI(**kwargs)
+        for name, value in self.options["variables"].items():
+            if not engine.SetVariable(name, value):
+                engine.End()
+                raise ValueError(f"Unknown tesseract variable in OCR_CONFIG: {name}")
+        return engine
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self.created < self.size
+            if create:
+                self.created += 1
+        if not create:
+            return self._idle.get()
+        try:
+            return self._create()
+        except Exception:
+            with self._lock:
+                self.created -= 1
+            raise
+
+    def recognize(self, image):
+        engine = self._acquire()
+        try:
+            engine.SetImage(image)
+            return engine.GetUTF8Text()
+        finally:
+            engine.Clear()
+            self._idle.put(engine)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().End()
+            except queue.Empty:
+                return
+
+
+_engine_pools = {}
+_engine_pools_lock = threading.Lock()
+
+
+def engine_pool(lang, config):
+    """This process's tesserocr engines for lang and config, or None if the config needs the executable"""
+    options = engine_options(config)
+    if options is None:
+        return None
+    with _engine_pools_lock:
+        pool = _engine_pools.get((lang, config))
+        if pool is None:
+            pool = _engine_pools[(lang, config)] = EnginePool(lang, options, tile_workers())
+        return pool
+
+
+@atexit.register
+def _close_engines():
+    with _engine_pools_lock:
+        for pool in _engine_pools.values():
+            pool.close()
+        _engine_pools.clear()
+
+
+def _recognize(image, lang, config):
+    backend = ocr_backend()
+    if backend is None:
+        raise RuntimeError("No OCR backend installed (pip install tesserocr, or pytesseract plus tesseract)")
+    if backend == "tesserocr":
+        pool = engine_pool(lang, config)
+        if pool is not None:
+            return pool.recognize(image)
+        if not _installed("pytesseract"):
+            raise ValueError(f"OCR_CONFIG {config!r} is not supported by tesserocr; install pytesseract to use it")
+    import pytesseract
+    return pytesseract.image_to_string(image, lang=lang, config=config)
+
+
+def recognize(image, lang, config, settings):
+    """OCR a preprocessed image, tile by tile in parallel when it is taller than tile_height"""
+    bounds = tile_bounds(image, settings["tile_height"], settings["tile_overlap"])
+    if len(bounds) == 1:
+        return _recognize(image, lang, config).strip()
+
+    tiles = [image.crop((0, top, image.width, bottom)) for top, bottom in bounds]
+    workers = min(tile_workers(), len(tiles))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        texts = list(pool.map(lambda tile: _recognize(tile, lang, config), tiles))
+    return merge_tile_text(texts)
+
+
+def ocr_pil_image(image, lang="eng", config="", settings=None):
+    """Text of an opened image (e.g. a rendered PDF page): preprocess, then OCR tiled as needed"""
+    settings = settings or ocr_settings()
+    if not settings["preprocess"]:
+        return _recognize(image, lang, config).strip()
+    return recognize(preprocess_image(image, settings), lang, config, settings)
+
+
+def ocr_image(file_bytes, lang="eng", config="", settings=None):
+    """Text of an image file: open (with the size guard), preprocess, then OCR tiled as needed"""
+    settings = settings or ocr_settings()
+    return ocr_pil_image(open_image(file_bytes, settings), lang, config, settings)
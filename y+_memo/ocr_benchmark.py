@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Time vs. accuracy benchmark for image OCR.
+
+Builds three variants of every create_test_images.py fixture and OCRs
+each with and without the preprocessing in ocr.py:
+
+    screenshot  the fixture as is (600×400 PNG)
+    photo       scaled to 4000 px wide, rotated 2.5° and saved as a 72 dpi
+                JPEG, like a phone photo of a slide
+    tall        the fixture at 2× stacked eight times (a long scan), which
+                is OCR'd in tiles
+
+Accuracy is the word-level similarity (0-1) between the OCR text and the
+text the fixture was drawn from. The OCR cache is not involved.
+
+Usage:
+    python ocr_benchmark.py --runs 3
+    python ocr_benchmark.py --variant photo --json ocr_baseline.json
+    python ocr_benchmark.py --backend pytesseract   # compare with the default tesserocr
+
+Without tesseract installed only the preprocessing is timed.
+"""
+
+import argparse
+import difflib
+import io
+import json
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+from PIL import Image
+
+import create_test_images
+import ocr
+
+VARIANTS = ["screenshot", "photo", "tall"]
+
+TALL_REPEATS = 8
+
+
+def fixture_images():
+    """[(name, PNG bytes, text)], drawing any fixture missing from this directory"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    fixtures = []
+    with tempfile.TemporaryDirectory() as scratch:
+        for filename, text, bg_color in create_test_images.TEST_IMAGES:
+            path = os.path.join(here, filename)
+            if not os.path.exists(path):
+                path = os.path.join(scratch, filename)
+                create_test_images.create_test_image(text, path, bg_color=bg_color)
+            with open(path, "rb") as f:
+                fixtures.append((os.path.splitext(filename)[0], f.read(), text))
+    return fixtures
+
+
+def _encode(image, **save_args):
+    buffer = io.BytesIO()
+    image.save(buffer, **save_args)
+    return buffer.getvalue()
+
+
+def make_variant(png_bytes, text, variant):
+    """(image bytes, expected text) of one benchmark variant of a fixture"""
+    if variant == "screenshot":
+        return png_bytes, text
+    image = Image.open(io.BytesIO(png_bytes)).convert("RGB")
+    if variant == "photo":
+        scale = 4000 / image.width
+        image = image.resize((4000, round(image.height * scale)), Image.BICUBIC)
+        image = image.rotate(2.5, resample=Image.BICUBIC, expand=True, fillcolor="white")
+        return _encode(image, format="JPEG", quality=85, dpi=(72, 72)), text
+    if variant == "tall":
+        image = image.resize((image.width * 2, image.height * 2), Image.BICUBIC)
+        tall = Image.new("RGB", (image.width, image.height * TALL_REPEATS), "white")
+        for i in range(TALL_REPEATS):
+            tall.paste(image, (0, i * image.height))
+        return _encode(tall, format="PNG"), "\n".join([text] * TALL_REPEATS)
+    raise ValueError(f"Unknown variant: {variant}")
+
+
+def word_accuracy(expected, actual):
+    """Similarity of the two texts' word sequences, ignoring case and punctuation"""
+    def words(text):
+        return re.findall(r"[a-z0-9$.%/+-]+", text.lower())
+    return difflib.SequenceMatcher(None, words(expected), words(actual), autojunk=False).ratio()
+
+
+def tesseract_available():
+    try:
+        return ocr.ocr_backend() is not None and bool(ocr.engine_version())
+    except Exception:
+        return False
+
+
+def configurations():
+    """(label, settings) pairs compared on every variant"""
+    settings = ocr.ocr_settings()
+    return [
+        ("as uploaded", dict(settings, preprocess=False)),
+        ("preprocessed", dict(settings, preprocess=True)),
+        ("preprocessed, no tiles", dict(settings, preprocess=True, tile_height=0)),
+    ]
+
+
+def measure(image_bytes, expected, settings, runs, with_ocr, lang):
+    """Median seconds for preprocessing and for the whole OCR, accuracy of the last run, output size"""
+    preprocess_times, total_times, accuracy = [], [], None
+    for _ in range(runs):
+        started = time.perf_counter()
+        image = ocr.open_image(image_bytes, settings)
+        if settings["preprocess"]:
+            image = ocr.preprocess_image(image, settings)
+        else:
+            image.load()
+        preprocess_times.append(time.perf_counter() - started)
+        size = image.size
+        if with_ocr:
+            started = time.perf_counter()
+            text = ocr.ocr_image(image_bytes, lang=lang, settings=settings)
+            total_times.append(time.perf_counter() - started)
+            accuracy = word_accuracy(expected, text)
+    return {
+        "preprocess_s": statistics.median(preprocess_times),
+        "ocr_s": statistics.median(total_times) if total_times else None,
+        "accuracy": accuracy,
+        "size": list(size),
+        "tiles": len(ocr.tile_bounds(image, settings["tile_height"], settings["tile_overlap"]))
+        if settings["preprocess"] else 1,
+    }
+
+
+def print_report(results, with_ocr):
+    if with_ocr:
+        print(f"\nOCR backend: {ocr.engine_version()}")
+    print(f"\n{'image':<26}{'variant':<12}{'configuration':<24}{'pixels':>12}{'tiles':>6}"
+          f"{'prep':>9}{'ocr':>9}{'accuracy':>10}")
+    for row in results:
+        ocr_time = f"{row['ocr_s'] * 1000:>7.0f}ms" if row["ocr_s"] is not None else f"{'-':>9}"
+        accuracy = f"{row['accuracy']:>10.3f}" if row["accuracy"] is not None else f"{'-':>10}"
+        print(f"{row['image']:<26}{row['variant']:<12}{row['configuration']:<24}"
+              f"{row['size'][0]:>6}×{row['size'][1]:<5}{row['tiles']:>6}"
+              f"{row['preprocess_s'] * 1000:>7.0f}ms{ocr_time}{accuracy}")
+    if not with_ocr:
+        print("\nno OCR backend found: only preprocessing was timed (see image_setup.md)", file=sys.stderr)
+        return
+    print()
+    for label in dict.fromkeys(row["configuration"] for row in results):
+        rows = [row for row in results if row["configuration"] == label]
+        print(f"{label:<24} total OCR {sum(row['ocr_s'] for row in rows):.2f}s, "
+              f"mean accuracy {statistics.mean(row['accuracy'] for row in rows):.3f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark OCR time and accuracy on the test image fixtures.")
+    parser.add_argument("--runs", type=int, default=3, help="runs per image and configuration (default: 3)")
+    parser.add_argument("--variant", action="append", choices=VARIANTS, help="only these variants (repeatable)")
+    parser.add_argument("--backend", choices=["auto"] + ocr.BACKENDS, help="OCR backend (default: OCR_BACKEND or auto)")
+    parser.add_argument("--lang", default=os.getenv("OCR_LANG", "eng"), help="tesseract language (default: eng)")
+    parser.add_argument("--json", help="also write the results as JSON to this path")
+    args = parser.parse_args(argv)
+    if args.runs < 1:
+        parser.error("--runs must be at least 1")
+
+    if args.backend:
+        os.environ["OCR_BACKEND"] = args.backend
+    with_ocr = tesseract_available()
+    results = []
+    for name, png_bytes, text in fixture_images():
+        for variant in args.variant or VARIANTS:
+            image_bytes, expected = make_variant(png_bytes, text, variant)
+            for label, settings in configurations():
+                row = measure(image_bytes, expected, settings, args.runs, with_ocr, args.lang)
+                results.append({"image": name, "variant": variant, "configuration": label, **row})
+
+    print_report(results, with_ocr)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "tesseract": with_ocr, "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
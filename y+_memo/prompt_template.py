@@ -0,0 +1,84 @@
+"""
+Compiled {{placeholder}} prompt templates.
+
+A template is parsed once into literal text and placeholder names, so
+rendering is a single join instead of one str.replace pass per key.
+``load_template`` keeps one compiled template per file for the life of the
+process and only re-reads the file when its mtime changes.
+
+Placeholders come in two kinds:
+    {{company_name}}          an input field, filled from the data dict
+    {{founder summary}}       a phrase, i.e. an instruction for the model to
+                              fill in; always left in the prompt verbatim
+An input field with no key in the data is "unfilled". By default it renders
+as an empty string rather than reaching the model as literal braces;
+``unfilled`` lists them so missing data can be reported.
+"""
+
+import functools
+import os
+import re
+import threading
+
+PLACEHOLDER = re.compile(r"\{\{\s*([^{}]+?)\s*\}\}")
+FIELD_NAME = re.compile(r"^\w+$")
+
+
+class PromptTemplate:
+    """A prompt parsed into alternating literal text and placeholders"""
+
+    def __init__(self, text):
+        self.text = text
+        self._literals = []
+        self._slots = []
+        position = 0
+        for match in PLACEHOLDER.finditer(text):
+            self._literals.append(text[position:match.start()])
+            self._slots.append((match.group(1), match.group(0)))
+            position = match.end()
+        self._literals.append(text[position:])
+        self.fields = list(dict.fromkeys(name for name, _ in self._slots if FIELD_NAME.match(name)))
+
+    def unfilled(self, data):
+        """Input fields of the template that have no key in data, in template order"""
+        return [name for name in self.fields if name not in data]
+
+    def render(self, data, missing=""):
+        """
+        Fill every input field from data in one pass. Fields missing from
+        data render as missing (pass None to leave them as {{name}}).
+        """
+        parts = [self._literals[0]]
+        for (name, raw), literal in zip(self._slots, self._literals[1:]):
+            if name in data:
+                parts.append(str(data[name]))
+            elif missing is None or not FIELD_NAME.match(name):
+                parts.append(raw)
+            else:
+                parts.append(missing)
+            parts.append(literal)
+        return "".join(parts)
+
+
+@functools.lru_cache(maxsize=16)
+def compile_template(text):
+    """Compiled template for a prompt string (memoized on the text)"""
+    return PromptTemplate(text)
+
+
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+
+def load_template(path):
+    """Compiled template for a file, re-read only when the file's mtime changes"""
+    mtime = os.stat(path).st_mtime_ns
+    with _loaded_lock:
+        cached = _loaded.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+    with open(path, "r") as f:
+        template = PromptTemplate(f.read())
+    with _loaded_lock:
+        _loaded[path] = (mtime, template)
+    return template
@@ -0,0 +1,415 @@
+"""
+Latency, token and cost telemetry for memo runs.
+
+A ``RunTrace`` collects the spans of one run (a memo job, a document
+extraction, a batch company): every pipeline stage, every LLM request with
+its queue time, prompt/completion tokens and estimated cost, every file
+extractor and the PDF render. The active trace is held in a context
+variable, so code deep in the call stack (llm.py, the extractors) records
+into it without the trace being passed around; asyncio tasks and
+``LLMRuntime.run`` / ``submit`` inherit it from the code that started them.
+
+When a run finishes it is appended to a rotating JSONL log and the
+process-wide counters are rewritten as a Prometheus text file (for the
+node_exporter textfile collector); set TELEMETRY_METRICS_PORT to also
+serve them over HTTP at /metrics.
+
+Settings come from the environment:
+    TELEMETRY_DIR           directory for runs.jsonl and metrics.prom (default: .telemetry)
+    TELEMETRY_MAX_MB        size at which runs.jsonl is rotated (default: 10)
+    TELEMETRY_BACKUPS       rotated run logs kept (default: 5)
+    TELEMETRY_DISABLED      set to 1 to stop writing files (traces are still collected)
+    TELEMETRY_METRICS_PORT  serve /metrics on this port (default: off)
+    TELEMETRY_METRICS_HOST  interface for /metrics (default: 127.0.0.1)
+
+Costs are estimates from MODEL_PRICES (USD per million tokens); models not
+in the table are reported with no cost. Streamed responses that carry no
+usage are counted at ~4 characters per token and flagged "estimated".
+"""
+
+import contextlib
+import contextvars
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# USD per million (prompt, completion) tokens; the longest matching prefix wins
+MODEL_PRICES = {
+    "gpt-4": (30.00, 60.00),
+    "gpt-4-32k": (60.00, 120.00),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-3.5-turbo": (0.50, 1.50),
+}
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+METRIC_HELP = {
+    "ymemo_runs_total": ("counter", "Finished runs by kind and status"),
+    "ymemo_run_seconds": ("histogram", "Wall time of finished runs"),
+    "ymemo_span_seconds": ("histogram", "Wall time of stages, extractors and PDF renders"),
+    "ymemo_llm_requests_total": ("counter", "LLM requests, including cache hits"),
+    "ymemo_llm_seconds_total": ("counter", "Wall time spent in LLM requests, including queueing"),
+    "ymemo_llm_queue_seconds_total": ("counter", "Time LLM requests waited in the rate-limit scheduler"),
+    "ymemo_llm_tokens_total": ("counter", "Prompt and completion tokens"),
+    "ymemo_llm_cost_usd_total": ("counter", "Estimated LLM spend in US dollars"),
+}
+
+_current_run = contextvars.ContextVar("telemetry_run", default=None)
+_current_stage = contextvars.ContextVar("telemetry_stage", default=None)
+
+
+def model_price(model):
+    """(prompt, completion) USD per million tokens for a model, or None"""
+    matches = [name for name in MODEL_PRICES if model == name or (model or "").startswith(name + "-")]
+    if not matches:
+        return None
+    return MODEL_PRICES[max(matches, key=len)]
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    price = model_price(model)
+    if price is None:
+        return None
+    return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+
+
+class Metrics:
+    """Process-wide Prometheus counters and histograms"""
+
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, labels, value=1.0):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name, labels, seconds):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.setdefault(key, [[0] * len(LATENCY_BUCKETS), 0.0, 0])
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    histogram[0][i] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (list(buckets), total, count) for key, (buckets, total, count) in self._histograms.items()}
+
+        lines = []
+        for name, (metric_type, help_text) in METRIC_HELP.items():
+            if metric_type == "counter":
+                series = sorted((labels, value) for (metric, labels), value in counters.items() if metric == name)
+            else:
+                series = sorted((labels, value) for (metric, labels), value in histograms.items() if metric == name)
+            if not series:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in series:
+                if metric_type == "counter":
+                    lines.append(f"{name}{_labels(labels)} {value:g}")
+                    continue
+                buckets, total, count = value
+                for bound, bucket_count in zip(LATENCY_BUCKETS, buckets):
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', f'{bound:g}'),))} {bucket_count}")
+                lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {count}")
+                lines.append(f"{name}_sum{_labels(labels)} {total:g}")
+                lines.append(f"{name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels) + "}"
+
+
+metrics = Metrics()
+
+
+class RunTrace:
+    """Spans of one run; offsets are seconds since the trace was created"""
+
+    def __init__(self, kind, **attributes):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.attributes = attributes
+        self.started_at = time.time()
+        self.finished_at = None
+        self.status = None
+        self.spans = []
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def offset(self):
+        return time.perf_counter() - self._started
+
+    @property
+    def wall(self):
+        return (self.finished_at or time.time()) - self.started_at
+
+    def add_span(self, name, kind, start, wall, **fields):
+        span = {"name": name, "kind": kind, "start": round(start, 4), "wall": round(wall, 4), **fields}
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    @contextlib.contextmanager
+    def span(self, name, kind="stage", **fields):
+        """Time the block as a span; fields may be added to the yielded dict"""
+        start = self.offset()
+        try:
+            yield fields
+        except BaseException as e:
+            fields["error"] = type(e).__name__
+            raise
+        finally:
+            wall = self.offset() - start
+            self.add_span(name, kind, start, wall, **fields)
+            metrics.observe("ymemo_span_seconds", {"run": self.kind, "kind": kind, "name": name}, wall)
+
+    def totals(self):
+        with self._lock:
+            calls = [span for span in self.spans if span["kind"] == "llm"]
+        costs = [span["cost_usd"] for span in calls if span.get("cost_usd") is not None]
+        return {
+            "wall": round(self.wall, 4),
+            "llm_calls": len(calls),
+            "cache_hits": sum(1 for span in calls if span.get("cached")),
+            "queue": round(sum(span.get("queue", 0.0) for span in calls), 4),
+            "prompt_tokens": sum(span.get("prompt_tokens", 0) for span in calls),
+            "completion_tokens": sum(span.get("completion_tokens", 0) for span in calls),
+            "cost_usd": round(sum(costs), 6) if costs else None,
+        }
+
+    def stages(self):
+        """Per-stage wall time plus the queue time, tokens and cost of the LLM calls made in it"""
+        with self._lock:
+            spans = list(self.spans)
+        stages = {}
+        for span in spans:
+            if span["kind"] == "llm":
+                stage = stages.setdefault(span["stage"], {"wall": 0.0, "queue": 0.0, "llm_calls": 0,
+                                                          "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0})
+                stage["queue"] += span.get("queue", 0.0)
+                stage["llm_calls"] += 1
+                stage["prompt_tokens"] += span.get("prompt_tokens", 0)
+                stage["completion_tokens"] += span.get("completion_tokens", 0)
+                stage["cost_usd"] += span.get("cost_usd") or 0.0
+            else:
+                stage = stages.setdefault(span["name"], {"wall": 0.0, "queue": 0.0, "llm_calls": 0,
+                                                         "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0})
+                stage["wall"] += span["wall"]
+        for name, stage in stages.items():
+            # A bare LLM call outside any stage span is its own stage
+            if not stage["wall"]:
+                stage["wall"] = sum(span["wall"] for span in spans if span["kind"] == "llm" and span["stage"] == name)
+            stages[name] = {key: round(value, 6) if isinstance(value, float) else value for key, value in stage.items()}
+        return stages
+
+    def to_record(self):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span["start"])
+        return {
+            "run_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "started_at": datetime.datetime.fromtimestamp(self.started_at, datetime.timezone.utc).isoformat(),
+            **self.attributes,
+            "totals": self.totals(),
+            "stages": self.stages(),
+            "spans": spans,
+        }
+
+    def finish(self, status="ok"):
+        """Close the run, log it and refresh the metrics file; later calls are ignored"""
+        with self._lock:
+            if self.finished_at is not None:
+                return
+            self.finished_at = time.time()
+            self.status = status
+        metrics.inc("ymemo_runs_total", {"kind": self.kind, "status": status})
+        metrics.observe("ymemo_run_seconds", {"kind": self.kind}, self.wall)
+        _write_run(self.to_record())
+
+
+@contextlib.contextmanager
+def activate(trace):
+    """Make trace the current run for the block (and for tasks started in it)"""
+    token = _current_run.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_run.reset(token)
+
+
+def current_run():
+    return _current_run.get()
+
+
+@contextlib.contextmanager
+def span(name, kind="stage", **fields):
+    """Time the block as a span of the current run (only counted in metrics if there is none)"""
+    trace = _current_run.get()
+    if trace is not None:
+        with trace.span(name, kind, **fields) as span_fields:
+            yield span_fields
+        return
+    started = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        metrics.observe("ymemo_span_seconds", {"run": "none", "kind": kind, "name": name}, time.perf_counter() - started)
+
+
+def record_span(name, kind, wall, **fields):
+    """Record a span that just ended after wall seconds (e.g. work timed in another process)"""
+    trace = _current_run.get()
+    metrics.observe("ymemo_span_seconds", {"run": trace.kind if trace else "none", "kind": kind, "name": name}, wall)
+    if trace is not None:
+        trace.add_span(name, kind, trace.offset() - wall, wall, **fields)
+
+
+@contextlib.contextmanager
+def stage(name):
+    """A pipeline stage: a span that LLM calls made inside it are attributed to"""
+    token = _current_stage.set(name)
+    try:
+        with span(name, "stage"):
+            yield
+    finally:
+        _current_stage.reset(token)
+
+
+def record_llm_call(route, model, wall, queue=0.0, prompt_tokens=0, completion_tokens=0, cached=False,
+                    estimated=False, error=None):
+    """Record one chat completion (or cache hit) in the current run and the process metrics"""
+    stage_name = _current_stage.get() or route or "unrouted"
+    cost = estimate_cost(model, prompt_tokens, completion_tokens)
+    labels = {"stage": stage_name, "model": model}
+    metrics.inc("ymemo_llm_requests_total", {**labels, "cached": str(bool(cached)).lower()})
+    metrics.inc("ymemo_llm_seconds_total", labels, wall)
+    metrics.inc("ymemo_llm_queue_seconds_total", labels, queue)
+    metrics.inc("ymemo_llm_tokens_total", {**labels, "type": "prompt"}, prompt_tokens)
+    metrics.inc("ymemo_llm_tokens_total", {**labels, "type": "completion"}, completion_tokens)
+    if cost is not None:
+        metrics.inc("ymemo_llm_cost_usd_total", labels, cost)
+
+    trace = _current_run.get()
+    if trace is None:
+        return
+    fields = {"stage": stage_name, "route": route, "model": model, "queue": round(queue, 4),
+              "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+              "cost_usd": round(cost, 6) if cost is not None else None, "cached": cached}
+    if estimated:
+        fields["estimated"] = True
+    if error is not None:
+        fields["error"] = type(error).__name__
+    trace.add_span(route or "unrouted", "llm", trace.offset() - wall, wall, **fields)
+
+
+# Output files --------------------------------------------------------------
+
+_log = None
+_log_lock = threading.Lock()
+
+
+def _telemetry_dir():
+    return os.getenv("TELEMETRY_DIR", ".telemetry")
+
+
+def _enabled():
+    return os.getenv("TELEMETRY_DISABLED", "").lower() not in ("1", "true", "yes")
+
+
+def _run_log():
+    global _log
+    with _log_lock:
+        if _log is None:
+            os.makedirs(_telemetry_dir(), exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(
+                os.path.join(_telemetry_dir(), "runs.jsonl"),
+                maxBytes=int(float(os.getenv("TELEMETRY_MAX_MB", 10)) * 1024 * 1024),
+                backupCount=int(os.getenv("TELEMETRY_BACKUPS", 5)),
+                encoding="utf-8",
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            _log = logging.getLogger("ymemo.telemetry")
+            _log.setLevel(logging.INFO)
+            _log.propagate = False
+            _log.addHandler(handler)
+        return _log
+
+
+def write_metrics_file(path=None):
+    """Atomically rewrite the Prometheus text file"""
+    path = path or os.path.join(_telemetry_dir(), "metrics.prom")
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".metrics-", suffix=".prom")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(metrics.render())
+    os.replace(temp_path, path)
+
+
+def _write_run(record):
+    if not _enabled():
+        return
+    try:
+        _run_log().info(json.dumps(record, ensure_ascii=False))
+        write_metrics_file()
+    except OSError as e:
+        # Telemetry must never break a memo run
+        logging.getLogger(__name__).warning("Could not write telemetry: %s", e)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port, host="127.0.0.1"):
+    """Serve /metrics from a background thread; returns the server"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="telemetry-metrics", daemon=True).start()
+    return server
+
+
+def serve_metrics_from_env():
+    port = os.getenv("TELEMETRY_METRICS_PORT")
+    return serve_metrics(int(port), os.getenv("TELEMETRY_METRICS_HOST", "127.0.0.1")) if port else None
@@ -0,0 +1,56 @@
+"""
+Regression tests for PDF extraction with OCR of scanned pages.
+
+Run with: python -m pytest test_file_extraction.py
+No PDF library or tesseract is needed: page reading, rendering and OCR are
+replaced with fakes that control when each page's OCR finishes.
+"""
+
+import contextlib
+import threading
+import time
+
+import file_extraction
+
+TEXT = "A text-layer page with more than enough characters on it. "
+
+
+def test_budget_cut_with_text_pages_behind_running_ocr(monkeypatch):
+    # p1 scanned (OCR finishes once p5 has been read), p2-p3 text, p4 scanned (OCR still running
+    # when the budget is reached), p5-p6 text: the pages left unresolved are a Future and strs
+    pages = ["", TEXT + "2", TEXT + "3", "", TEXT + "5", TEXT + "6"]
+    fifth_page_read = threading.Event()
+    first_page_done = threading.Event()
+
+    def iter_pdf_pages(file_bytes, page_ranges=None):
+        for number, text in enumerate(pages, start=1):
+            if number == 6:
+                # Let p1's OCR finish only now, so reading p6 resolves p1-p3 and reaches the budget
+                fifth_page_read.set()
+                first_page_done.wait(5)
+                time.sleep(0.05)
+            yield number, text
+
+    @contextlib.contextmanager
+    def pdf_page_renderer(file_bytes, max_pixels):
+        yield lambda number, dpi: number
+
+    def ocr_pil_image(number, lang, config, settings):
+        if number == 1:
+            fifth_page_read.wait(5)
+            first_page_done.set()
+            return "OCR text of page 1"
+        time.sleep(0.3)
+        return f"OCR text of page {number}"
+
+    monkeypatch.setenv("OCR_CACHE_DISABLED", "1")
+    monkeypatch.setenv("OCR_TILE_WORKERS", "2")
+    monkeypatch.setattr(file_extraction, "iter_pdf_pages", iter_pdf_pages)
+    monkeypatch.setattr(file_extraction, "pdf_page_renderer", pdf_page_renderer)
+    monkeypatch.setattr(file_extraction, "pdf_rasterizer", lambda: "pypdfium2")
+    monkeypatch.setattr(file_extraction, "ocr_available", lambda: True)
+    monkeypatch.setattr(file_extraction, "ocr_pil_image", ocr_pil_image)
+
+    text = file_extraction.extract_text_from_pdf(b"%PDF", max_chars=100)
+
+    assert text == "\n".join(["OCR text of page 1", TEXT + "2", TEXT + "3"])